@@ -19,4 +19,6 @@ from .models import (
 )
 
 # Import database functions
-from .database import execute_query, execute_many
\ No newline at end of file
+from .database import execute_query, execute_many, execute_query_async, execute_many_async, transaction
+# Import relation helpers
+from .models import get_related, prefetch_related
@@ -0,0 +1,69 @@
+import logging
+import threading
+
+import psycopg2
+from psycopg2 import extensions
+
+from .database import DB_HOST, DB_NAME, DB_USER, DB_PASS
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """
+    Background thread calling run_once(conn) every `interval` seconds.
+
+    The task gets its own autocommit connection, so long statements do not
+    hold a pool connection; the connection is reopened after an error.
+    """
+
+    name = "periodic-task"
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._failures = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def connect(self):
+        conn = psycopg2.connect(host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASS)
+        conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def _run(self):
+        conn = None
+        while not self._stop.wait(self.interval):
+            try:
+                if conn is None or conn.closed:
+                    conn = self.connect()
+                self.run_once(conn)
+            except psycopg2.Error as e:
+                logger.warning("%s failed: %s", self.name, e)
+                with self._lock:
+                    self._failures += 1
+                if conn is not None:
+                    conn.close()
+                    conn = None
+        if conn is not None:
+            conn.close()
+
+    def run_once(self, conn):
+        raise NotImplementedError
+
+    def stats(self):
+        with self._lock:
+            return {"running": self._thread is not None, "interval": self.interval, "failures": self._failures}
@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Entries kept in total, least recently used ones are dropped first
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1024"))
+# Seconds an entry is served before it is read from the database again; 0 turns the cache off
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "300"))
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries expire after `ttl` seconds.
+
+    Keys are (table, key) pairs so a table's entries can be dropped together.
+    Every invalidation bumps the table's generation; set() ignores values read
+    under an older generation, so a query that raced with a write is not cached.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (table, key) -> (expires at, value)
+        self._generations = {}
+        # Invalidation may come from other threads than the readers
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def generation(self, table):
+        with self._lock:
+            return self._generations.get(table, 0)
+
+    def get(self, table, key):
+        """Return (True, value) on a hit and (False, None) on a miss."""
+        with self._lock:
+            entry = self._entries.get((table, key))
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end((table, key))
+                self._hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[(table, key)]
+            self._misses += 1
+            return False, None
+
+    def set(self, table, key, value, generation, ttl=None):
+        """Store a value read under generation; ttl overrides the cache's default."""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            if self._generations.get(table, 0) != generation:
+                return
+            self._entries[(table, key)] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end((table, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, table, id=None):
+        """
+        Drop the entry of one row and every listing of the table,
+        or all of the table's entries when id is None.
+        """
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            self._invalidations += 1
+            for entry_table, key in list(self._entries):
+                if entry_table != table:
+                    continue
+                if id is None or key[0] != "id" or key[1] == id:
+                    del self._entries[(entry_table, key)]
+
+    def clear(self):
+        with self._lock:
+            for table in self._generations:
+                self._generations[table] += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
+
+
+cache = TTLCache()
+
+# Whole /queries responses, keyed by route (the "table") and normalized query
+response_cache = TTLCache(max_entries=int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "512")))
+
+
+def get_cache_stats():
+    """Hit/miss counters of the reference data cache and the response cache."""
+    return dict(cache.stats(), responses=response_cache.stats())
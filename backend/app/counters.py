@@ -0,0 +1,66 @@
+import logging
+import os
+import time
+
+from .background import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# Set COUNTERS_CHECK=0 to never check the counters from this process
+COUNTERS_CHECK = os.environ.get("COUNTERS_CHECK", "1") == "1"
+# Seconds between checks of the trigger-maintained counters of migrations/0008_query_counters.sql
+COUNTERS_CHECK_INTERVAL = float(os.environ.get("COUNTERS_CHECK_INTERVAL", "600"))
+# Recompute the counters when a check finds drift
+COUNTERS_REPAIR = os.environ.get("COUNTERS_REPAIR", "1") == "1"
+
+
+class CounterChecker(PeriodicTask):
+    """
+    Compares the counters behind the /count endpoints with a full recount
+    (check_query_counters()) and rebuilds them when they drifted, e.g. after
+    a TRUNCATE or a write made with the triggers disabled.
+    """
+
+    name = "counter-checker"
+
+    def __init__(self):
+        super().__init__(COUNTERS_CHECK_INTERVAL)
+        self._checks = 0
+        self._repairs = 0
+        self._last_checked_at = None
+        self._last_drift = {}
+
+    def run_once(self, conn):
+        self.check(conn)
+
+    def check(self, conn):
+        """Return {counter: (stored, actual)} for the counters that drifted."""
+        with conn.cursor() as cur:
+            cur.execute("SELECT counter_name, stored_value, actual_value FROM check_query_counters()")
+            drift = {name: (stored, actual) for name, stored, actual in cur.fetchall() if stored != actual}
+            if drift:
+                logger.warning("query counters drifted: %s", drift)
+                if COUNTERS_REPAIR:
+                    cur.execute("SELECT rebuild_query_counters()")
+        with self._lock:
+            self._checks += 1
+            self._last_checked_at = time.time()
+            self._last_drift = drift
+            if drift and COUNTERS_REPAIR:
+                self._repairs += 1
+        return drift
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update(
+                checks=self._checks,
+                repairs=self._repairs,
+                last_checked_at=self._last_checked_at,
+                last_drift={name: {"stored": stored, "actual": actual}
+                            for name, (stored, actual) in self._last_drift.items()},
+            )
+        return stats
+
+
+counter_checker = CounterChecker()
@@ -1,6 +1,18 @@
 import os
+import asyncio
+import contextlib
+import contextvars
+import functools
+import io
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 import psycopg2
-from psycopg2 import pool
+from psycopg2.extras import execute_batch
+
+from . import prepared
+from .pool import ConnectionPool
 
 # Database connection parameters from environment
 DB_HOST = os.environ.get("DB_HOST", "db")
@@ -8,32 +20,107 @@ DB_NAME = os.environ.get("DB_NAME", "postgres")
 DB_USER = os.environ.get("DB_USER", "myuser")
 DB_PASS = os.environ.get("DB_PASS", "mypassword")
 
-# Create a connection pool
-connection_pool = pool.SimpleConnectionPool(
-    1,  # minconn
-    10,  # maxconn
-    host=DB_HOST,
-    dbname=DB_NAME,
-    user=DB_USER,
-    password=DB_PASS
-)
+# Connection pool settings
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_MAX_LIFETIME = float(os.environ.get("DB_POOL_MAX_LIFETIME", "3600"))
+DB_POOL_PING_AFTER = float(os.environ.get("DB_POOL_PING_AFTER", "60"))
+
+# Connection pool (shared by the worker threads below, so it has to be thread-safe).
+# It is opened on first use, so importing the app does not touch the database.
+_connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+def get_pool():
+    """The connection pool, opened on the first call."""
+    global _connection_pool
+    if _connection_pool is None:
+        with _connection_pool_lock:
+            if _connection_pool is None:
+                _connection_pool = ConnectionPool(
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    timeout=DB_POOL_TIMEOUT,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    ping_after=DB_POOL_PING_AFTER,
+                    host=DB_HOST,
+                    dbname=DB_NAME,
+                    user=DB_USER,
+                    password=DB_PASS,
+                    connection_factory=prepared.PreparingConnection
+                )
+    return _connection_pool
+
+def close_pool():
+    """
+    Close the pool. Idle connections are closed now, the ones in use when they
+    are released; the next get_connection() opens a new pool.
+    """
+    global _connection_pool
+    with _connection_pool_lock:
+        pool, _connection_pool = _connection_pool, None
+    if pool is not None:
+        pool.closeall()
+
+# psycopg2 is blocking, so queries issued from request handlers run on this executor.
+# It is no larger than the pool, so worker threads rarely wait for a connection.
+db_executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX, thread_name_prefix="db")
+
+# Pool each connection in use was taken from, so that it goes back there even
+# after close_pool() (get_pool() would open a new pool that does not know it)
+_connection_owners = {}
 
 def get_connection():
     """Get a connection from the pool."""
-    return connection_pool.getconn()
+    pool = get_pool()
+    conn = pool.getconn()
+    _connection_owners[id(conn)] = pool
+    return conn
 
 def release_connection(conn):
-    """Release a connection back to the pool."""
-    connection_pool.putconn(conn)
+    """Release a connection back to the pool it came from."""
+    _connection_owners.pop(id(conn)).putconn(conn)
+
+def get_pool_stats():
+    """Current connection pool usage and wait times (None until the pool is opened)."""
+    pool = _connection_pool
+    return pool.stats() if pool is not None else None
+
+def get_prepared_stats():
+    """Prepared statement counters."""
+    return prepared.get_prepared_stats()
+
+# Connection of the transaction opened by transaction() in the current context, if any
+_current_transaction = contextvars.ContextVar("current_transaction", default=None)
+# Callbacks to run once that transaction has committed
+_commit_callbacks = contextvars.ContextVar("commit_callbacks", default=None)
+
+def on_commit(callback):
+    """
+    Call callback() after the current transaction() commits, or right away
+    outside of one (each statement is committed by execute_query then).
+    """
+    callbacks = _commit_callbacks.get()
+    if callbacks is None:
+        callback()
+    else:
+        callbacks.append(callback)
 
 def execute_query(query, params=None, fetch=True, commit=None):
-    """Execute a query and return the results."""
-    conn = None
+    """
+    Execute a query and return the results.
+    Inside transaction() the query runs on the transaction's connection and is not committed here.
+    """
+    conn = _current_transaction.get()
+    owns_connection = conn is None
     cur = None
     try:
-        conn = get_connection()
+        if owns_connection:
+            conn = get_connection()
         cur = conn.cursor()
-        cur.execute(query, params)
+        # Hot statements run as server-side prepared statements
+        prepared.execute(cur, query, params)
 
         # If commit is explicitly set, use that value
         # Otherwise, commit only if not fetching (backward compatibility)
@@ -44,18 +131,18 @@ def execute_query(query, params=None, fetch=True, commit=None):
         else:
             result = None
 
-        if should_commit:
+        if should_commit and owns_connection:
             conn.commit()
 
         return result
     except Exception as e:
-        if conn:
+        if conn and owns_connection:
             conn.rollback()
         raise e
     finally:
         if cur:
             cur.close()
-        if conn:
+        if conn and owns_connection:
             release_connection(conn)
 
 def execute_many(query, params_list):
@@ -65,7 +152,8 @@ def execute_many(query, params_list):
     try:
         conn = get_connection()
         cur = conn.cursor()
-        cur.executemany(query, params_list)
+        # executemany does one round trip per parameter set, execute_batch sends them in pages
+        execute_batch(cur, query, params_list)
         conn.commit()
     except Exception as e:
         if conn:
@@ -76,3 +164,111 @@ def execute_many(query, params_list):
             cur.close()
         if conn:
             release_connection(conn)
+
+def _copy_value(value):
+    """Format a value for COPY's text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+def copy_rows(table, columns, rows):
+    """
+    Load rows (tuples in the order of columns) into a table with COPY FROM STDIN.
+    Inside transaction() the rows are loaded on the transaction's connection and not committed here.
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    conn = _current_transaction.get()
+    owns_connection = conn is None
+    if owns_connection:
+        conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+        if owns_connection:
+            conn.commit()
+    except Exception:
+        if owns_connection:
+            conn.rollback()
+        raise
+    finally:
+        if owns_connection:
+            release_connection(conn)
+
+async def run_in_db_thread(func, *args, **kwargs):
+    """Run a blocking database call on the db executor without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(db_executor, call)
+
+async def execute_query_async(query, params=None, fetch=True, commit=None):
+    """Awaitable version of execute_query."""
+    return await run_in_db_thread(execute_query, query, params, fetch, commit)
+
+async def execute_many_async(query, params_list):
+    """Awaitable version of execute_many."""
+    return await run_in_db_thread(execute_many, query, params_list)
+
+async def copy_rows_async(table, columns, rows):
+    """Awaitable version of copy_rows."""
+    return await run_in_db_thread(copy_rows, table, columns, rows)
+
+@contextlib.asynccontextmanager
+async def transaction():
+    """
+    Unit of work: every execute_query_async awaited inside
+
+        async with transaction():
+            ...
+
+    runs on one connection and is committed once at the end, or rolled back
+    if the block raises. Nested transaction() blocks join the outer one.
+    Callbacks registered with on_commit() inside the block run after the commit.
+    """
+    if _current_transaction.get() is not None:
+        yield
+        return
+
+    conn = await run_in_db_thread(get_connection)
+    token = _current_transaction.set(conn)
+    callbacks = []
+    callbacks_token = _commit_callbacks.set(callbacks)
+    try:
+        yield
+        await run_in_db_thread(conn.commit)
+    except BaseException:
+        await run_in_db_thread(conn.rollback)
+        raise
+    finally:
+        _current_transaction.reset(token)
+        _commit_callbacks.reset(callbacks_token)
+        await run_in_db_thread(release_connection, conn)
+    for callback in callbacks:
+        callback()
+
+def stream_query(query, params=None, itersize=2000):
+    """
+    Yield the rows of a query through a named (server-side) cursor,
+    fetching itersize rows per round trip instead of the whole result.
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cur:
+            cur.itersize = itersize
+            cur.execute(query, params)
+            for row in cur:
+                yield row
+    finally:
+        # The cursor only reads, ending its transaction is enough
+        conn.rollback()
+        release_connection(conn)
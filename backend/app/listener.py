@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import select
+import threading
+
+import psycopg2
+from psycopg2 import extensions
+
+from .cache import cache
+from .database import DB_HOST, DB_NAME, DB_USER, DB_PASS
+from .models import models_by_table
+
+logger = logging.getLogger(__name__)
+
+# Set CACHE_LISTEN=0 to run without cross-process invalidation (the TTL still applies)
+CACHE_LISTEN = os.environ.get("CACHE_LISTEN", "1") == "1"
+# Channel the triggers of migrations/0006_notify_triggers.sql notify on
+CHANNEL = "table_change"
+# Seconds to wait before reconnecting after the listening connection broke
+RECONNECT_DELAY = float(os.environ.get("CACHE_LISTEN_RECONNECT_DELAY", "1"))
+
+
+class ChangeListener:
+    """
+    Evicts cached rows when any process writes to the database.
+
+    A background thread keeps its own autocommit connection LISTENing on
+    CHANNEL and maps every notification to the model of the changed table.
+    Notifications sent while the connection was down are lost, so the whole
+    cache is dropped after a reconnect.
+    """
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._models = None
+        self._received = 0
+        self._reconnects = 0
+        self._connected = False
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._models = models_by_table()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _connect(self):
+        conn = psycopg2.connect(host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASS)
+        conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    def _run(self):
+        first = True
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                if not first:
+                    cache.clear()
+                    with self._lock:
+                        self._reconnects += 1
+                first = False
+                self._connected = True
+                self._listen(conn)
+            except psycopg2.Error as e:
+                logger.warning("cache listener connection failed: %s", e)
+            finally:
+                self._connected = False
+                if conn is not None:
+                    conn.close()
+            self._stop.wait(RECONNECT_DELAY)
+
+    def _listen(self, conn):
+        while not self._stop.is_set():
+            # Wake up now and then to notice stop()
+            if select.select([conn], [], [], 1.0) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                self.handle(conn.notifies.pop(0).payload)
+
+    def handle(self, payload):
+        try:
+            change = json.loads(payload)
+            model = self._models.get(change["table"])
+        except (ValueError, KeyError, TypeError):
+            logger.warning("unexpected %s payload: %r", CHANNEL, payload)
+            return
+        with self._lock:
+            self._received += 1
+        if model is not None:
+            model.evict_cached(change.get("id"))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running": self._thread is not None,
+                "connected": self._connected,
+                "received": self._received,
+                "reconnects": self._reconnects,
+            }
+
+
+listener = ChangeListener()
@@ -1,49 +1,98 @@
-from fastapi import FastAPI
+import contextlib
+import os
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
 
-from backend.app.routers.order import OrderUpdate
-from .initdb import init_db
+from .counters import counter_checker, COUNTERS_CHECK
+from .database import close_pool, run_in_db_thread
+from .listener import listener, CACHE_LISTEN
+from .migrate import ensure_up_to_date
+from .refresher import refresher, ANALYTICS_REFRESH
+from .pool import PoolTimeout
 from .routers import (
     queries, medication, medicine, technology, ingredient,
-    composition, order, client, delivery, inventory, prescription
+    composition, order, client, delivery, inventory, prescription, stats
 )
 
-# Initialize the database
-init_db()
+# Set SCHEMA_CHECK=1 to refuse to start while migrations are pending (python -m app.migrate applies them)
+SCHEMA_CHECK = os.environ.get("SCHEMA_CHECK", "0") == "1"
+# Responses of at least this many bytes are gzip-compressed for clients sending
+# Accept-Encoding: gzip; 0 turns compression off
+GZIP_MIN_SIZE = int(os.environ.get("GZIP_MIN_SIZE", "1024"))
 
-# Create FastAPI app
-app = FastAPI(
-    title="Pharmacy API",
-    description="API for pharmacy management system",
-    version="1.0.0"
-)
 
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup and shutdown of a worker. Nothing here runs at import time; the
+    connection pool itself is only opened by the first query.
+    """
+    if SCHEMA_CHECK:
+        await run_in_db_thread(ensure_up_to_date)
+    if CACHE_LISTEN:
+        listener.start()
+    if ANALYTICS_REFRESH:
+        refresher.start()
+    if COUNTERS_CHECK:
+        counter_checker.start()
+    try:
+        yield
+    finally:
+        listener.stop()
+        refresher.stop()
+        counter_checker.stop()
+        close_pool()
 
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Заменили ["*"] на конкретные origins
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-    expose_headers=["*"]     # Добавили для кастомных заголовков
-)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    return JSONResponse(status_code=503, content={"detail": "Database is busy, try again later"})
+
 
-@app.get("/")
 async def root():
     return {"message": "Welcome to the Pharmacy API"}
 
-app.include_router(queries.router)
-app.include_router(medication.router)
-app.include_router(medicine.router)
-app.include_router(technology.router)
-app.include_router(ingredient.router)
-app.include_router(composition.router)
-app.include_router(order.router)
-app.include_router(client.router)
-app.include_router(delivery.router)
-app.include_router(inventory.router)
-app.include_router(prescription.router)
 
+def create_app():
+    """Build the API; registering the routers does not touch the database."""
+    app = FastAPI(
+        title="Pharmacy API",
+        description="API for pharmacy management system",
+        version="1.0.0",
+        lifespan=lifespan,
+    )
+
+    # Add CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Заменили ["*"] на конкретные origins
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["*"]     # Добавили для кастомных заголовков
+    )
+
+    if GZIP_MIN_SIZE > 0:
+        app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
+
+    app.add_exception_handler(PoolTimeout, pool_timeout_handler)
+    app.add_api_route("/", root, methods=["GET"])
+
+    app.include_router(queries.router)
+    app.include_router(medication.router)
+    app.include_router(medicine.router)
+    app.include_router(technology.router)
+    app.include_router(ingredient.router)
+    app.include_router(composition.router)
+    app.include_router(order.router)
+    app.include_router(client.router)
+    app.include_router(delivery.router)
+    app.include_router(inventory.router)
+    app.include_router(prescription.router)
+    app.include_router(stats.router)
+    return app
+
+
+app = create_app()
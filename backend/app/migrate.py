@@ -0,0 +1,242 @@
+"""
+Applies the SQL migrations of backend/migrations in version order.
+
+A migration is a file named NNNN_name.sql. Applied migrations are recorded in
+schema_migrations with a checksum of their text, so every file runs once and
+an applied file that was edited afterwards stops the run instead of being
+silently ignored. Each migration runs in its own transaction together with its
+schema_migrations row.
+
+    python -m app.migrate                  apply the pending migrations
+    python -m app.migrate --status         list the migrations and whether they are applied
+    python -m app.migrate --baseline 0004  record the migrations up to 0004 as applied without
+                                           running them, then apply the rest
+
+A database created by the old init_db (tables but no schema_migrations rows) is
+adopted the same way without --baseline: _legacy_baseline finds how far init_db
+got, and the later migrations are run over what it left. The released init_db
+ran 0001-0004 and an older 0005; 0005-0007 only replace views, functions and
+triggers, so they can run again over older versions of themselves.
+"""
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+from collections import namedtuple
+
+import psycopg2
+
+from .database import DB_HOST, DB_NAME, DB_USER, DB_PASS
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "migrations"))
+
+# Advisory lock held while migrating, so that two processes started together do not both migrate
+_MIGRATE_LOCK_KEY = 7303
+
+_FILE_NAME = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+Migration = namedtuple("Migration", "version name path checksum")
+
+
+class MigrationError(Exception):
+    pass
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """The migrations found in directory, ordered by version."""
+    migrations = {}
+    for file_name in os.listdir(directory):
+        match = _FILE_NAME.match(file_name)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"two migrations with version {version}: "
+                                 f"{migrations[version].path} and {file_name}")
+        path = os.path.join(directory, file_name)
+        migrations[version] = Migration(version, match.group(2), path, checksum(read_sql(path)))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def read_sql(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def checksum(sql):
+    # Line endings depend on the checkout, so they do not count as a change
+    return hashlib.sha256(sql.replace("\r\n", "\n").encode("utf-8")).hexdigest()
+
+
+def _ensure_table(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+
+
+def applied_migrations(cur):
+    """{version: checksum} of the migrations recorded in schema_migrations."""
+    cur.execute("SELECT version, checksum FROM schema_migrations")
+    return dict(cur.fetchall())
+
+
+def pending_migrations(migrations, applied):
+    """The migrations not applied yet; fails when an applied one was changed or removed."""
+    known = {migration.version for migration in migrations}
+    missing = sorted(set(applied) - known)
+    if missing:
+        raise MigrationError(f"applied migrations {missing} are missing from {MIGRATIONS_DIR}")
+    for migration in migrations:
+        if migration.version in applied and applied[migration.version] != migration.checksum:
+            raise MigrationError(
+                f"migration {os.path.basename(migration.path)} was changed after it was applied; "
+                f"add a new migration instead"
+            )
+    return [migration for migration in migrations if migration.version not in applied]
+
+
+def _legacy_baseline(cur):
+    """
+    Last migration a database created by init_db is known to have, None when
+    the database has no tables. init_db ran the files without recording them.
+    """
+    cur.execute("SELECT to_regclass('medicine_order') IS NOT NULL, to_regclass('query_counters') IS NOT NULL")
+    has_tables, has_counters = cur.fetchone()
+    if not has_tables:
+        return None
+    # query_counters came with the last files init_db ran (0005 as it is now and
+    # 0006-0008); without it 0005 may be the old one and 0006-0007 may be missing
+    return 8 if has_counters else 4
+
+
+def connect():
+    return psycopg2.connect(host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASS)
+
+
+def _record(cur, migration):
+    cur.execute(
+        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+        (migration.version, migration.name, migration.checksum)
+    )
+
+
+def migrate(conn, baseline=None):
+    """
+    Apply the pending migrations. With a baseline version, the migrations up to
+    it are only recorded as applied; that is refused once schema_migrations has
+    rows. A database created by init_db gets its baseline from _legacy_baseline.
+    Returns the migrations recorded or applied.
+    """
+    migrations = discover()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (_MIGRATE_LOCK_KEY,))
+        try:
+            _ensure_table(cur)
+            applied = applied_migrations(cur)
+            pending = pending_migrations(migrations, applied)
+            if baseline is not None:
+                if applied:
+                    raise MigrationError(
+                        "schema_migrations already has rows; --baseline only adopts a database "
+                        "that was never migrated"
+                    )
+                if baseline not in {migration.version for migration in migrations}:
+                    raise MigrationError(f"there is no migration with version {baseline}")
+            if not pending:
+                return []
+            if not applied and baseline is None:
+                # Running 0001 would DROP the tables of a database created by init_db
+                baseline = _legacy_baseline(cur)
+                if baseline is not None:
+                    logger.info("adopting a database created by init_db at version %d", baseline)
+            conn.autocommit = False
+            for migration in pending:
+                try:
+                    if baseline is None or migration.version > baseline:
+                        logger.info("applying migration %s", os.path.basename(migration.path))
+                        cur.execute(read_sql(migration.path))
+                    else:
+                        logger.info("recording migration %s as applied", os.path.basename(migration.path))
+                    _record(cur, migration)
+                    conn.commit()
+                except psycopg2.Error as e:
+                    conn.rollback()
+                    raise MigrationError(f"migration {os.path.basename(migration.path)} failed: {e}") from e
+            return pending
+        finally:
+            conn.autocommit = True
+            cur.execute("SELECT pg_advisory_unlock(%s)", (_MIGRATE_LOCK_KEY,))
+
+
+def _read_applied(conn):
+    # Read only, so that checking does not create schema_migrations
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+        applied = applied_migrations(cur) if cur.fetchone()[0] else {}
+    conn.rollback()
+    return applied
+
+
+def status(conn):
+    """[(migration, applied)] for every migration found."""
+    applied = _read_applied(conn)
+    return [(migration, migration.version in applied) for migration in discover()]
+
+
+def ensure_up_to_date():
+    """Raise MigrationError unless every migration is applied unchanged. Changes nothing."""
+    conn = connect()
+    try:
+        pending = pending_migrations(discover(), _read_applied(conn))
+    finally:
+        conn.close()
+    if pending:
+        raise MigrationError(
+            f"{len(pending)} migration(s) pending, starting with "
+            f"{os.path.basename(pending[0].path)}; run `python -m app.migrate`"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.migrate", description="Apply the pending SQL migrations.")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--status", action="store_true", help="list the migrations and exit")
+    group.add_argument("--baseline", type=int, metavar="VERSION",
+                       help="record the migrations up to VERSION as applied without running them, "
+                            "then apply the later ones; only on a database without schema_migrations rows")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    conn = connect()
+    try:
+        if args.status:
+            for migration, applied in status(conn):
+                print(f"{'applied' if applied else 'pending':8} {os.path.basename(migration.path)}")
+            return 0
+        done = migrate(conn, baseline=args.baseline)
+    except MigrationError as e:
+        logger.error("%s", e)
+        return 1
+    finally:
+        conn.close()
+    if not done:
+        logger.info("database is up to date")
+    else:
+        logger.info("%d migration(s) done, now at version %d", len(done), done[-1].version)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
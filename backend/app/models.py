@@ -1,5 +1,8 @@
+import functools
+import re
 from enum import Enum as PyEnum
-from .database import execute_query
+from .cache import cache
+from .database import execute_query_async, copy_rows_async, stream_query, transaction, on_commit
 
 # Enums
 class MethodOfApplication(PyEnum):
@@ -34,23 +37,300 @@ class MedicineType(PyEnum):
 
 # Base class for models
 class Model:
+    # Table columns in the order the constructor takes them; "*" for views.
+    __columns__ = ()
+    # Columns a listing may be ordered by (must be NOT NULL for keyset pagination)
+    __sort_keys__ = ("id",)
+    # Checks bulk_create runs on each staged row s: (SQL condition rejecting the row, error message)
+    __bulk_checks__ = ()
+    # Reference data that rarely changes is read through the in-process cache
+    __cached__ = False
+    # Cached tables whose rows a write to this model changes, through triggers or inheritance
+    __invalidates__ = ()
+    # Listings build one object per row, so models keep their fields in slots instead of
+    # a per-instance __dict__; every subclass lists its own fields. _prefetched holds the
+    # related objects loaded by prefetch_related().
+    __slots__ = ("_prefetched",)
+    # SQL expressions ({} is the column) making Postgres output a field the way
+    # serializers.convert_value does, in the JSON the *_json methods build in the database
+    __json_casts__ = {}
+
+    @classmethod
+    def _select_list(cls):
+        return ", ".join(cls.__columns__) if cls.__columns__ else "*"
+
+    @classmethod
+    def _json_array_query(cls, source, order_by=""):
+        """
+        SELECT of the JSON array of the rows of source (aliased p), one
+        row_to_json object per row with the fields in the order to_dict uses.
+        """
+        fields = [name for klass in reversed(cls.__mro__) for name in klass.__dict__.get("__slots__", ())
+                  if not name.startswith("_")]
+        columns = ", ".join(f"{cls.__json_casts__[name].format(name)} AS {name}" if name in cls.__json_casts__
+                            else name for name in fields)
+        return (f"SELECT '[' || COALESCE(string_agg(row_to_json(r)::text, ','{order_by}), '') || ']' "
+                f"FROM {source} AS p, LATERAL (SELECT {columns}) AS r")
+
+    @classmethod
+    async def _fetch(cls, key, query, params=None):
+        """Run a read query, through the cache for cached models. Rows are cached, not objects."""
+        if not cls.__cached__:
+            return await execute_query_async(query, params)
+        found, rows = cache.get(cls.__tablename__, key)
+        if found:
+            return rows
+        generation = cache.generation(cls.__tablename__)
+        rows = await execute_query_async(query, params)
+        cache.set(cls.__tablename__, key, rows, generation)
+        return rows
+
     @classmethod
-    def get_by_id(cls, id):
-        query = f"SELECT * FROM {cls.__tablename__} WHERE id = %s"
-        result = execute_query(query, (id,))
+    def evict_cached(cls, id=None):
+        """Drop the cached rows a write to this model makes stale."""
+        if cls.__cached__:
+            cache.invalidate(cls.__tablename__, id)
+        for table in cls.__invalidates__:
+            cache.invalidate(table)
+
+    @classmethod
+    def invalidate_cache(cls, id=None):
+        """evict_cached, once the current write is committed."""
+        on_commit(functools.partial(cls.evict_cached, id))
+
+    @classmethod
+    async def get_by_id(cls, id):
+        query = f"SELECT {cls._select_list()} FROM {cls.__tablename__} WHERE id = %s"
+        result = await cls._fetch(("id", id), query, (id,))
         if result:
             return cls(*result[0])
         return None
 
     @classmethod
-    def get_all(cls):
-        query = f"SELECT * FROM {cls.__tablename__}"
-        results = execute_query(query)
+    async def get_all(cls):
+        query = f"SELECT {cls._select_list()} FROM {cls.__tablename__}"
+        results = await cls._fetch(("all",), query)
         return [cls(*row) for row in results]
 
+    @classmethod
+    async def get_by_ids(cls, ids):
+        """Fetch several rows in one query. Returns a dict keyed by id."""
+        ids = list({id for id in ids if id is not None})
+        if not ids:
+            return {}
+        items = {}
+        if cls.__cached__:
+            # Only the rows missing from the cache are queried
+            missing = []
+            for id in ids:
+                found, rows = cache.get(cls.__tablename__, ("id", id))
+                if found and rows:
+                    items[id] = cls(*rows[0])
+                else:
+                    missing.append(id)
+            ids = missing
+            if not ids:
+                return items
+            generation = cache.generation(cls.__tablename__)
+        query = f"SELECT {cls._select_list()} FROM {cls.__tablename__} WHERE id = ANY(%s)"
+        results = await execute_query_async(query, (ids,))
+        for row in results:
+            item = cls(*row)
+            items[item.id] = item
+            if cls.__cached__:
+                cache.set(cls.__tablename__, ("id", item.id), [row], generation)
+        return items
+
+    @classmethod
+    def stream_all(cls, itersize=2000):
+        """Iterate over the whole table without loading it into memory (blocking)."""
+        query = f"SELECT {cls._select_list()} FROM {cls.__tablename__} ORDER BY id"
+        for row in stream_query(query, itersize=itersize):
+            yield cls(*row)
+
+    @classmethod
+    async def get_page(cls, limit=None, after_id=None, sort_by="id", descending=False):
+        """
+        Keyset pagination ordered by (sort_by, id).
+        Returns the page and the id to pass as after_id for the next one (None on the last page).
+        """
+        query, params = cls._page_query(cls._select_list(), limit, after_id, sort_by, descending)
+        results = await cls._fetch(("page", limit, after_id, sort_by, descending), query, params)
+        items = [cls(*row) for row in results]
+
+        next_cursor = None
+        if limit is not None and len(items) > limit:
+            items = items[:limit]
+            next_cursor = items[-1].id
+        return items, next_cursor
+
+    @classmethod
+    async def get_page_json(cls, limit=None, after_id=None, sort_by="id", descending=False):
+        """
+        get_page with the JSON array of the page built by Postgres. Returns the
+        array as text, ready to be sent, and the next cursor.
+        """
+        direction = "DESC" if descending else "ASC"
+        order_by = f"{sort_by} {direction}" + (f", id {direction}" if sort_by != "id" else "")
+        # n numbers the rows in page order
+        select_list = f"{cls._select_list()}, row_number() OVER (ORDER BY {order_by}) AS n"
+        page_query, params = cls._page_query(select_list, limit, after_id, sort_by, descending)
+        array_query = cls._json_array_query("page", " ORDER BY n")
+        if limit is None:
+            results = await execute_query_async(f"WITH page AS ({page_query}) {array_query}", params)
+            return results[0][0], None
+        # The row past the limit is left out and only tells that there is a next page
+        query = f"""
+            WITH page AS ({page_query})
+            SELECT ({array_query} WHERE n <= %s),
+                   (SELECT id FROM page WHERE n = %s AND EXISTS (SELECT 1 FROM page WHERE n > %s))
+        """
+        results = await execute_query_async(query, [*params, limit, limit, limit])
+        return results[0]
+
+    @classmethod
+    async def get_all_json(cls):
+        """get_all as a JSON array built by Postgres, returned as text."""
+        results = await execute_query_async(cls._json_array_query(cls.__tablename__))
+        return results[0][0]
+
+    @classmethod
+    def _page_query(cls, select_list, limit, after_id, sort_by, descending):
+        """Query and parameters of one page ordered by (sort_by, id), with one row past the limit."""
+        if sort_by not in cls.__sort_keys__:
+            raise ValueError(f"Cannot sort {cls.__tablename__} by {sort_by}")
+
+        direction = "DESC" if descending else "ASC"
+        comparison = "<" if descending else ">"
+        conditions = []
+        params = []
+
+        if after_id is not None:
+            if sort_by == "id":
+                conditions.append(f"id {comparison} %s")
+                params.append(after_id)
+            else:
+                conditions.append(
+                    f"({sort_by}, id) {comparison} "
+                    f"((SELECT {sort_by} FROM {cls.__tablename__} WHERE id = %s), %s)"
+                )
+                params.extend([after_id, after_id])
+
+        query = f"SELECT {select_list} FROM {cls.__tablename__}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {sort_by} {direction}"
+        if sort_by != "id":
+            query += f", id {direction}"
+        if limit is not None:
+            # One extra row tells whether there is a next page
+            query += " LIMIT %s"
+            params.append(limit + 1)
+        return query, params
+
+    @classmethod
+    async def bulk_create(cls, rows):
+        """
+        Insert many rows at once. The rows (tuples in __columns__ order, without id)
+        are COPYed into a temporary staging table, checked there with __bulk_checks__
+        and the valid ones inserted with a single INSERT ... SELECT.
+        Returns the number of inserted rows and (row index, error) for the rejected ones.
+        """
+        columns = [column for column in cls.__columns__ if column != "id"]
+        column_list = ", ".join(columns)
+        staging = f"{cls.__tablename__}_staging"
+
+        async with transaction():
+            await execute_query_async(
+                f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+                f"SELECT 0 AS row_num, NULL::text AS error, {column_list} "
+                f"FROM {cls.__tablename__} WITH NO DATA",
+                fetch=False
+            )
+            await copy_rows_async(
+                staging, ["row_num"] + columns,
+                [(index,) + tuple(row) for index, row in enumerate(rows)]
+            )
+            if cls.__bulk_checks__:
+                cases = " ".join(f"WHEN {condition} THEN %s" for condition, _ in cls.__bulk_checks__)
+                await execute_query_async(
+                    f"UPDATE {staging} s SET error = CASE {cases} END",
+                    [message for _, message in cls.__bulk_checks__],
+                    fetch=False
+                )
+            errors = await execute_query_async(
+                f"SELECT row_num, error FROM {staging} WHERE error IS NOT NULL ORDER BY row_num"
+            )
+            inserted = await execute_query_async(
+                f"INSERT INTO {cls.__tablename__} ({column_list}) "
+                f"SELECT {column_list} FROM {staging} WHERE error IS NULL ORDER BY row_num "
+                f"RETURNING id"
+            )
+            cls.invalidate_cache()
+        return len(inserted), errors
+
+def models_by_table():
+    """Every model class keyed by its table (or view) name."""
+    models = {}
+    pending = [Model]
+    while pending:
+        model = pending.pop()
+        pending.extend(model.__subclasses__())
+        if hasattr(model, "__tablename__"):
+            models.setdefault(model.__tablename__, model)
+    return models
+
+async def get_table_versions(tables):
+    """
+    (version, modified_at) of each table, bumped by the triggers of
+    migrations/0007_table_versions.sql on every statement that writes to it.
+    """
+    query = "SELECT table_name, version, modified_at FROM table_versions WHERE table_name = ANY(%s)"
+    results = await execute_query_async(query, (list(tables),))
+    return {table_name: (version, modified_at) for table_name, version, modified_at in results}
+
+# Relations. A class lists them in __relations__ as
+# name -> (related model class name, attribute holding the related id).
+async def get_related(instance, name):
+    """Return a related object, using the one loaded by prefetch_related when available."""
+    prefetched = getattr(instance, "_prefetched", None)
+    if prefetched is not None and name in prefetched:
+        return prefetched[name]
+    model_name, key = instance.__relations__[name]
+    return await globals()[model_name].get_by_id(getattr(instance, key))
+
+async def prefetch_related(instances, *relations):
+    """
+    Resolve relations for a whole list of objects, one query per relation
+    instead of one per object. Later get_<relation>() calls use the loaded objects.
+    """
+    if not instances:
+        return instances
+    relation_map = type(instances[0]).__relations__
+    for name in relations:
+        model_name, key = relation_map[name]
+        related = await globals()[model_name].get_by_ids(getattr(item, key) for item in instances)
+        for item in instances:
+            if getattr(item, "_prefetched", None) is None:
+                item._prefetched = {}
+            item._prefetched[name] = related.get(getattr(item, key))
+    return instances
+
 # Models
 class Medication(Model):
     __tablename__ = "medication"
+    __columns__ = (
+        "id", "name", "manufacturer", "critical_norm", "shelf_life", "unit_of_measure",
+        "units_per_package", "price", "storage_conditions", "current_amount",
+    )
+    __sort_keys__ = ("id", "name", "manufacturer", "critical_norm", "shelf_life",
+                     "unit_of_measure", "storage_conditions")
+    # An UPDATE of medication also updates the inheriting medicine and ingredient rows
+    __invalidates__ = ("medicine", "ingredient")
+    __slots__ = (
+        "id", "name", "manufacturer", "critical_norm", "shelf_life", "unit_of_measure",
+        "units_per_package", "price", "storage_conditions", "current_amount",
+    )
 
     def __init__(self, id=None, name=None, manufacturer=None, critical_norm=None, 
                  shelf_life=None, unit_of_measure=None, units_per_package=None, 
@@ -66,7 +346,7 @@ class Medication(Model):
         self.storage_conditions = storage_conditions
         self.current_amount = current_amount
 
-    def save(self):
+    async def save(self):
         if self.id:
             query = """
                 UPDATE medication 
@@ -78,7 +358,7 @@ class Medication(Model):
             params = (self.name, self.manufacturer, self.critical_norm, 
                       self.shelf_life, self.unit_of_measure, self.units_per_package, 
                       self.price, self.storage_conditions, self.current_amount, self.id)
-            execute_query(query, params, fetch=False)
+            await execute_query_async(query, params, fetch=False)
         else:
             query = """
                 INSERT INTO medication 
@@ -90,17 +370,22 @@ class Medication(Model):
             params = (self.name, self.manufacturer, self.critical_norm, 
                       self.shelf_life, self.unit_of_measure, self.units_per_package, 
                       self.price, self.storage_conditions, self.current_amount)
-            result = execute_query(query, params, commit=True)
+            result = await execute_query_async(query, params, commit=True)
             self.id = result[0][0]
+        self.invalidate_cache(self.id)
         return self
 
-    def get_deliveries(self):
+    async def get_deliveries(self):
         query = "SELECT * FROM medication_delivery WHERE medication_id = %s"
-        results = execute_query(query, (self.id,))
+        results = await execute_query_async(query, (self.id,))
         return [StockDelivery(*row) for row in results]
 
 class Ingredient(Medication):
     __tablename__ = "ingredient"
+    __columns__ = Medication.__columns__ + ("type", "caution", "incompatibility")
+    __sort_keys__ = Medication.__sort_keys__ + ("type", "caution")
+    __cached__ = True
+    __slots__ = ("type", "caution", "incompatibility")
 
     def __init__(self, id=None, name=None, manufacturer=None, critical_norm=None, 
                  shelf_life=None, unit_of_measure=None, units_per_package=None, 
@@ -113,30 +398,37 @@ class Ingredient(Medication):
         self.caution = caution
         self.incompatibility = incompatibility
 
-    def save(self):
-        super().save()
-        query = """
-            INSERT INTO ingredient (id, type, caution, incompatibility)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (id) DO UPDATE 
-            SET type = %s, caution = %s, incompatibility = %s
-        """
-        params = (self.id, self.type, self.caution, self.incompatibility,
-                  self.type, self.caution, self.incompatibility)
-        execute_query(query, params, fetch=False, commit=True)
+    async def save(self):
+        # Both tables are written in one transaction
+        async with transaction():
+            await super().save()
+            query = """
+                INSERT INTO ingredient (id, type, caution, incompatibility)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (id) DO UPDATE 
+                SET type = %s, caution = %s, incompatibility = %s
+            """
+            params = (self.id, self.type, self.caution, self.incompatibility,
+                      self.type, self.caution, self.incompatibility)
+            await execute_query_async(query, params, fetch=False, commit=True)
         return self
 
-    def get_used_in_medicines(self):
+    async def get_used_in_medicines(self):
         query = """
             SELECT m.* FROM medicine m
             JOIN composition c ON m.id = c.medicine_id
             WHERE c.ingredient_id = %s
         """
-        results = execute_query(query, (self.id,))
+        results = await execute_query_async(query, (self.id,))
         return [Medicine(*row) for row in results]
 
 class Medicine(Medication):
     __tablename__ = "medicine"
+    __columns__ = Medication.__columns__ + ("type", "kind", "application", "tech_prep_id")
+    __sort_keys__ = Medication.__sort_keys__ + ("type", "kind", "application")
+    __relations__ = {"technology": ("Technology", "tech_prep_id")}
+    __cached__ = True
+    __slots__ = ("type", "kind", "application", "tech_prep_id")
 
     def __init__(self, id=None, name=None, manufacturer=None, critical_norm=None, 
                  shelf_life=None, unit_of_measure=None, units_per_package=None, 
@@ -150,41 +442,39 @@ class Medicine(Medication):
         self.application = application
         self.tech_prep_id = tech_prep_id
 
-    def save(self):
-    # Сначала сохраняем в medication (родительскую таблицу)
-        super().save()
-        
-        # Затем сохраняем в medicine (дочернюю таблицу)
-        query = """
-            INSERT INTO medicine (id, type, kind, application, tech_prep_id)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (id) DO UPDATE 
-            SET type = %s, kind = %s, application = %s, tech_prep_id = %s
-        """
-        params = (self.id, self.type, self.kind, self.application, self.tech_prep_id,
-                self.type, self.kind, self.application, self.tech_prep_id)
-        execute_query(query, params, fetch=False, commit=True)
+    async def save(self):
+        # Обе таблицы записываются в одной транзакции
+        async with transaction():
+            # Сначала сохраняем в medication (родительскую таблицу)
+            await super().save()
+
+            # Затем сохраняем в medicine (дочернюю таблицу)
+            query = """
+                INSERT INTO medicine (id, type, kind, application, tech_prep_id)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (id) DO UPDATE 
+                SET type = %s, kind = %s, application = %s, tech_prep_id = %s
+            """
+            params = (self.id, self.type, self.kind, self.application, self.tech_prep_id,
+                    self.type, self.kind, self.application, self.tech_prep_id)
+            await execute_query_async(query, params, fetch=False, commit=True)
         return self
 
-    def get_technology(self):
-        query = "SELECT * FROM technology_of_preparation WHERE id = %s"
-        result = execute_query(query, (self.tech_prep_id,))
-        if result:
-            return Technology(*result[0])
-        return None
+    async def get_technology(self):
+        return await get_related(self, "technology")
 
-    def get_prescriptions(self):
+    async def get_prescriptions(self):
         query = "SELECT * FROM prescription WHERE medicine_id = %s"
-        results = execute_query(query, (self.id,))
+        results = await execute_query_async(query, (self.id,))
         return [Prescription(*row) for row in results]
 
-    def get_compositions(self):
+    async def get_compositions(self):
         query = """
             SELECT c.*, i.* FROM composition c
             JOIN ingredient i ON c.ingredient_id = i.id
             WHERE c.medicine_id = %s
         """
-        results = execute_query(query, (self.id,))
+        results = await execute_query_async(query, (self.id,))
         compositions = []
         for row in results:
             composition = Composition(
@@ -197,13 +487,21 @@ class Medicine(Medication):
 
 class Composition(Model):
     __tablename__ = "composition"
+    __columns__ = ("medicine_id", "ingredient_id", "amount")
+    __sort_keys__ = ()
+    __relations__ = {
+        "medicine": ("Medicine", "medicine_id"),
+        "ingredient": ("Ingredient", "ingredient_id"),
+    }
+    __cached__ = True
+    __slots__ = ("medicine_id", "ingredient_id", "amount")
 
     def __init__(self, medicine_id=None, ingredient_id=None, amount=None):
         self.medicine_id = medicine_id
         self.ingredient_id = ingredient_id
         self.amount = amount
 
-    def save(self):
+    async def save(self):
         query = """
             INSERT INTO composition (medicine_id, ingredient_id, amount)
             VALUES (%s, %s, %s)
@@ -211,17 +509,36 @@ class Composition(Model):
             SET amount = %s
         """
         params = (self.medicine_id, self.ingredient_id, self.amount, self.amount)
-        execute_query(query, params, fetch=False, commit=True)
+        await execute_query_async(query, params, fetch=False, commit=True)
+        self.invalidate_cache()
         return self
 
-    def get_medicine(self):
-        return Medicine.get_by_id(self.medicine_id)
+    @classmethod
+    async def get_all(cls):
+        query = f"SELECT {cls._select_list()} FROM composition ORDER BY medicine_id, ingredient_id"
+        results = await cls._fetch(("all",), query)
+        return [cls(*row) for row in results]
+
+    @classmethod
+    async def get_grouped_by_medicine(cls):
+        """All compositions keyed by medicine id, read in a single query."""
+        grouped = {}
+        for composition in await cls.get_all():
+            grouped.setdefault(composition.medicine_id, []).append(composition)
+        return grouped
+
+    async def get_medicine(self):
+        return await get_related(self, "medicine")
 
-    def get_ingredient(self):
-        return Ingredient.get_by_id(self.ingredient_id)
+    async def get_ingredient(self):
+        return await get_related(self, "ingredient")
 
 class Technology(Model):
     __tablename__ = "technology_of_preparation"
+    __columns__ = ("id", "description", "preparation_time")
+    __sort_keys__ = ("id", "description", "preparation_time")
+    __cached__ = True
+    __slots__ = ("id", "description", "preparation_time")
 
     def __init__(self, id=None, description=None, preparation_time=None):
         self.id = id
@@ -229,7 +546,7 @@ class Technology(Model):
         self.preparation_time = preparation_time
 
 
-    def save(self):
+    async def save(self):
         if self.id:
             query = """
                 UPDATE technology_of_preparation 
@@ -237,7 +554,7 @@ class Technology(Model):
                 WHERE id = %s
             """
             params = (self.description, self.preparation_time, self.id)
-            execute_query(query, params, fetch=False)
+            await execute_query_async(query, params, fetch=False)
         else:
             query = """
                 INSERT INTO technology_of_preparation (description, preparation_time))
@@ -245,17 +562,39 @@ class Technology(Model):
                 RETURNING id
             """
             params = (self.description, self.preparation_time)
-            result = execute_query(query, params, commit=True)
+            result = await execute_query_async(query, params, commit=True)
             self.id = result[0][0]
+        self.invalidate_cache(self.id)
         return self
 
-    def get_medicines(self):
+    async def get_medicines(self):
         query = "SELECT * FROM medicine WHERE tech_prep_id = %s"
-        results = execute_query(query, (self.id,))
+        results = await execute_query_async(query, (self.id,))
         return [Medicine(*row) for row in results]
 
 class Prescription(Model):
     __tablename__ = "prescription"
+    __columns__ = (
+        "id", "client_id", "medicine_id", "prescription_number", "doctor_surname", "doctor_name",
+        "doctor_patronymic", "signature", "stamp", "age", "diagnosis", "amount", "application",
+    )
+    __sort_keys__ = ("id", "client_id", "medicine_id", "prescription_number", "doctor_surname",
+                     "doctor_name", "age", "diagnosis", "amount")
+    __relations__ = {"medicine": ("Medicine", "medicine_id")}
+    __bulk_checks__ = (
+        ("NOT EXISTS (SELECT 1 FROM client c WHERE c.id = s.client_id)", "Client not found"),
+        ("NOT EXISTS (SELECT 1 FROM medicine m WHERE m.id = s.medicine_id)", "Medicine not found"),
+        ("s.prescription_number <= 0", "prescription_number must be positive"),
+        ("s.age < 0", "age must not be negative"),
+        ("s.amount <= 0", "amount must be positive"),
+    )
+    # A new prescription may order missing components (see migrations/0004_status_update.sql)
+    __invalidates__ = ("medicine", "ingredient")
+    __json_casts__ = {"amount": "{}::float8"}
+    __slots__ = (
+        "id", "client_id", "medicine_id", "prescription_number", "doctor_surname", "doctor_name",
+        "doctor_patronymic", "signature", "stamp", "age", "diagnosis", "amount", "application",
+    )
 
     def __init__(self, id=None, client_id=None, medicine_id=None, prescription_number=None,
                  doctor_surname=None, doctor_name=None, doctor_patronymic=None, 
@@ -275,7 +614,7 @@ class Prescription(Model):
         self.amount = amount
         self.application = application
 
-    def save(self):
+    async def save(self):
         if self.id:
             query = """
                 UPDATE prescription 
@@ -288,7 +627,7 @@ class Prescription(Model):
                       self.doctor_name, self.doctor_patronymic, self.signature,
                       self.stamp, self.age, self.diagnosis, self.amount, 
                       self.application, self.id)
-            execute_query(query, params, fetch=False)
+            await execute_query_async(query, params, fetch=False)
         else:
             query = """
                 INSERT INTO prescription 
@@ -300,20 +639,40 @@ class Prescription(Model):
             params = (self.client_id, self.medicine_id, self.prescription_number, self.doctor_surname,
                       self.doctor_name, self.doctor_patronymic, self.signature,
                       self.stamp, self.age, self.diagnosis, self.amount, self.application)
-            result = execute_query(query, params, commit=True)
+            result = await execute_query_async(query, params, commit=True)
             self.id = result[0][0]
+            self.invalidate_cache(self.id)
         return self
 
-    def get_medicine(self):
-        return Medicine.get_by_id(self.medicine_id)
+    async def get_medicine(self):
+        return await get_related(self, "medicine")
 
-    def get_orders(self):
+    async def get_orders(self):
         query = "SELECT * FROM medicine_order WHERE prescription_id = %s"
-        results = execute_query(query, (self.id,))
+        results = await execute_query_async(query, (self.id,))
         return [Order(*row) for row in results]
 
 class Order(Model):
     __tablename__ = "medicine_order"
+    __columns__ = (
+        "id", "prescription_id", "client_id", "order_number", "status", "date_of_issue",
+        "start_data", "expected_date_of_issue", "cost",
+    )
+    __sort_keys__ = ("id", "prescription_id", "client_id", "order_number", "status",
+                     "start_data", "expected_date_of_issue", "cost")
+    __relations__ = {
+        "prescription": ("Prescription", "prescription_id"),
+        "client": ("Client", "client_id"),
+    }
+    __json_casts__ = {
+        "start_data": "json_isoformat({})",
+        "expected_date_of_issue": "json_isoformat({})",
+        "cost": "{}::float8",
+    }
+    __slots__ = (
+        "id", "prescription_id", "client_id", "order_number", "status", "date_of_issue",
+        "expected_date_of_issue", "start_data", "cost",
+    )
 
     def __init__(self, id=None, prescription_id=None, client_id=None, 
                  order_number=None, status=None, date_of_issue=None,
@@ -328,7 +687,7 @@ class Order(Model):
         self.start_data = start_data
         self.cost = cost
 
-    def save(self):
+    async def save(self):
         if self.id:
             query = """
                 UPDATE medicine_order 
@@ -339,7 +698,7 @@ class Order(Model):
             params = (self.prescription_id, self.client_id, self.order_number,
                       self.status, self.date_of_issue,
                       self.start_data, self.cost, self.expected_date_of_issue, self.id)
-            execute_query(query, params, fetch=False)
+            await execute_query_async(query, params, fetch=False)
         else:
             query = """
                 INSERT INTO medicine_order 
@@ -351,18 +710,58 @@ class Order(Model):
             params = (self.prescription_id, self.client_id, self.order_number,
                        self.status, self.date_of_issue,
                       self.start_data, self.expected_date_of_issue, self.cost)
-            result = execute_query(query, params, commit=True)
+            result = await execute_query_async(query, params, commit=True)
             self.id = result[0][0]
         return self
 
-    def get_prescription(self):
-        return Prescription.get_by_id(self.prescription_id)
+    @classmethod
+    async def create(cls, prescription_id, client_id, order_number, status, date_of_issue, cost):
+        """
+        Insert an order in a single statement: the prescription and the client are
+        checked and expected_date_of_issue is computed from the preparation time of
+        the prescribed medicine on the server.
+        Returns (order or None, prescription exists, client exists).
+        """
+        columns = ", ".join(f"inserted.{column}" for column in cls.__columns__)
+        query = f"""
+            WITH source AS (
+                SELECT p.id AS prescription_id, c.id AS client_id,
+                       NOW() AS start_data, NOW() + t.preparation_time AS expected_date_of_issue
+                FROM (SELECT 1) AS one
+                LEFT JOIN prescription p ON p.id = %s
+                LEFT JOIN client c ON c.id = %s
+                LEFT JOIN medicine m ON m.id = p.medicine_id
+                LEFT JOIN technology_of_preparation t ON t.id = m.tech_prep_id
+            ), inserted AS (
+                INSERT INTO medicine_order
+                (prescription_id, client_id, order_number,
+                 status, date_of_issue, start_data, expected_date_of_issue, cost)
+                SELECT prescription_id, client_id, %s::integer,
+                       %s::order_status, %s::date, start_data, expected_date_of_issue, %s::numeric
+                FROM source
+                WHERE prescription_id IS NOT NULL AND client_id IS NOT NULL
+                  AND expected_date_of_issue IS NOT NULL
+                RETURNING *
+            )
+            SELECT source.prescription_id IS NOT NULL, source.client_id IS NOT NULL, {columns}
+            FROM source LEFT JOIN inserted ON TRUE
+        """
+        params = (prescription_id, client_id, order_number, status, date_of_issue, cost)
+        row = (await execute_query_async(query, params, commit=True))[0]
+        order = cls(*row[2:]) if row[2] is not None else None
+        return order, row[0], row[1]
+
+    async def get_prescription(self):
+        return await get_related(self, "prescription")
 
-    def get_client(self):
-        return Client.get_by_id(self.client_id)
+    async def get_client(self):
+        return await get_related(self, "client")
 
 class Client(Model):
     __tablename__ = "client"
+    __columns__ = ("id", "surname", "name", "patronymic", "phone_number")
+    __sort_keys__ = ("id", "surname", "name", "phone_number")
+    __slots__ = ("id", "surname", "name", "patronymic", "phone_number")
 
     def __init__(self, id=None, surname=None, name=None, patronymic=None, phone_number=None):
         self.id = id
@@ -371,7 +770,7 @@ class Client(Model):
         self.patronymic = patronymic
         self.phone_number = phone_number
 
-    def save(self):
+    async def save(self):
         if self.id:
             query = """
                 UPDATE client 
@@ -379,7 +778,7 @@ class Client(Model):
                 WHERE id = %s
             """
             params = (self.surname, self.name, self.patronymic, self.phone_number, self.id)
-            execute_query(query, params, fetch=False)
+            await execute_query_async(query, params, fetch=False)
         else:
             query = """
                 INSERT INTO client (surname, name, patronymic, phone_number)
@@ -387,17 +786,17 @@ class Client(Model):
                 RETURNING id
             """
             params = (self.surname, self.name, self.patronymic, self.phone_number)
-            result = execute_query(query, params, commit=True)
+            result = await execute_query_async(query, params, commit=True)
             self.id = result[0][0]
         return self
 
-    def get_orders(self):
+    async def get_orders(self):
         query = "SELECT * FROM medicine_order WHERE client_id = %s"
-        results = execute_query(query, (self.id,))
+        results = await execute_query_async(query, (self.id,))
         return [Order(*row) for row in results]
 
     @staticmethod
-    def search(surname, name, patronymic, phone_number):
+    async def search(surname, name, patronymic, phone_number):
         if patronymic is not None:
             condition = "patronymic = %s"
         else:
@@ -406,15 +805,61 @@ class Client(Model):
         query = "SELECT id FROM client WHERE surname = %s AND name = %s AND " + condition + " AND phone_number = %s"
 
         if patronymic is not None:
-            result = execute_query(query, [surname, name, patronymic, phone_number])
+            result = await execute_query_async(query, [surname, name, patronymic, phone_number])
         else:
-            result = execute_query(query, [surname, name, phone_number])
+            result = await execute_query_async(query, [surname, name, phone_number])
 
         return result[0][0] if result else None
 
+    @classmethod
+    async def lookup(cls, q, limit=10):
+        """
+        Clients matching q, best first, as (client, score) pairs.
+
+        A query made of phone characters is matched against the digits of the
+        phone number, anything else against the full name with trigram word
+        similarity, so prefixes and typos match too (see migrations/0010_client_lookup.sql).
+        """
+        q = " ".join(q.lower().split())
+        digits = re.sub(r"\D", "", q)
+        if digits and not re.search(r"[^\d\s()+-]", q):
+            if len(digits) == 11 and digits.startswith("8"):
+                digits = "7" + digits[1:]
+            query = f"""
+                SELECT {cls._select_list()}, similarity(phone_normalized, %s) AS score
+                FROM client
+                WHERE phone_normalized LIKE %s
+                ORDER BY score DESC, id
+                LIMIT %s
+            """
+            params = (digits, f"%{digits}%", limit)
+        else:
+            query = f"""
+                SELECT {cls._select_list()}, word_similarity(%s, full_name) AS score
+                FROM client
+                WHERE %s <%% full_name
+                ORDER BY score DESC, full_name, id
+                LIMIT %s
+            """
+            params = (q, q, limit)
+        results = await execute_query_async(query, params)
+        return [(cls(*row[:-1]), row[-1]) for row in results]
+
 
 class StockDelivery(Model):
     __tablename__ = "medication_delivery"
+    __columns__ = ("id", "medication_id", "application_date", "delivery_date", "amount")
+    __sort_keys__ = ("id", "medication_id", "application_date", "amount")
+    __relations__ = {"medication": ("Medication", "medication_id")}
+    __bulk_checks__ = (
+        ("NOT EXISTS (SELECT 1 FROM ONLY medication m WHERE m.id = s.medication_id)", "Medication not found"),
+        ("s.application_date > CURRENT_DATE", "application_date is in the future"),
+        ("s.delivery_date > CURRENT_DATE", "delivery_date is in the future"),
+        ("s.amount <= 0", "amount must be positive"),
+    )
+    # A new delivery adds to medication.current_amount (see migrations/0004_status_update.sql)
+    __invalidates__ = ("medicine", "ingredient")
+    __slots__ = ("id", "medication_id", "application_date", "delivery_date", "amount")
 
     def __init__(self, id=None, medication_id=None, application_date=None, 
                  delivery_date=None, amount=None):
@@ -424,7 +869,7 @@ class StockDelivery(Model):
         self.delivery_date = delivery_date
         self.amount = amount
 
-    def save(self):
+    async def save(self):
         if self.id:
             query = """
                 UPDATE medication_delivery 
@@ -434,7 +879,7 @@ class StockDelivery(Model):
             """
             params = (self.medication_id, self.application_date, 
                       self.delivery_date, self.amount, self.id)
-            execute_query(query, params, fetch=False)
+            await execute_query_async(query, params, fetch=False)
         else:
             query = """
                 INSERT INTO medication_delivery 
@@ -444,15 +889,25 @@ class StockDelivery(Model):
             """
             params = (self.medication_id, self.application_date, 
                       self.delivery_date, self.amount)
-            result = execute_query(query, params, commit=True)
+            result = await execute_query_async(query, params, commit=True)
             self.id = result[0][0]
+            self.invalidate_cache(self.id)
         return self
 
-    def get_medication(self):
-        return Medication.get_by_id(self.medication_id)
+    async def get_medication(self):
+        return await get_related(self, "medication")
 
 class Inventory(Model):
     __tablename__ = "inventory"
+    __columns__ = ("id", "medication_id", "date", "amount")
+    __sort_keys__ = ("id", "medication_id", "date", "amount")
+    __relations__ = {"medication": ("Medication", "medication_id")}
+    __bulk_checks__ = (
+        ("NOT EXISTS (SELECT 1 FROM ONLY medication m WHERE m.id = s.medication_id)", "Medication not found"),
+        ("s.date > CURRENT_DATE", "date is in the future"),
+        ("s.amount < 0", "amount must not be negative"),
+    )
+    __slots__ = ("id", "medication_id", "inventory_date", "amount")
 
     def __init__(self, id=None, medication_id=None, date=None, amount=None):
         self.id = id
@@ -460,7 +915,7 @@ class Inventory(Model):
         self.inventory_date = date
         self.amount = amount
 
-    def save(self):
+    async def save(self):
         if self.id:
             query = """
                 UPDATE inventory 
@@ -468,7 +923,7 @@ class Inventory(Model):
                 WHERE id = %s
             """
             params = (self.medication_id, self.inventory_date, self.amount, self.id)
-            execute_query(query, params, fetch=False)
+            await execute_query_async(query, params, fetch=False)
         else:
             query = """
                 INSERT INTO inventory (medication_id, date, amount)
@@ -476,9 +931,9 @@ class Inventory(Model):
                 RETURNING id
             """
             params = (self.medication_id, self.inventory_date, self.amount)
-            result = execute_query(query, params, commit=True)
+            result = await execute_query_async(query, params, commit=True)
             self.id = result[0][0]
         return self
 
-    def get_medication(self):
-        return Medication.get_by_id(self.medication_id)
+    async def get_medication(self):
+        return await get_related(self, "medication")
@@ -0,0 +1,214 @@
+import bisect
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+
+class PoolTimeout(PoolError):
+    """No connection became free within the pool timeout."""
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool.
+
+    When all connections are in use, getconn waits up to `timeout` seconds for one
+    to be returned instead of failing at once. Connections older than `max_lifetime`
+    are closed and replaced, and connections idle for longer than `ping_after` are
+    checked with a round trip before being handed out.
+
+    closeall closes the idle connections and closes the pool: getconn fails from
+    then on, and connections still in use are closed when they are returned.
+    """
+
+    # Upper bounds (ms) of the wait-time histogram buckets
+    WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+    def __init__(self, minconn, maxconn, timeout=30.0, max_lifetime=3600.0, ping_after=60.0, **kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self._kwargs = kwargs
+
+        self._idle = deque()
+        self._in_use = {}
+        self._opened = 0  # idle + in use + being opened
+        self._waiters = 0
+        self._closed = False
+        self._lock = threading.Condition()
+
+        self._wait_histogram = [0] * (len(self.WAIT_BUCKETS_MS) + 1)
+        self._wait_total_ms = 0.0
+        self._requests = 0
+        self._timeouts = 0
+        self._recycled = 0
+        self._ping_failures = 0
+
+        for _ in range(minconn):
+            self._idle.append(self._connect())
+            self._opened += 1
+
+    def _connect(self):
+        return _PooledConnection(psycopg2.connect(**self._kwargs))
+
+    def _expired(self, pooled):
+        return time.monotonic() - pooled.created_at > self.max_lifetime
+
+    def _alive(self, pooled):
+        if pooled.conn.closed:
+            return False
+        if time.monotonic() - pooled.last_used < self.ping_after:
+            return True
+        try:
+            with pooled.conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            pooled.conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, pooled):
+        try:
+            pooled.conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            pooled = None
+            with self._lock:
+                while not self._closed and not self._idle and self._opened >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"no database connection available within {self.timeout:g}s"
+                        )
+                    self._waiters += 1
+                    try:
+                        self._lock.wait(remaining)
+                    finally:
+                        self._waiters -= 1
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                if self._idle:
+                    pooled = self._idle.pop()
+                else:
+                    self._opened += 1
+
+            # Checks and connects happen outside the lock, they need a round trip
+            if pooled is None:
+                try:
+                    pooled = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                        self._lock.notify()
+                    raise
+            else:
+                expired = self._expired(pooled)
+                if expired or not self._alive(pooled):
+                    self._discard(pooled)
+                    with self._lock:
+                        self._recycled += 1
+                        if not expired:
+                            self._ping_failures += 1
+                        self._opened -= 1
+                        self._lock.notify()
+                    continue
+
+            with self._lock:
+                closed = self._closed
+                if not closed:
+                    self._in_use[id(pooled.conn)] = pooled
+                    self._record_wait((time.monotonic() - start) * 1000)
+                else:
+                    self._opened -= 1
+            if closed:
+                # closeall ran while this connection was being opened or checked
+                self._discard(pooled)
+                raise PoolError("connection pool is closed")
+            return pooled.conn
+
+    def putconn(self, conn, close=False):
+        with self._lock:
+            pooled = self._in_use.pop(id(conn), None)
+        if pooled is None:
+            raise PoolError("trying to put unkeyed connection")
+
+        if self._closed:
+            self._discard(pooled)
+            with self._lock:
+                self._opened -= 1
+            return
+
+        if not close and not conn.closed:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+        if close or conn.closed or self._expired(pooled):
+            self._discard(pooled)
+            with self._lock:
+                self._recycled += 1
+                self._opened -= 1
+                self._lock.notify()
+            return
+
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(pooled)
+            self._lock.notify()
+
+    def closeall(self):
+        """Close the idle connections and the pool; connections in use are closed by putconn."""
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._opened -= len(idle)
+            # Threads waiting in getconn fail instead of waiting for the timeout
+            self._lock.notify_all()
+        for pooled in idle:
+            self._discard(pooled)
+
+    def _record_wait(self, wait_ms):
+        self._requests += 1
+        self._wait_total_ms += wait_ms
+        self._wait_histogram[bisect.bisect_left(self.WAIT_BUCKETS_MS, wait_ms)] += 1
+
+    def stats(self):
+        with self._lock:
+            labels = [f"<={bound}ms" for bound in self.WAIT_BUCKETS_MS]
+            labels.append(f">{self.WAIT_BUCKETS_MS[-1]}ms")
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "requests": self._requests,
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+                "ping_failures": self._ping_failures,
+                "wait_avg_ms": self._wait_total_ms / self._requests if self._requests else 0.0,
+                "wait_histogram": dict(zip(labels, self._wait_histogram)),
+            }
@@ -0,0 +1,170 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import psycopg2
+from psycopg2 import errors, extensions
+
+# A statement is prepared on a connection once it has been executed this many
+# times in the process; 0 turns prepared statements off.
+PREPARE_THRESHOLD = int(os.environ.get("DB_PREPARE_THRESHOLD", "2"))
+# Prepared statements kept per connection, least recently used ones are deallocated.
+PREPARED_MAX = int(os.environ.get("DB_PREPARED_MAX", "100"))
+# Query texts whose executions are counted, least recently seen ones are forgotten.
+TRACKED_MAX = int(os.environ.get("DB_PREPARE_TRACKED_MAX", "1000"))
+
+_PREPARABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+_PLACEHOLDER = re.compile(r"%s|%%")
+
+_usage = OrderedDict()  # query text -> executions
+_unpreparable = OrderedDict()  # query text -> None
+_stats_lock = threading.Lock()
+_stats = {"prepared": 0, "executed": 0, "failed": 0}
+
+
+class PreparingConnection(extensions.connection):
+    """
+    Connection that remembers the statements it has prepared server-side.
+    The cache lives and dies with the connection, so a reconnect starts empty.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = OrderedDict()  # query text -> statement name
+        self.stale = []  # statements to deallocate once the failed transaction is rolled back
+        self._counter = 0
+
+    def next_statement_name(self):
+        self._counter += 1
+        return f"stmt_{self._counter}"
+
+
+def _remember(queries, query, value):
+    """Store value for query in an LRU of at most TRACKED_MAX query texts."""
+    with _stats_lock:
+        queries[query] = value
+        queries.move_to_end(query)
+        if len(queries) > TRACKED_MAX:
+            queries.popitem(last=False)
+
+
+def _to_server_placeholders(query, param_count):
+    """Rewrite %s placeholders as $1..$n, or return None if the query can't be prepared."""
+    numbers = iter(range(1, param_count + 1))
+    placeholders = 0
+
+    def replace(match):
+        nonlocal placeholders
+        if match.group(0) == "%%":
+            return "%"
+        placeholders += 1
+        return f"${next(numbers, 0)}"
+
+    converted = _PLACEHOLDER.sub(replace, query)
+    if placeholders != param_count or "%(" in query:
+        return None
+    return converted
+
+
+def _preparable(query, params):
+    if PREPARE_THRESHOLD <= 0 or query in _unpreparable:
+        return False
+    if params is None:
+        # psycopg2 leaves %% untouched without parameters, keep it that way
+        if "%" in query:
+            return False
+    elif not isinstance(params, (list, tuple)):
+        return False
+    statement = query.strip().rstrip(";")
+    return ";" not in statement and statement[:6].upper().startswith(_PREPARABLE)
+
+
+def _plan_invalidated(error):
+    """Whether EXECUTE failed because of the prepared statement rather than the query."""
+    if isinstance(error, errors.InvalidSqlStatementName):
+        return True
+    # The plan went stale after a schema change
+    return (isinstance(error, errors.FeatureNotSupported)
+            and "cached plan must not change result type" in str(error))
+
+
+def _deallocate_stale(cur):
+    conn = cur.connection
+    while conn.stale:
+        cur.execute(f"DEALLOCATE {conn.stale.pop()}")
+    # Only called between transactions, the one opened for DEALLOCATE holds nothing else
+    conn.commit()
+
+
+def _prepare(cur, query, params):
+    conn = cur.connection
+    if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+        # A failed PREPARE would abort the caller's transaction
+        return None
+    server_query = _to_server_placeholders(query, len(params or ()))
+    if server_query is None:
+        _remember(_unpreparable, query, None)
+        return None
+
+    name = conn.next_statement_name()
+    try:
+        cur.execute(f"PREPARE {name} AS {server_query}")
+    except psycopg2.Error:
+        conn.rollback()
+        _remember(_unpreparable, query, None)
+        with _stats_lock:
+            _stats["failed"] += 1
+        return None
+
+    conn.prepared[query] = name
+    if len(conn.prepared) > PREPARED_MAX:
+        _, oldest = conn.prepared.popitem(last=False)
+        cur.execute(f"DEALLOCATE {oldest}")
+    with _stats_lock:
+        _stats["prepared"] += 1
+    return name
+
+
+def execute(cur, query, params=None):
+    """
+    Execute a query on the cursor, through a prepared statement once the
+    same query text has been seen PREPARE_THRESHOLD times.
+    """
+    conn = cur.connection
+    if not isinstance(conn, PreparingConnection) or not _preparable(query, params):
+        cur.execute(query, params)
+        return
+    if conn.stale and conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE:
+        _deallocate_stale(cur)
+
+    name = conn.prepared.get(query)
+    if name is None:
+        count = _usage.get(query, 0) + 1
+        _remember(_usage, query, count)
+        if count >= PREPARE_THRESHOLD:
+            name = _prepare(cur, query, params)
+        if name is None:
+            cur.execute(query, params)
+            return
+    else:
+        conn.prepared.move_to_end(query)
+
+    arguments = f" ({', '.join(['%s'] * len(params))})" if params else ""
+    try:
+        cur.execute(f"EXECUTE {name}{arguments}", params)
+    except psycopg2.Error as error:
+        if _plan_invalidated(error):
+            # Prepare again next time
+            del conn.prepared[query]
+            if not isinstance(error, errors.InvalidSqlStatementName):
+                # DEALLOCATE can't run in the aborted transaction, it waits for the rollback
+                conn.stale.append(name)
+        raise
+    with _stats_lock:
+        _stats["executed"] += 1
+
+
+def get_prepared_stats():
+    with _stats_lock:
+        return dict(_stats, distinct_statements=len(_usage))
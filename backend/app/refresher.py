@@ -0,0 +1,90 @@
+import os
+import time
+
+from .background import PeriodicTask
+
+# Set ANALYTICS_REFRESH=0 to never refresh the views from this process
+ANALYTICS_REFRESH = os.environ.get("ANALYTICS_REFRESH", "1") == "1"
+# A view is refreshed once it is this many seconds old...
+ANALYTICS_REFRESH_INTERVAL = float(os.environ.get("ANALYTICS_REFRESH_INTERVAL", "300"))
+# ...or once medicine_order has been written this many times since (0: interval only)
+ANALYTICS_REFRESH_AFTER_ORDERS = int(os.environ.get("ANALYTICS_REFRESH_AFTER_ORDERS", "100"))
+# Seconds between checks
+ANALYTICS_REFRESH_CHECK = float(os.environ.get("ANALYTICS_REFRESH_CHECK", "5"))
+
+# Materialized views of migrations/0005_views_and_functions.sql
+ANALYTICS_VIEWS = ("medication_order_counts", "ingredient_usage_daily", "client_medicine_order_counts")
+
+# Advisory lock held while refreshing, so that only one API process refreshes at a time
+_REFRESH_LOCK_KEY = 7301
+
+
+class AnalyticsRefresher(PeriodicTask):
+    """
+    Background thread refreshing the analytics materialized views.
+
+    Whether a view is due is decided in the database from analytics_refresh_state
+    and the medicine_order version in table_versions, so every API process agrees
+    on it. REFRESH ... CONCURRENTLY keeps the views readable while it runs.
+    """
+
+    name = "analytics-refresher"
+
+    def __init__(self):
+        super().__init__(ANALYTICS_REFRESH_CHECK)
+        self._refreshes = 0
+        self._last_duration_ms = None
+
+    def run_once(self, conn):
+        self.refresh_due(conn)
+
+    def refresh_due(self, conn, force=False):
+        """Refresh the views that are due (all of them with force). Returns their names."""
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s)", (_REFRESH_LOCK_KEY,))
+            if not cur.fetchone()[0]:
+                # Another process is refreshing
+                return []
+            try:
+                cur.execute(
+                    """
+                    SELECT s.view_name, v.version,
+                           %s OR NOW() - s.refreshed_at >= make_interval(secs => %s)
+                              OR (%s > 0 AND v.version - s.order_version >= %s)
+                    FROM analytics_refresh_state s
+                    JOIN table_versions v ON v.table_name = 'medicine_order'
+                    WHERE s.view_name = ANY(%s)
+                    """,
+                    (force, ANALYTICS_REFRESH_INTERVAL, ANALYTICS_REFRESH_AFTER_ORDERS,
+                     ANALYTICS_REFRESH_AFTER_ORDERS, list(ANALYTICS_VIEWS))
+                )
+                due = [(view, version) for view, version, is_due in cur.fetchall() if is_due]
+                start = time.perf_counter()
+                for view, version in due:
+                    cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+                    cur.execute(
+                        "UPDATE analytics_refresh_state SET refreshed_at = NOW(), order_version = %s "
+                        "WHERE view_name = %s",
+                        (version, view)
+                    )
+                if due:
+                    with self._lock:
+                        self._refreshes += 1
+                        self._last_duration_ms = (time.perf_counter() - start) * 1000
+                return [view for view, _ in due]
+            finally:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (_REFRESH_LOCK_KEY,))
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats.update(
+                refresh_interval=ANALYTICS_REFRESH_INTERVAL,
+                after_orders=ANALYTICS_REFRESH_AFTER_ORDERS,
+                refreshes=self._refreshes,
+                last_duration_ms=self._last_duration_ms,
+            )
+        return stats
+
+
+refresher = AnalyticsRefresher()
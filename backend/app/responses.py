@@ -0,0 +1,55 @@
+import json
+import os
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library encoder is used without it
+    orjson = None
+
+from .serializers import convert_value
+
+# Set FAST_JSON=1 to send list responses as FastJSONResponse, skipping the
+# response_model validation (see benchmarks/json_responses.py)
+FAST_JSON = os.environ.get("FAST_JSON", "0") == "1"
+# Set PG_JSON=1 to have Postgres build the JSON of the largest listings (see
+# Model.get_page_json); needs migrations/0011_json_output.sql
+PG_JSON = os.environ.get("PG_JSON", "0") == "1"
+
+
+def _default(value):
+    converted = convert_value(value)
+    if converted is value:
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    return converted
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse encoded with orjson when it is installed. The content is
+    expected to be JSON-ready already (see serializers.to_dicts).
+    """
+
+    def render(self, content):
+        if orjson is not None:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_json(content, response=None):
+    """
+    Return content from a list or report route without FastAPI validating and
+    re-encoding it against the route's response_model, which still documents
+    the route in the OpenAPI schema. Headers the route's dependencies set on the
+    injected `response` are carried over.
+    """
+    if not FAST_JSON:
+        return content
+    return FastJSONResponse(content, headers=dict(response.headers) if response is not None else None)
+
+
+def raw_json(text, response=None):
+    """Send JSON text built elsewhere (by the database) as it is, with the headers set on `response`."""
+    return Response(text.encode("utf-8"), media_type="application/json",
+                    headers=dict(response.headers) if response is not None else None)
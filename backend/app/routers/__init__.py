@@ -10,5 +10,6 @@ from . import (
     client,
     delivery,
     inventory,
-    prescription
+    prescription,
+    stats
 )
\ No newline at end of file
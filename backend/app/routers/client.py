@@ -1,14 +1,16 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 
 from ..models import Client
-from .queries import model_to_dict
+from ..serializers import to_dict
+from .queries import PageParams, paginate, table_response, conditional_get
 
 router = APIRouter(
     prefix="/clients",
     tags=["clients"],
     responses={404: {"description": "Not found"}},
+    dependencies=[Depends(conditional_get("client"))],
 )
 
 CLIENT_FIELD_TRANSLATIONS = {
@@ -22,6 +24,7 @@ CLIENT_FIELD_TRANSLATIONS = {
 class ClientListResponse(BaseModel):
     data: List[Dict[str, Any]]
     headers: Dict[str, str]
+    next_cursor: Optional[int] = None
 
 class ClientCreate(BaseModel):
     surname: str
@@ -36,20 +39,17 @@ class ClientUpdate(BaseModel):
     phone_number: Optional[str] = None
 
 @router.get("/", response_model=ClientListResponse)
-async def read_clients():
+async def read_clients(response: Response, page: PageParams = Depends()):
     """
     Get all clients.
     """
-    clients = Client.get_all()
-    client_dicts = [model_to_dict(client) for client in clients]
-    return {
-        "data": client_dicts,
-        "headers": CLIENT_FIELD_TRANSLATIONS,
-    }
+    client_dicts, next_cursor = await paginate(Client, page)
+    return table_response(client_dicts, CLIENT_FIELD_TRANSLATIONS,
+                          response, page.format, next_cursor=next_cursor)
 
 @router.get("/search", response_model=List[dict])
 async def search_clients(surname: Optional[str] = None, name: Optional[str] = None, patronymic: Optional[str] = None, phone_number: Optional[str] = None):
-    client_id = Client.search(surname, name, patronymic, phone_number)
+    client_id = await Client.search(surname, name, patronymic, phone_number)
     if client_id is None:
         new_client = Client(
             surname=surname,
@@ -57,7 +57,16 @@ async def search_clients(surname: Optional[str] = None, name: Optional[str] = No
             patronymic=patronymic,
             phone_number=phone_number
         )
-        new_client.save()
+        await new_client.save()
+
+
+@router.get("/lookup", response_model=List[dict])
+async def lookup_clients(q: str = Query(..., min_length=3, max_length=100), limit: int = Query(10, ge=1, le=50)):
+    """
+    Clients matching a part of the full name or phone number, best matches first.
+    """
+    matches = await Client.lookup(q, limit)
+    return [dict(to_dict(client), score=score) for client, score in matches]
 
 
 @router.get("/{client_id}", response_model=dict)
@@ -65,10 +74,10 @@ async def read_client(client_id: int):
     """
     Get a specific client by ID.
     """
-    client = Client.get_by_id(client_id)
+    client = await Client.get_by_id(client_id)
     if client is None:
         raise HTTPException(status_code=404, detail="Client not found")
-    return model_to_dict(client)
+    return to_dict(client)
 
 @router.post("/", response_model=dict)
 async def create_client(client: ClientCreate):
@@ -81,16 +90,16 @@ async def create_client(client: ClientCreate):
         patronymic=client.patronymic,
         phone_number=client.phone_number
     )
-    new_client.save()
+    await new_client.save()
     
-    return model_to_dict(new_client)
+    return to_dict(new_client)
 
 @router.put("/{client_id}", response_model=dict)
 async def update_client(client_id: int, client: ClientUpdate):
     """
     Update a client.
     """
-    existing_client = Client.get_by_id(client_id)
+    existing_client = await Client.get_by_id(client_id)
     if existing_client is None:
         raise HTTPException(status_code=404, detail="Client not found")
 
@@ -107,9 +116,9 @@ async def update_client(client_id: int, client: ClientUpdate):
         existing_client.phone_number = client.phone_number
     
     # Save the updated client
-    existing_client.save()
+    await existing_client.save()
     
-    return model_to_dict(existing_client)
+    return to_dict(existing_client)
 
 @router.delete("/{client_id}", status_code=204)
 async def delete_client(client_id: int):
@@ -117,13 +126,13 @@ async def delete_client(client_id: int):
     Delete a client.
     """
     # Check if client exists
-    client = Client.get_by_id(client_id)
+    client = await Client.get_by_id(client_id)
     if client is None:
         raise HTTPException(status_code=404, detail="Client not found")
     
     # Delete the client
-    from ..database import execute_query
+    from ..database import execute_query_async
     query = "DELETE FROM client WHERE id = %s"
-    execute_query(query, (client_id,), fetch=False)
+    await execute_query_async(query, (client_id,), fetch=False)
     
     return None
\ No newline at end of file
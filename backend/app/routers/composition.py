@@ -1,14 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from typing import List, Dict, Any
 from pydantic import BaseModel
 
 from ..models import Composition, Medicine, Ingredient
-from .queries import model_to_dict
+from ..responses import fast_json
+from ..serializers import to_dict, to_dicts
+from .queries import PayloadFormat, table_response, conditional_get
 
 router = APIRouter(
     prefix="/compositions",
     tags=["compositions"],
     responses={404: {"description": "Not found"}},
+    dependencies=[Depends(conditional_get("composition"))],
 )
 
 COMPOSITION_FIELD_TRANSLATIONS = {
@@ -27,31 +30,35 @@ class CompositionCreate(BaseModel):
     amount: float
 
 @router.get("/", response_model=CompositionListResponse)
-async def read_compositions():
+async def read_compositions(response: Response, format: PayloadFormat = PayloadFormat.ROWS):
     """
     Get all compositions.
     """
-    # Since Composition doesn't have a get_all method, we need to get all medicines and their compositions
-    compositions = []
-    medicines = Medicine.get_all()
-    for medicine in medicines:
-        medicine_compositions = medicine.get_compositions()
-        compositions.extend(medicine_compositions)
-    composition_dicts = [model_to_dict(composition) for composition in compositions]
-    return {
-        "data": composition_dicts,
-        "headers": COMPOSITION_FIELD_TRANSLATIONS
-    }
+    compositions = await Composition.get_all()
+    composition_dicts = to_dicts(compositions)
+    return table_response(composition_dicts, COMPOSITION_FIELD_TRANSLATIONS, response, format)
+
+@router.get("/by-medicine", response_model=Dict[int, List[dict]])
+async def read_compositions_grouped_by_medicine(response: Response):
+    """
+    Get all compositions grouped by medicine ID.
+    """
+    grouped = await Composition.get_grouped_by_medicine()
+    return fast_json({
+        medicine_id: to_dicts(compositions)
+        for medicine_id, compositions in grouped.items()
+    }, response)
+
 @router.get("/medicine/{medicine_id}", response_model=List[dict])
 async def read_compositions_by_medicine(medicine_id: int):
     """
     Get all compositions for a specific medicine.
     """
-    medicine = Medicine.get_by_id(medicine_id)
+    medicine = await Medicine.get_by_id(medicine_id)
     if medicine is None:
         raise HTTPException(status_code=404, detail="Medicine not found")
-    compositions = medicine.get_compositions()
-    return [model_to_dict(composition) for composition in compositions]
+    compositions = await medicine.get_compositions()
+    return to_dicts(compositions)
 
 @router.post("/", response_model=dict)
 async def create_composition(composition: CompositionCreate):
@@ -59,12 +66,12 @@ async def create_composition(composition: CompositionCreate):
     Create a new composition.
     """
     # Check if medicine exists
-    medicine = Medicine.get_by_id(composition.medicine_id)
+    medicine = await Medicine.get_by_id(composition.medicine_id)
     if medicine is None:
         raise HTTPException(status_code=404, detail="Medicine not found")
     
     # Check if ingredient exists
-    ingredient = Ingredient.get_by_id(composition.ingredient_id)
+    ingredient = await Ingredient.get_by_id(composition.ingredient_id)
     if ingredient is None:
         raise HTTPException(status_code=404, detail="Ingredient not found")
     
@@ -74,9 +81,9 @@ async def create_composition(composition: CompositionCreate):
         ingredient_id=composition.ingredient_id,
         amount=composition.amount
     )
-    new_composition.save()
+    await new_composition.save()
     
-    return model_to_dict(new_composition)
+    return to_dict(new_composition)
 
 @router.delete("/{medicine_id}/{ingredient_id}", status_code=204)
 async def delete_composition(medicine_id: int, ingredient_id: int):
@@ -84,17 +91,17 @@ async def delete_composition(medicine_id: int, ingredient_id: int):
     Delete a composition.
     """
     # Check if medicine exists
-    medicine = Medicine.get_by_id(medicine_id)
+    medicine = await Medicine.get_by_id(medicine_id)
     if medicine is None:
         raise HTTPException(status_code=404, detail="Medicine not found")
     
     # Check if ingredient exists
-    ingredient = Ingredient.get_by_id(ingredient_id)
+    ingredient = await Ingredient.get_by_id(ingredient_id)
     if ingredient is None:
         raise HTTPException(status_code=404, detail="Ingredient not found")
     
     # Check if composition exists
-    compositions = medicine.get_compositions()
+    compositions = await medicine.get_compositions()
     composition_exists = False
     for composition in compositions:
         if composition.ingredient_id == ingredient_id:
@@ -105,8 +112,9 @@ async def delete_composition(medicine_id: int, ingredient_id: int):
         raise HTTPException(status_code=404, detail="Composition not found")
     
     # Delete the composition
-    from ..database import execute_query
+    from ..database import execute_query_async
     query = "DELETE FROM composition WHERE medicine_id = %s AND ingredient_id = %s"
-    execute_query(query, (medicine_id, ingredient_id), fetch=False)
+    await execute_query_async(query, (medicine_id, ingredient_id), fetch=False)
+    Composition.invalidate_cache()
     
     return None
\ No newline at end of file
@@ -1,15 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 from datetime import date
 
 from ..models import StockDelivery, Medication
-from .queries import model_to_dict
+from ..serializers import to_dict
+from .queries import PageParams, paginate, BulkCreateResponse, bulk_create, table_response, conditional_get
 
 router = APIRouter(
     prefix="/deliveries",
     tags=["deliveries"],
     responses={404: {"description": "Not found"}},
+    dependencies=[Depends(conditional_get("medication_delivery"))],
 )
 
 DELIVERY_FIELD_TRANSLATIONS = {
@@ -22,6 +24,7 @@ DELIVERY_FIELD_TRANSLATIONS = {
 class DeliveryListResponse(BaseModel):
     data: List[Dict[str, Any]]
     headers: Dict[str, str]
+    next_cursor: Optional[int] = None
 
 class DeliveryCreate(BaseModel):
     medication_id: int
@@ -36,26 +39,34 @@ class DeliveryUpdate(BaseModel):
     amount: Optional[float] = None
 
 @router.get("/", response_model=DeliveryListResponse)
-async def read_deliveries():
+async def read_deliveries(response: Response, page: PageParams = Depends()):
     """
     Get all medication deliveries.
     """
-    deliveries = StockDelivery.get_all()
-    delivery_dicts = [model_to_dict(delivery) for delivery in deliveries]
-    return {
-        "data": delivery_dicts,
-        "headers": DELIVERY_FIELD_TRANSLATIONS,
-    }
+    delivery_dicts, next_cursor = await paginate(StockDelivery, page)
+    return table_response(delivery_dicts, DELIVERY_FIELD_TRANSLATIONS,
+                          response, page.format, next_cursor=next_cursor)
+
+@router.post("/bulk", response_model=BulkCreateResponse)
+async def create_deliveries_bulk(deliveries: List[DeliveryCreate]):
+    """
+    Create many medication deliveries at once.
+    Valid rows are inserted, the others are reported by their index in the list.
+    """
+    return await bulk_create(
+        StockDelivery, deliveries,
+        ("medication_id", "application_date", "delivery_date", "amount")
+    )
 
 @router.get("/{delivery_id}", response_model=dict)
 async def read_delivery(delivery_id: int):
     """
     Get a specific medication delivery by ID.
     """
-    delivery = StockDelivery.get_by_id(delivery_id)
+    delivery = await StockDelivery.get_by_id(delivery_id)
     if delivery is None:
         raise HTTPException(status_code=404, detail="Medication delivery not found")
-    return model_to_dict(delivery)
+    return to_dict(delivery)
 
 @router.post("/", response_model=dict)
 async def create_delivery(delivery: DeliveryCreate):
@@ -63,7 +74,7 @@ async def create_delivery(delivery: DeliveryCreate):
     Create a new medication delivery.
     """
     # Check if medication exists
-    medication = Medication.get_by_id(delivery.medication_id)
+    medication = await Medication.get_by_id(delivery.medication_id)
     if medication is None:
         raise HTTPException(status_code=404, detail="Medication not found")
     
@@ -74,9 +85,9 @@ async def create_delivery(delivery: DeliveryCreate):
         delivery_date=delivery.delivery_date,
         amount=delivery.amount
     )
-    new_delivery.save()
+    await new_delivery.save()
     
-    return model_to_dict(new_delivery)
+    return to_dict(new_delivery)
 
 @router.put("/{delivery_id}", response_model=dict)
 async def update_delivery(delivery_id: int, delivery: DeliveryUpdate):
@@ -84,14 +95,14 @@ async def update_delivery(delivery_id: int, delivery: DeliveryUpdate):
     Update a medication delivery.
     """
     # Check if delivery exists
-    existing_delivery = StockDelivery.get_by_id(delivery_id)
+    existing_delivery = await StockDelivery.get_by_id(delivery_id)
     if existing_delivery is None:
         raise HTTPException(status_code=404, detail="Medication delivery not found")
     
     # Update delivery fields if provided
     if delivery.medication_id is not None:
         # Check if medication exists
-        medication = Medication.get_by_id(delivery.medication_id)
+        medication = await Medication.get_by_id(delivery.medication_id)
         if medication is None:
             raise HTTPException(status_code=404, detail="Medication not found")
         existing_delivery.medication_id = delivery.medication_id
@@ -106,9 +117,9 @@ async def update_delivery(delivery_id: int, delivery: DeliveryUpdate):
         existing_delivery.amount = delivery.amount
     
     # Save the updated delivery
-    existing_delivery.save()
+    await existing_delivery.save()
     
-    return model_to_dict(existing_delivery)
+    return to_dict(existing_delivery)
 
 @router.delete("/{delivery_id}", status_code=204)
 async def delete_delivery(delivery_id: int):
@@ -116,13 +127,13 @@ async def delete_delivery(delivery_id: int):
     Delete a medication delivery.
     """
     # Check if delivery exists
-    delivery = StockDelivery.get_by_id(delivery_id)
+    delivery = await StockDelivery.get_by_id(delivery_id)
     if delivery is None:
         raise HTTPException(status_code=404, detail="Medication delivery not found")
     
     # Delete the delivery
-    from ..database import execute_query
+    from ..database import execute_query_async
     query = "DELETE FROM medication_delivery WHERE id = %s"
-    execute_query(query, (delivery_id,), fetch=False)
+    await execute_query_async(query, (delivery_id,), fetch=False)
     
     return None
\ No newline at end of file
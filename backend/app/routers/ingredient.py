@@ -1,13 +1,15 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Response
+from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 from ..models import Ingredient
-from .queries import model_to_dict
+from ..serializers import to_dict
+from .queries import PageParams, paginate, table_response, conditional_get
 
 router = APIRouter(
     prefix="/ingredients",
     tags=["ingredients"],
     responses={404: {"description": "Not found"}},
+    dependencies=[Depends(conditional_get("ingredient"))],
 )
 
 INGREDIENT_FIELD_TRANSLATIONS = {
@@ -29,25 +31,23 @@ INGREDIENT_FIELD_TRANSLATIONS = {
 class IngredientListResponse(BaseModel):
     data: List[Dict[str, Any]]
     headers: Dict[str, str]
+    next_cursor: Optional[int] = None
 
 @router.get("/", response_model=IngredientListResponse)
-async def read_ingredients():
+async def read_ingredients(response: Response, page: PageParams = Depends()):
     """
     Get all ingredients.
     """
-    ingredients = Ingredient.get_all()
-    ingredient_dicts = [model_to_dict(ingredient) for ingredient in ingredients]
-    return {
-        "data": ingredient_dicts,
-        "headers": INGREDIENT_FIELD_TRANSLATIONS
-    }
+    ingredient_dicts, next_cursor = await paginate(Ingredient, page)
+    return table_response(ingredient_dicts, INGREDIENT_FIELD_TRANSLATIONS,
+                          response, page.format, next_cursor=next_cursor)
 
 @router.get("/{ingredient_id}", response_model=dict)
 async def read_ingredient(ingredient_id: int):
     """
     Get a specific ingredient by ID.
     """
-    ingredient = Ingredient.get_by_id(ingredient_id)
+    ingredient = await Ingredient.get_by_id(ingredient_id)
     if ingredient is None:
         raise HTTPException(status_code=404, detail="Ingredient not found")
-    return model_to_dict(ingredient)
\ No newline at end of file
+    return to_dict(ingredient)
\ No newline at end of file
@@ -1,15 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 from datetime import date
 
 from ..models import Inventory, Medication
-from .queries import model_to_dict
+from ..serializers import to_dict
+from .queries import PageParams, paginate, BulkCreateResponse, bulk_create, table_response, conditional_get
 
 router = APIRouter(
     prefix="/inventories",
     tags=["inventories"],
     responses={404: {"description": "Not found"}},
+    dependencies=[Depends(conditional_get("inventory"))],
 )
 
 INVENTORY_FIELD_TRANSLATIONS = {
@@ -21,6 +23,7 @@ INVENTORY_FIELD_TRANSLATIONS = {
 class InventoryListResponse(BaseModel):
     data: List[Dict[str, Any]]
     headers: Dict[str, str]
+    next_cursor: Optional[int] = None
 
 class InventoryCreate(BaseModel):
     medication_id: int
@@ -33,26 +36,31 @@ class InventoryUpdate(BaseModel):
     amount: Optional[int] = None
 
 @router.get("/", response_model=InventoryListResponse)
-async def read_inventories():
+async def read_inventories(response: Response, page: PageParams = Depends()):
     """
     Get all inventories.
     """
-    inventories = Inventory.get_all()
-    inventory_dicts = [model_to_dict(inventory) for inventory in inventories]
-    return {
-        "data": inventory_dicts,
-        "headers": INVENTORY_FIELD_TRANSLATIONS
-    }
+    inventory_dicts, next_cursor = await paginate(Inventory, page)
+    return table_response(inventory_dicts, INVENTORY_FIELD_TRANSLATIONS,
+                          response, page.format, next_cursor=next_cursor)
+
+@router.post("/bulk", response_model=BulkCreateResponse)
+async def create_inventories_bulk(inventories: List[InventoryCreate]):
+    """
+    Create many inventory records at once.
+    Valid rows are inserted, the others are reported by their index in the list.
+    """
+    return await bulk_create(Inventory, inventories, ("medication_id", "inventory_date", "amount"))
 
 @router.get("/{inventory_id}", response_model=dict)
 async def read_inventory(inventory_id: int):
     """
     Get a specific inventory by ID.
     """
-    inventory = Inventory.get_by_id(inventory_id)
+    inventory = await Inventory.get_by_id(inventory_id)
     if inventory is None:
         raise HTTPException(status_code=404, detail="Inventory not found")
-    return model_to_dict(inventory)
+    return to_dict(inventory)
 
 @router.post("/", response_model=dict)
 async def create_inventory(inventory: InventoryCreate):
@@ -60,7 +68,7 @@ async def create_inventory(inventory: InventoryCreate):
     Create a new inventory.
     """
     # Check if medication exists
-    medication = Medication.get_by_id(inventory.medication_id)
+    medication = await Medication.get_by_id(inventory.medication_id)
     if medication is None:
         raise HTTPException(status_code=404, detail="Medication not found")
     
@@ -70,9 +78,9 @@ async def create_inventory(inventory: InventoryCreate):
         date=inventory.inventory_date,
         amount=inventory.amount
     )
-    new_inventory.save()
+    await new_inventory.save()
     
-    return model_to_dict(new_inventory)
+    return to_dict(new_inventory)
 
 @router.put("/{inventory_id}", response_model=dict)
 async def update_inventory(inventory_id: int, inventory: InventoryUpdate):
@@ -80,14 +88,14 @@ async def update_inventory(inventory_id: int, inventory: InventoryUpdate):
     Update an inventory.
     """
     # Check if inventory exists
-    existing_inventory = Inventory.get_by_id(inventory_id)
+    existing_inventory = await Inventory.get_by_id(inventory_id)
     if existing_inventory is None:
         raise HTTPException(status_code=404, detail="Inventory not found")
     
     # Update inventory fields if provided
     if inventory.medication_id is not None:
         # Check if medication exists
-        medication = Medication.get_by_id(inventory.medication_id)
+        medication = await Medication.get_by_id(inventory.medication_id)
         if medication is None:
             raise HTTPException(status_code=404, detail="Medication not found")
         existing_inventory.medication_id = inventory.medication_id
@@ -99,9 +107,9 @@ async def update_inventory(inventory_id: int, inventory: InventoryUpdate):
         existing_inventory.amount = inventory.amount
     
     # Save the updated inventory
-    existing_inventory.save()
+    await existing_inventory.save()
     
-    return model_to_dict(existing_inventory)
+    return to_dict(existing_inventory)
 
 @router.delete("/{inventory_id}", status_code=204)
 async def delete_inventory(inventory_id: int):
@@ -109,13 +117,13 @@ async def delete_inventory(inventory_id: int):
     Delete an inventory.
     """
     # Check if inventory exists
-    inventory = Inventory.get_by_id(inventory_id)
+    inventory = await Inventory.get_by_id(inventory_id)
     if inventory is None:
         raise HTTPException(status_code=404, detail="Inventory not found")
     
     # Delete the inventory
-    from ..database import execute_query
+    from ..database import execute_query_async
     query = "DELETE FROM inventory WHERE id = %s"
-    execute_query(query, (inventory_id,), fetch=False)
+    await execute_query_async(query, (inventory_id,), fetch=False)
     
     return None
\ No newline at end of file
@@ -1,13 +1,15 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Response
+from typing import List, Optional, Dict, Any
 from ..models import Medication
-from .queries import model_to_dict
+from ..serializers import to_dict
+from .queries import PageParams, paginate, table_response, conditional_get
 from pydantic import BaseModel
 
 router = APIRouter(
     prefix="/medications",
     tags=["medications"],
     responses={404: {"description": "Not found"}},
+    dependencies=[Depends(conditional_get("medication"))],
 )
 
 MEDICATION_FIELD_TRANSLATIONS = {
@@ -26,25 +28,23 @@ MEDICATION_FIELD_TRANSLATIONS = {
 class MedicationListResponse(BaseModel):
     data: List[Dict[str, Any]]
     headers: Dict[str, str]
+    next_cursor: Optional[int] = None
 
 @router.get("/", response_model=MedicationListResponse)
-async def read_medications():
+async def read_medications(response: Response, page: PageParams = Depends()):
     """
     Get all medications.
     """
-    medications = Medication.get_all()
-    medications_dicts = [model_to_dict(medication) for medication in medications]
-    return {
-        "data": medications_dicts,
-        "headers": MEDICATION_FIELD_TRANSLATIONS
-    }
+    medications_dicts, next_cursor = await paginate(Medication, page)
+    return table_response(medications_dicts, MEDICATION_FIELD_TRANSLATIONS,
+                          response, page.format, next_cursor=next_cursor)
 
 @router.get("/{medication_id}", response_model=dict)
 async def read_medication(medication_id: int):
     """
     Get a specific medication by ID.
     """
-    medication = Medication.get_by_id(medication_id)
+    medication = await Medication.get_by_id(medication_id)
     if medication is None:
         raise HTTPException(status_code=404, detail="Medication not found")
-    return model_to_dict(medication)
+    return to_dict(medication)
@@ -1,15 +1,17 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Response
+from typing import List, Optional, Dict, Any
 from datetime import timedelta
 
 from ..models import Medicine, Medication, MedicineType, MedicineKind, MethodOfApplication
-from .queries import model_to_dict
+from ..serializers import to_dict
+from .queries import PageParams, paginate, table_response, conditional_get
 from pydantic import BaseModel
 
 router = APIRouter(
     prefix="/medicines",
     tags=["medicines"],
     responses={404: {"description": "Not found"}},
+    dependencies=[Depends(conditional_get("medicine"))],
 )
 
 MEDICINE_FIELD_TRANSLATIONS = {
@@ -32,26 +34,24 @@ MEDICINE_FIELD_TRANSLATIONS = {
 class MedicineListResponse(BaseModel):
     data: List[Dict[str, Any]]
     headers: Dict[str, str]
+    next_cursor: Optional[int] = None
 
 @router.get("/", response_model=MedicineListResponse)
-async def read_medicines():
+async def read_medicines(response: Response, page: PageParams = Depends()):
     """
     Get all medicines.
     """
-    medicines = Medicine.get_all()
-    medicines_dicts = [model_to_dict(medicine) for medicine in medicines]
-    return {
-        "data": medicines_dicts,
-        "headers": MEDICINE_FIELD_TRANSLATIONS
-    }
+    medicines_dicts, next_cursor = await paginate(Medicine, page)
+    return table_response(medicines_dicts, MEDICINE_FIELD_TRANSLATIONS,
+                          response, page.format, next_cursor=next_cursor)
 
 @router.get("/{medicine_id}", response_model=dict)
 async def read_medicine(medicine_id: int):
     """
     Get a specific medicine by ID.
     """
-    medicine = Medicine.get_by_id(medicine_id)
+    medicine = await Medicine.get_by_id(medicine_id)
     if medicine is None:
         raise HTTPException(status_code=404, detail="Medicine not found")
-    return model_to_dict(medicine)
+    return to_dict(medicine)
 
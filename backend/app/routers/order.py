@@ -1,16 +1,22 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 from datetime import date, datetime
 
 from .. import Medicine, Technology
 from ..models import Order, Prescription, Client
-from .queries import model_to_dict
+from ..responses import PG_JSON
+from ..serializers import to_dict
+from .queries import (
+    PageParams, PayloadFormat, paginate, paginate_json, ExportFormat, export_response, table_response,
+    conditional_get
+)
 
 router = APIRouter(
     prefix="/orders",
     tags=["orders"],
     responses={404: {"description": "Not found"}},
+    dependencies=[Depends(conditional_get("medicine_order"))],
 )
 
 ORDER_FIELD_TRANSLATION =  {
@@ -27,6 +33,7 @@ ORDER_FIELD_TRANSLATION =  {
 class OrderListResponse(BaseModel):
     data: List[Dict[str, Any]]
     headers: Dict[str, str]
+    next_cursor: Optional[int] = None
 
 class OrderCreate(BaseModel):
     prescription_id: int
@@ -47,60 +54,58 @@ class OrderUpdate(BaseModel):
     cost: Optional[float] = None
 
 @router.get("/", response_model=OrderListResponse)
-async def read_orders():
+async def read_orders(response: Response, page: PageParams = Depends()):
     """
     Get all orders.
     """
-    orders = Order.get_all()
-    orders_dicts = [model_to_dict(order) for order in orders]
-    return {
-        "data": orders_dicts,
-        "headers": ORDER_FIELD_TRANSLATION,
-    }
+    if PG_JSON and page.format == PayloadFormat.ROWS:
+        return await paginate_json(Order, page, ORDER_FIELD_TRANSLATION, response)
+    orders_dicts, next_cursor = await paginate(Order, page)
+    return table_response(orders_dicts, ORDER_FIELD_TRANSLATION,
+                          response, page.format, next_cursor=next_cursor)
+
+@router.get("/export")
+async def export_orders(
+    format: ExportFormat = ExportFormat.NDJSON,
+    itersize: int = Query(2000, ge=1, le=50000)
+):
+    """
+    Stream all orders as NDJSON or CSV.
+    """
+    return export_response(Order, format, itersize)
 
 @router.get("/{order_id}", response_model=dict)
 async def read_order(order_id: int):
     """
     Get a specific order by ID.
     """
-    order = Order.get_by_id(order_id)
+    order = await Order.get_by_id(order_id)
     if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
-    return model_to_dict(order)
+    return to_dict(order)
 
 @router.post("/", response_model=dict)
 async def create_order(order: OrderCreate):
     """
     Create a new order.
     """
-    # Check if prescription exists
-    prescription = Prescription.get_by_id(order.prescription_id)
-    if prescription is None:
-        raise HTTPException(status_code=404, detail="Prescription not found")
-    
-    # Check if client exists
-    client = Client.get_by_id(order.client_id)
-    if client is None:
-        raise HTTPException(status_code=404, detail="Client not found")
-
-    start_data = datetime.now()
-
-    expected_date_of_issue = start_data + Technology.get_by_id(Medicine.get_by_id(Prescription.get_by_id(order.prescription_id))).preparation_time
-
-    # Create and save the order
-    new_order = Order(
+    # Validation, the expected date and the insert are one round trip
+    new_order, prescription_exists, client_exists = await Order.create(
         prescription_id=order.prescription_id,
         client_id=order.client_id,
         order_number=order.order_number,
-        start_data=start_data,
-        expected_date_of_issue=expected_date_of_issue,
         status=order.status,
         date_of_issue=order.date_of_issue,
         cost=order.cost
     )
-    new_order.save()
-    
-    return model_to_dict(new_order)
+    if not prescription_exists:
+        raise HTTPException(status_code=404, detail="Prescription not found")
+    if not client_exists:
+        raise HTTPException(status_code=404, detail="Client not found")
+    if new_order is None:
+        raise HTTPException(status_code=400, detail="Medicine has no technology of preparation")
+
+    return to_dict(new_order)
 
 @router.put("/{order_id}", response_model=dict)
 async def update_order(order_id: int, order: OrderUpdate):
@@ -108,21 +113,21 @@ async def update_order(order_id: int, order: OrderUpdate):
     Update an order.
     """
     # Check if order exists
-    existing_order = Order.get_by_id(order_id)
+    existing_order = await Order.get_by_id(order_id)
     if existing_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
     # Update order fields if provided
     if order.prescription_id is not None:
         # Check if prescription exists
-        prescription = Prescription.get_by_id(order.prescription_id)
+        prescription = await Prescription.get_by_id(order.prescription_id)
         if prescription is None:
             raise HTTPException(status_code=404, detail="Prescription not found")
         existing_order.prescription_id = order.prescription_id
     
     if order.client_id is not None:
         # Check if client exists
-        client = Client.get_by_id(order.client_id)
+        client = await Client.get_by_id(order.client_id)
         if client is None:
             raise HTTPException(status_code=404, detail="Client not found")
         existing_order.client_id = order.client_id
@@ -146,9 +151,9 @@ async def update_order(order_id: int, order: OrderUpdate):
     if order.expected_date_of_issue is not None:
         existing_order.expected_date_of_issue = order.expected_date_of_issue
     # Save the updated order
-    existing_order.save()
+    await existing_order.save()
     
-    return model_to_dict(existing_order)
+    return to_dict(existing_order)
 
 @router.delete("/{order_id}", status_code=204)
 async def delete_order(order_id: int):
@@ -156,13 +161,13 @@ async def delete_order(order_id: int):
     Delete an order.
     """
     # Check if order exists
-    order = Order.get_by_id(order_id)
+    order = await Order.get_by_id(order_id)
     if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
     
     # Delete the order
-    from ..database import execute_query
+    from ..database import execute_query_async
     query = "DELETE FROM medicine_order WHERE id = %s"
-    execute_query(query, (order_id,), fetch=False)
+    await execute_query_async(query, (order_id,), fetch=False)
     
     return None
\ No newline at end of file
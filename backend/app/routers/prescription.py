@@ -1,15 +1,22 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date
 
 from ..models import Prescription, Medicine, Client
-from .queries import model_to_dict
+from ..responses import PG_JSON
+from ..serializers import to_dict
+from .queries import (
+    PageParams, PayloadFormat, paginate, paginate_json, ExportFormat, export_response, BulkCreateResponse,
+    bulk_create, table_response, conditional_get
+)
+from ..database import transaction
 
 router = APIRouter(
     prefix="/prescriptions",
     tags=["prescriptions"],
     responses={404: {"description": "Not found"}},
+    dependencies=[Depends(conditional_get("prescription"))],
 )
 
 PRESCRIPTION_FIELD_TRANSLATIONS = {
@@ -31,6 +38,7 @@ PRESCRIPTION_FIELD_TRANSLATIONS = {
 class PrescriptionListResponse(BaseModel):
     data: List[Dict[str, Any]]
     headers: Dict[str, str]
+    next_cursor: Optional[int] = None
 
 class PrescriptionCreate(BaseModel):
     name: str
@@ -49,6 +57,22 @@ class PrescriptionCreate(BaseModel):
     amount: float
     application: str
 
+# Bulk rows refer to an existing client. Fields are in column order and their
+# lengths match the table, so COPY cannot fail on them
+class PrescriptionBulkItem(BaseModel):
+    client_id: int
+    medicine_id: int
+    prescription_number: int
+    doctor_surname: str = Field(max_length=50)
+    doctor_name: str = Field(max_length=50)
+    doctor_patronymic: Optional[str] = Field(None, max_length=50)
+    signature: bool = True
+    stamp: bool = True
+    age: int
+    diagnosis: str = Field(max_length=100)
+    amount: float
+    application: str = Field(max_length=100)
+
 class PrescriptionUpdate(BaseModel):
     client_id: Optional[int] = None
     medicine_id: Optional[int] = None
@@ -64,26 +88,43 @@ class PrescriptionUpdate(BaseModel):
     application: Optional[str] = None
 
 @router.get("/", response_model=PrescriptionListResponse)
-async def read_prescriptions():
+async def read_prescriptions(response: Response, page: PageParams = Depends()):
     """
     Get all prescriptions.
     """
-    prescriptions = Prescription.get_all()
-    prescriptions_dicts = [model_to_dict(prescription) for prescription in prescriptions]
-    return {
-        "data": prescriptions_dicts,
-        "headers": PRESCRIPTION_FIELD_TRANSLATIONS
-    }
+    if PG_JSON and page.format == PayloadFormat.ROWS:
+        return await paginate_json(Prescription, page, PRESCRIPTION_FIELD_TRANSLATIONS, response)
+    prescriptions_dicts, next_cursor = await paginate(Prescription, page)
+    return table_response(prescriptions_dicts, PRESCRIPTION_FIELD_TRANSLATIONS,
+                          response, page.format, next_cursor=next_cursor)
+
+@router.get("/export")
+async def export_prescriptions(
+    format: ExportFormat = ExportFormat.NDJSON,
+    itersize: int = Query(2000, ge=1, le=50000)
+):
+    """
+    Stream all prescriptions as NDJSON or CSV.
+    """
+    return export_response(Prescription, format, itersize)
+
+@router.post("/bulk", response_model=BulkCreateResponse)
+async def create_prescriptions_bulk(prescriptions: List[PrescriptionBulkItem]):
+    """
+    Create many prescriptions at once.
+    Valid rows are inserted, the others are reported by their index in the list.
+    """
+    return await bulk_create(Prescription, prescriptions, tuple(PrescriptionBulkItem.model_fields))
 
 @router.get("/{prescription_id}", response_model=dict)
 async def read_prescription(prescription_id: int):
     """
     Get a specific prescription by ID.
     """
-    prescription = Prescription.get_by_id(prescription_id)
+    prescription = await Prescription.get_by_id(prescription_id)
     if prescription is None:
         raise HTTPException(status_code=404, detail="Prescription not found")
-    return model_to_dict(prescription)
+    return to_dict(prescription)
 
 @router.post("/", response_model=dict)
 async def create_prescription(prescription: PrescriptionCreate):
@@ -91,39 +132,41 @@ async def create_prescription(prescription: PrescriptionCreate):
     Create a new prescription.
     """
     # Check if medicine exists
-    medicine = Medicine.get_by_id(prescription.medicine_id)
+    medicine = await Medicine.get_by_id(prescription.medicine_id)
     if medicine is None:
         raise HTTPException(status_code=404, detail="Medicine not found")
 
-    client_id = Client.search(prescription.surname, prescription.name, prescription.patronymic, prescription.phone_number)
-    if client_id is None:
-        new_client = Client(
-            surname=prescription.surname,
-            name=prescription.name,
-            patronymic=prescription.patronymic,
-            phone_number=prescription.phone_number
+    # The client and the prescription are committed together
+    async with transaction():
+        client_id = await Client.search(prescription.surname, prescription.name, prescription.patronymic, prescription.phone_number)
+        if client_id is None:
+            new_client = Client(
+                surname=prescription.surname,
+                name=prescription.name,
+                patronymic=prescription.patronymic,
+                phone_number=prescription.phone_number
+            )
+            await new_client.save()
+            client_id = new_client.id
+
+        # Create and save the prescription
+        new_prescription = Prescription(
+            client_id=client_id,
+            medicine_id=prescription.medicine_id,
+            prescription_number=prescription.prescription_number,
+            doctor_surname=prescription.doctor_surname,
+            doctor_name=prescription.doctor_name,
+            doctor_patronymic=prescription.doctor_patronymic,
+            signature=prescription.signature,
+            stamp=prescription.stamp,
+            age=prescription.age,
+            diagnosis=prescription.diagnosis,
+            amount=prescription.amount,
+            application=prescription.application
         )
-        new_client.save()
-        client_id = new_client.id
-
-    # Create and save the prescription
-    new_prescription = Prescription(
-        client_id=client_id,
-        medicine_id=prescription.medicine_id,
-        prescription_number=prescription.prescription_number,
-        doctor_surname=prescription.doctor_surname,
-        doctor_name=prescription.doctor_name,
-        doctor_patronymic=prescription.doctor_patronymic,
-        signature=prescription.signature,
-        stamp=prescription.stamp,
-        age=prescription.age,
-        diagnosis=prescription.diagnosis,
-        amount=prescription.amount,
-        application=prescription.application
-    )
-    new_prescription.save()
-    
-    return model_to_dict(new_prescription)
+        await new_prescription.save()
+    
+    return to_dict(new_prescription)
 
 @router.put("/{prescription_id}", response_model=dict)
 async def update_prescription(prescription_id: int, prescription: PrescriptionUpdate):
@@ -131,20 +174,20 @@ async def update_prescription(prescription_id: int, prescription: PrescriptionUp
     Update a prescription.
     """
     # Check if prescription exists
-    existing_prescription = Prescription.get_by_id(prescription_id)
+    existing_prescription = await Prescription.get_by_id(prescription_id)
     if existing_prescription is None:
         raise HTTPException(status_code=404, detail="Prescription not found")
     
     # Update prescription fields if provided
     if prescription.client_id is not None:
-        client = Client.get_by_id(prescription.client_id)
+        client = await Client.get_by_id(prescription.client_id)
         if client is None:
             raise HTTPException(status_code=404, detail="Client not found")
         existing_prescription.client_id = prescription.client_id
 
     if prescription.medicine_id is not None:
         # Check if medicine exists
-        medicine = Medicine.get_by_id(prescription.medicine_id)
+        medicine = await Medicine.get_by_id(prescription.medicine_id)
         if medicine is None:
             raise HTTPException(status_code=404, detail="Medicine not found")
         existing_prescription.medicine_id = prescription.medicine_id
@@ -180,9 +223,9 @@ async def update_prescription(prescription_id: int, prescription: PrescriptionUp
         existing_prescription.application = prescription.application
     
     # Save the updated prescription
-    existing_prescription.save()
+    await existing_prescription.save()
     
-    return model_to_dict(existing_prescription)
+    return to_dict(existing_prescription)
 
 @router.delete("/{prescription_id}", status_code=204)
 async def delete_prescription(prescription_id: int):
@@ -190,13 +233,13 @@ async def delete_prescription(prescription_id: int):
     Delete a prescription.
     """
     # Check if prescription exists
-    prescription = Prescription.get_by_id(prescription_id)
+    prescription = await Prescription.get_by_id(prescription_id)
     if prescription is None:
         raise HTTPException(status_code=404, detail="Prescription not found")
     
     # Delete the prescription
-    from ..database import execute_query
+    from ..database import execute_query_async
     query = "DELETE FROM prescription WHERE id = %s"
-    execute_query(query, (prescription_id,), fetch=False)
+    await execute_query_async(query, (prescription_id,), fetch=False)
     
     return None
\ No newline at end of file
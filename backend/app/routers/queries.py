@@ -1,9 +1,23 @@
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
 from typing import List, Optional
-from datetime import date, timedelta
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+from datetime import date, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from enum import Enum
-from decimal import Decimal
 
+from ..cache import response_cache
+from ..responses import FastJSONResponse, PG_JSON, fast_json, raw_json
+from ..serializers import to_dict, to_dicts
+from ..models import get_table_versions
+from ..view_models import get_refreshed_at
 from ..view_models import (
     ClientsWithUnclaimedOrders, ClientsWaitingForDelivery, MedicineDetailsView,
     TopMedication, IngredientUsage, ClientByMedication, MedicationAtCriticalLevel,
@@ -11,108 +25,351 @@ from ..view_models import (
     TechnologyOfPreparation, MedicinePriceAndComponents, MostFrequentClient
 )
 
-# Helper function to convert model objects to dictionaries
-def model_to_dict(obj):
-    if hasattr(obj, '__dict__'):
-        result = {key: value for key, value in obj.__dict__.items() 
-                 if not key.startswith('_') and not callable(value)}
-
-        # Handle date objects
-        for key, value in result.items():
-            if isinstance(value, date):
-                result[key] = value.isoformat()
-            elif isinstance(value, Enum):
-                result[key] = value.value
-            elif isinstance(value, timedelta):
-                result[key] = value.days
-            elif isinstance(value, Decimal):
-                result[key] = float(value)
-
-        return result
-    return obj
+# Rows a listing returns when the request has no limit; whole tables are read
+# through the /export endpoints
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+class PayloadFormat(str, Enum):
+    # "data" is a list of row objects
+    ROWS = "rows"
+    # "columns" lists the field names once and "data" holds one array of values per column
+    COLUMNAR = "columnar"
+
+# Query parameters shared by the table listing endpoints
+class PageParams:
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        after_id: Optional[int] = None,
+        sort_by: str = "id",
+        descending: bool = False,
+        format: PayloadFormat = PayloadFormat.ROWS
+    ):
+        self.limit = limit
+        self.after_id = after_id
+        self.sort_by = sort_by
+        self.descending = descending
+        self.format = format
+
+def _check_sort_key(model, page):
+    if page.sort_by not in model.__sort_keys__:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot sort by {page.sort_by}, allowed: {', '.join(model.__sort_keys__)}"
+        )
+
+# Helper function to fetch one page of a table as dictionaries
+async def paginate(model, page):
+    _check_sort_key(model, page)
+    items, next_cursor = await model.get_page(page.limit, page.after_id, page.sort_by, page.descending)
+    return to_dicts(items), next_cursor
+
+# Helper function to send one page of a table as JSON built by Postgres (PG_JSON=1).
+# The body matches table_response in the rows format; no row passes through Python.
+async def paginate_json(model, page, headers, response):
+    _check_sort_key(model, page)
+    data, next_cursor = await model.get_page_json(page.limit, page.after_id, page.sort_by, page.descending)
+    text = '{"data":%s,"headers":%s,"next_cursor":%s}' % (
+        data, json.dumps(headers, ensure_ascii=False, separators=(",", ":")), json.dumps(next_cursor)
+    )
+    return raw_json(text, response)
+
+# Helper function to build the body of a table listing in the requested format
+def table_response(rows, headers, response, payload_format=PayloadFormat.ROWS, **extra):
+    if payload_format != PayloadFormat.COLUMNAR:
+        return fast_json({"data": rows, "headers": headers, **extra}, response)
+    # Key names are not repeated per row; the shape differs from the documented
+    # row format, so it is never validated against the route's response_model
+    columns = list(rows[0]) if rows else []
+    content = {
+        "columns": columns,
+        "data": [[row[column] for row in rows] for column in columns],
+        "headers": headers,
+        **extra,
+    }
+    return FastJSONResponse(content, headers=dict(response.headers))
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+# Helper function to stream a whole table, row by row, as NDJSON or CSV
+def export_response(model, export_format, itersize):
+    rows = (to_dict(item) for item in model.stream_all(itersize))
+    lines = _csv_lines(rows) if export_format == ExportFormat.CSV else _ndjson_lines(rows)
+    filename = f"{model.__tablename__}.{export_format.value}"
+    return StreamingResponse(
+        lines,
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+class BulkRowError(BaseModel):
+    row: int
+    error: str
+
+class BulkCreateResponse(BaseModel):
+    inserted: int
+    errors: List[BulkRowError]
+
+# Helper function for the /bulk endpoints: items are request models whose fields
+# are listed in fields, in the model's column order
+async def bulk_create(model, items, fields):
+    rows = [tuple(getattr(item, field) for field in fields) for item in items]
+    inserted, errors = await model.bulk_create(rows)
+    return {
+        "inserted": inserted,
+        "errors": [{"row": row, "error": error} for row, error in errors],
+    }
+
+def _etag_matches(if_none_match, etag):
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+def _not_modified_since(if_modified_since, last_modified):
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have a one second resolution
+    return last_modified.replace(microsecond=0) <= since
+
+# Router dependency for conditional GETs on the tables a router reads.
+# GET responses get an ETag and a Last-Modified built from the table versions, and a
+# request whose If-None-Match (or If-Modified-Since) still matches is answered with
+# 304 Not Modified from the versions alone, without reading the tables.
+def conditional_get(*tables):
+    async def check_versions(request: Request, response: Response):
+        if request.method not in ("GET", "HEAD"):
+            return
+        versions = await get_table_versions(tables)
+        if len(versions) != len(tables):
+            # Versions not set up yet: serve the request unconditionally
+            return
+        etag = '"' + "-".join(f"{table}.{versions[table][0]}" for table in tables) + '"'
+        last_modified = max(modified_at for _, modified_at in versions.values())
+        headers = {
+            "ETag": etag,
+            "Last-Modified": format_datetime(last_modified.astimezone(timezone.utc), usegmt=True),
+            # Let clients store the response but revalidate it before each use
+            "Cache-Control": "no-cache",
+        }
+
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_none_match is not None:
+            not_modified = _etag_matches(if_none_match, etag)
+        else:
+            not_modified = (if_modified_since is not None
+                            and _not_modified_since(if_modified_since, last_modified))
+        if not_modified:
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+    return check_versions
+
+# Route dependency for answers read from materialized views: X-Refreshed-At tells
+# when the data was computed, so clients can show how stale it may be
+def analytics_freshness(*views):
+    async def add_refreshed_at(response: Response):
+        refreshed_at = await get_refreshed_at(views)
+        if refreshed_at is not None:
+            response.headers["X-Refreshed-At"] = format_datetime(
+                refreshed_at.astimezone(timezone.utc), usegmt=True
+            )
+    return add_refreshed_at
+
+# Seconds a /queries response is served from the response cache; 0 turns it off
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", "30"))
+# Routes whose data goes stale faster or slower than that
+QUERY_CACHE_ROUTE_TTLS = {
+    # Depends on NOW(), keep it close to real time
+    "/queries/clients/unclaimed-orders": 5,
+    "/queries/clients/unclaimed-orders/count": 5,
+    # Read from materialized views that are refreshed every few minutes anyway
+    "/queries/medications/top": 60,
+    "/queries/medications/top/{med_type}": 60,
+    "/queries/ingredients/usage/{ingredient_name}": 60,
+    "/queries/clients/most-frequent": 60,
+}
+
+class CachedRoute(APIRoute):
+    """
+    Route that serves successful GET responses from response_cache for its TTL,
+    keyed by path and sorted query parameters. Identical requests arriving while
+    one is being computed wait for it instead of running the same queries again.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        ttl = QUERY_CACHE_ROUTE_TTLS.get(self.path, QUERY_CACHE_TTL)
+        in_flight = {}
+
+        async def cached_handler(request: Request):
+            if request.method != "GET" or ttl <= 0:
+                return await handler(request)
+            key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+
+            found, entry = response_cache.get(self.path, key)
+            if found:
+                return _cached_response(entry)
+            pending = in_flight.get(key)
+            if pending is not None:
+                entry = await asyncio.shield(pending)
+                if entry is not None:
+                    return _cached_response(entry)
+                # The shared request failed or was not cacheable, answer this one on its own
+                return await handler(request)
+
+            future = asyncio.get_running_loop().create_future()
+            in_flight[key] = future
+            generation = response_cache.generation(self.path)
+            try:
+                response = await handler(request)
+            except BaseException:
+                future.set_result(None)
+                raise
+            finally:
+                del in_flight[key]
+
+            entry = None
+            if response.status_code == 200 and hasattr(response, "body"):
+                headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+                entry = (time.monotonic(), response.status_code, response.body, headers)
+                response_cache.set(self.path, key, entry, generation, ttl=ttl)
+            future.set_result(entry)
+            return response
+
+        return cached_handler
+
+def _cached_response(entry):
+    stored_at, status_code, body, headers = entry
+    response = Response(content=body, status_code=status_code, headers=headers)
+    response.headers["Age"] = str(int(time.monotonic() - stored_at))
+    return response
 
 router = APIRouter(
     prefix="/queries",
     tags=["queries"],
     responses={404: {"description": "Not found"}},
+    route_class=CachedRoute,
 )
 
 # Clients with unclaimed orders
 @router.get("/clients/unclaimed-orders", response_model=List[dict])
-async def get_clients_with_unclaimed_orders():
-    clients = ClientsWithUnclaimedOrders.get_all()
-    return [model_to_dict(client) for client in clients]
+async def get_clients_with_unclaimed_orders(response: Response):
+    clients = await ClientsWithUnclaimedOrders.get_all()
+    return fast_json(to_dicts(clients), response)
 
 @router.get("/clients/unclaimed-orders/count")
 async def count_clients_with_unclaimed_orders():
-    return {"count": ClientsWithUnclaimedOrders.count()}
+    return {"count": await ClientsWithUnclaimedOrders.count()}
 
 # Clients waiting for delivery
 @router.get("/clients/waiting-for-delivery", response_model=List[dict])
-async def get_clients_waiting_for_delivery():
-    clients = ClientsWaitingForDelivery.get_all()
-    return [model_to_dict(client) for client in clients]
+async def get_clients_waiting_for_delivery(response: Response):
+    clients = await ClientsWaitingForDelivery.get_all()
+    return fast_json(to_dicts(clients), response)
 
 @router.get("/clients/waiting-for-delivery/count")
 async def count_clients_waiting_for_delivery():
-    return {"count": ClientsWaitingForDelivery.count()}
+    return {"count": await ClientsWaitingForDelivery.count()}
 
 @router.get("/clients/waiting-for-delivery/count/{med_type}")
 async def count_clients_waiting_for_delivery_by_type(med_type: str):
-    return {"count": ClientsWaitingForDelivery.count_by_medication_type(med_type)}
+    return {"count": await ClientsWaitingForDelivery.count_by_medication_type(med_type)}
 
 # Medicine details
 @router.get("/medicines/details", response_model=List[dict])
-async def get_all_medicine_details():
-    medicines = MedicineDetailsView.get_all()
-    return [model_to_dict(medicine) for medicine in medicines]
+async def get_all_medicine_details(response: Response):
+    if PG_JSON:
+        return raw_json(await MedicineDetailsView.get_all_json(), response)
+    medicines = await MedicineDetailsView.get_all()
+    return fast_json(to_dicts(medicines), response)
 
 @router.get("/medicines/details/{medicine_name}", response_model=List[dict])
-async def get_medicine_details_by_name(medicine_name: str):
-    medicines = MedicineDetailsView.get_by_medicine_name(medicine_name)
+async def get_medicine_details_by_name(response: Response, medicine_name: str):
+    medicines = await MedicineDetailsView.get_by_medicine_name(medicine_name)
     if not medicines:
         raise HTTPException(status_code=404, detail=f"Medicine with name {medicine_name} not found")
-    return [model_to_dict(medicine) for medicine in medicines]
+    return fast_json(to_dicts(medicines), response)
 
 # Top medications
-@router.get("/medications/top", response_model=List[dict])
-async def get_top_medications():
-    medications = TopMedication.get_top_10()
-    return [model_to_dict(medication) for medication in medications]
+@router.get(
+    "/medications/top", response_model=List[dict],
+    dependencies=[Depends(analytics_freshness("medication_order_counts"))]
+)
+async def get_top_medications(response: Response):
+    medications = await TopMedication.get_top_10()
+    return fast_json(to_dicts(medications), response)
 
-@router.get("/medications/top/{med_type}", response_model=List[dict])
-async def get_top_medications_by_type(med_type: str):
-    medications = TopMedication.get_top_10_by_type(med_type)
-    return [model_to_dict(medication) for medication in medications]
+@router.get(
+    "/medications/top/{med_type}", response_model=List[dict],
+    dependencies=[Depends(analytics_freshness("medication_order_counts"))]
+)
+async def get_top_medications_by_type(response: Response, med_type: str):
+    medications = await TopMedication.get_top_10_by_type(med_type)
+    return fast_json(to_dicts(medications), response)
 
 # Ingredient usage
-@router.get("/ingredients/usage/{ingredient_name}", response_model=List[dict])
+@router.get(
+    "/ingredients/usage/{ingredient_name}", response_model=List[dict],
+    dependencies=[Depends(analytics_freshness("ingredient_usage_daily"))]
+)
 async def get_ingredient_usage(
+    response: Response,
     ingredient_name: str,
     start_date: date,
     end_date: date
 ):
-    usage = IngredientUsage.get_usage_volume(ingredient_name, start_date, end_date)
-    return [model_to_dict(item) for item in usage]
+    usage = await IngredientUsage.get_usage_volume(ingredient_name, start_date, end_date)
+    return fast_json(to_dicts(usage), response)
 
 # Clients by medication
 @router.get("/clients/by-medication-name", response_model=List[dict])
 async def get_clients_by_medication_name(
+    response: Response,
     med_name: str,
     start_date: date,
     end_date: date
 ):
-    clients = ClientByMedication.get_by_medication_name_and_period(med_name, start_date, end_date)
-    return [model_to_dict(client) for client in clients]
+    clients = await ClientByMedication.get_by_medication_name_and_period(med_name, start_date, end_date)
+    return fast_json(to_dicts(clients), response)
 
 @router.get("/clients/by-medication-type", response_model=List[dict])
 async def get_clients_by_medication_type(
+    response: Response,
     med_type: str,
     start_date: date,
     end_date: date
 ):
-    clients = ClientByMedication.get_by_medication_type_and_period(med_type, start_date, end_date)
-    return [model_to_dict(client) for client in clients]
+    clients = await ClientByMedication.get_by_medication_type_and_period(med_type, start_date, end_date)
+    return fast_json(to_dicts(clients), response)
 
 @router.get("/clients/by-medication-name/count")
 async def count_clients_by_medication_name(
@@ -120,7 +377,7 @@ async def count_clients_by_medication_name(
     start_date: date,
     end_date: date
 ):
-    return {"count": ClientByMedication.count_by_medication_name_and_period(med_name, start_date, end_date)}
+    return {"count": await ClientByMedication.count_by_medication_name_and_period(med_name, start_date, end_date)}
 
 @router.get("/clients/by-medication-type/count")
 async def count_clients_by_medication_type(
@@ -128,69 +385,74 @@ async def count_clients_by_medication_type(
     start_date: date,
     end_date: date
 ):
-    return {"count": ClientByMedication.count_by_medication_type_and_period(med_type, start_date, end_date)}
+    return {"count": await ClientByMedication.count_by_medication_type_and_period(med_type, start_date, end_date)}
 
 # Medications at critical level
 @router.get("/medications/critical", response_model=List[dict])
-async def get_medications_at_critical_level():
-    medications = MedicationAtCriticalLevel.get_all()
-    return [model_to_dict(medication) for medication in medications]
+async def get_medications_at_critical_level(response: Response):
+    medications = await MedicationAtCriticalLevel.get_all()
+    return fast_json(to_dicts(medications), response)
 
 # Low stock medications
 @router.get("/medications/low-stock", response_model=List[dict])
-async def get_low_stock_medications():
-    medications = LowStockMedication.get_all()
-    return [model_to_dict(medication) for medication in medications]
+async def get_low_stock_medications(response: Response):
+    medications = await LowStockMedication.get_all()
+    return fast_json(to_dicts(medications), response)
 
 @router.get("/medications/low-stock/{med_type}", response_model=List[dict])
-async def get_low_stock_medications_by_type(med_type: str):
-    medications = LowStockMedication.get_by_type(med_type)
-    return [model_to_dict(medication) for medication in medications]
+async def get_low_stock_medications_by_type(response: Response, med_type: str):
+    medications = await LowStockMedication.get_by_type(med_type)
+    return fast_json(to_dicts(medications), response)
 
 # Producing orders
 @router.get("/orders/producing", response_model=List[dict])
-async def get_producing_orders():
-    orders = ProducingOrder.get_all()
-    return [model_to_dict(order) for order in orders]
+async def get_producing_orders(response: Response):
+    orders = await ProducingOrder.get_all()
+    return fast_json(to_dicts(orders), response)
 
 @router.get("/orders/producing/count")
 async def count_producing_orders():
-    return {"count": ProducingOrder.count()}
+    return {"count": await ProducingOrder.count()}
 
 # Ingredients for producing orders
 @router.get("/ingredients/for-producing-orders", response_model=List[dict])
-async def get_ingredients_for_producing_orders():
-    ingredients = IngredientForProducingOrder.get_all()
-    return [model_to_dict(ingredient) for ingredient in ingredients]
+async def get_ingredients_for_producing_orders(response: Response):
+    ingredients = await IngredientForProducingOrder.get_all()
+    return fast_json(to_dicts(ingredients), response)
 
 @router.get("/ingredients/for-producing-orders/count")
 async def count_ingredients_for_producing_orders():
-    return {"count": IngredientForProducingOrder.count()}
+    return {"count": await IngredientForProducingOrder.count()}
 
 # Technology of preparation
 @router.get("/technologies", response_model=List[dict])
 async def get_technologies(
+    response: Response,
     medicine_type: Optional[str] = None,
     medicine_names: Optional[List[str]] = Query(None),
     from_producing_orders: bool = False
 ):
-    technologies = TechnologyOfPreparation.get_all(medicine_type, medicine_names, from_producing_orders)
-    return [model_to_dict(technology) for technology in technologies]
+    technologies = await TechnologyOfPreparation.get_all(medicine_type, medicine_names, from_producing_orders)
+    return fast_json(to_dicts(technologies), response)
 
 # Medicine price and components
 @router.get("/medicines/price-and-components/{medicine_name}", response_model=List[dict])
-async def get_medicine_price_and_components(medicine_name: str):
-    components = MedicinePriceAndComponents.get_by_medicine_name(medicine_name)
+async def get_medicine_price_and_components(response: Response, medicine_name: str):
+    components = await MedicinePriceAndComponents.get_by_medicine_name(medicine_name)
     if not components:
         raise HTTPException(status_code=404, detail=f"Medicine with name {medicine_name} not found")
-    return [model_to_dict(component) for component in components]
+    return fast_json(to_dicts(components), response)
 
 # Most frequent clients
-@router.get("/clients/most-frequent", response_model=List[dict])
+@router.get(
+    "/clients/most-frequent", response_model=List[dict],
+    dependencies=[Depends(analytics_freshness("client_medicine_order_counts"))]
+)
 async def get_most_frequent_clients(
+    response: Response,
     medicine_type: Optional[str] = None,
     medicine_names: Optional[List[str]] = Query(None),
     limit: int = 10
 ):
-    clients = MostFrequentClient.get_most_frequent(medicine_type, medicine_names, limit)
-    return [model_to_dict(client) for client in clients]
\ No newline at end of file
+    clients = await MostFrequentClient.get_most_frequent(medicine_type, medicine_names, limit)
+    return fast_json(to_dicts(clients), response)
\ No newline at end of file
@@ -0,0 +1,47 @@
+from fastapi import APIRouter
+
+from ..cache import get_cache_stats
+from ..counters import counter_checker
+from ..database import get_pool_stats, get_prepared_stats
+from ..listener import listener
+from ..refresher import refresher
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["stats"],
+)
+
+@router.get("/pool")
+async def read_pool_stats():
+    """
+    Get database connection pool usage and wait times (null until the first query opens the pool).
+    """
+    return get_pool_stats()
+
+@router.get("/prepared-statements")
+async def read_prepared_statement_stats():
+    """
+    Get counters of server-side prepared statements.
+    """
+    return get_prepared_stats()
+
+@router.get("/cache")
+async def read_cache_stats():
+    """
+    Get hit/miss counters of the reference data cache and the state of its invalidation listener.
+    """
+    return dict(get_cache_stats(), listener=listener.stats())
+
+@router.get("/analytics-refresh")
+async def read_analytics_refresh_stats():
+    """
+    Get the state of the materialized view refresher.
+    """
+    return refresher.stats()
+
+@router.get("/counters")
+async def read_counter_stats():
+    """
+    Get the results of the last consistency check of the /count counters.
+    """
+    return counter_checker.stats()
@@ -1,15 +1,17 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Response
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 from datetime import timedelta
 
 from ..models import Technology
-from .queries import model_to_dict
+from ..serializers import to_dict
+from .queries import PageParams, paginate, table_response, conditional_get
 
 router = APIRouter(
     prefix="/technologies",
     tags=["technologies"],
     responses={404: {"description": "Not found"}},
+    dependencies=[Depends(conditional_get("technology_of_preparation"))],
 )
 
 TECHNOLOGY_FIELD_TRANSLATIONS = {
@@ -20,6 +22,7 @@ TECHNOLOGY_FIELD_TRANSLATIONS = {
 class TechnologyListResponse(BaseModel):
     data: List[Dict[str, Any]]
     headers: Dict[str, str]
+    next_cursor: Optional[int] = None
 
 class TechnologyCreate(BaseModel):
     description: str
@@ -30,26 +33,23 @@ class TecnologyUpdate(BaseModel):
     preparation_time: Optional[timedelta] = None
 
 @router.get("/", response_model=TechnologyListResponse)
-async def read_technologies():
+async def read_technologies(response: Response, page: PageParams = Depends()):
     """
     Get all technologies of preparation.
     """
-    technologies = Technology.get_all()
-    technologies_dicts = [model_to_dict(technology) for technology in technologies]
-    return {
-        "data": technologies_dicts,
-        "headers": TECHNOLOGY_FIELD_TRANSLATIONS
-    }
+    technologies_dicts, next_cursor = await paginate(Technology, page)
+    return table_response(technologies_dicts, TECHNOLOGY_FIELD_TRANSLATIONS,
+                          response, page.format, next_cursor=next_cursor)
 
 @router.get("/{technology_id}", response_model=dict)
 async def read_technology(technology_id: int):
     """
     Get a specific technology of preparation by ID.
     """
-    technology = Technology.get_by_id(technology_id)
+    technology = await Technology.get_by_id(technology_id)
     if technology is None:
         raise HTTPException(status_code=404, detail="Technology of preparation not found")
-    return model_to_dict(technology)
+    return to_dict(technology)
 
 @router.post("/", response_model=dict)
 async def create_technology(technology: TechnologyCreate):
@@ -60,23 +60,23 @@ async def create_technology(technology: TechnologyCreate):
         description=technology.description,
         preparation_time=technology.preparation_time
     )
-    new_technology.save()
-    return model_to_dict(new_technology)
+    await new_technology.save()
+    return to_dict(new_technology)
 
 @router.put("/{technology_id}", response_model=dict)
 async def update_technology(technology_id: int, technology: TecnologyUpdate):
     """
     Update a technology of preparation by ID.
     """
-    existing_technology = Technology.get_by_id(technology_id)
+    existing_technology = await Technology.get_by_id(technology_id)
     if existing_technology is None:
         raise HTTPException(status_code=404, detail="Technology of preparation not found")
     if technology.description is not None:
         existing_technology.description = technology.description
     if technology.preparation_time is not None:
         existing_technology.preparation_time = technology.preparation_time
-    existing_technology.save()
-    return model_to_dict(existing_technology)
+    await existing_technology.save()
+    return to_dict(existing_technology)
 
 @router.delete("/{technology_id}", status_code=204)
 async def delete_technology(technology_id: int):
@@ -84,13 +84,14 @@ async def delete_technology(technology_id: int):
     Delete a technology of preparation by ID.
     """
     # Check if technology exists
-    technology = Technology.get_by_id(technology_id)
+    technology = await Technology.get_by_id(technology_id)
     if technology is None:
         raise HTTPException(status_code=404, detail="Technology of preparation not found")
     
     # Delete the technology
-    from ..database import execute_query
+    from ..database import execute_query_async
     query = "DELETE FROM technology_of_preparation WHERE id = %s"
-    execute_query(query, (technology_id,), fetch=False)
+    await execute_query_async(query, (technology_id,), fetch=False)
+    Technology.invalidate_cache(technology_id)
     
     return None
\ No newline at end of file
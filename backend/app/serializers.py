@@ -0,0 +1,122 @@
+"""
+Row objects (models, view models) to JSON-ready dicts.
+
+model_to_dict looks at every attribute of every object. The serializers here
+are compiled once per class instead: the field list is read from the first
+object serialized, every field gets the converter matching the type of its
+value, and the resulting function builds the dict with plain attribute reads.
+Converters check the exact class before converting and fall back to
+convert_value, so a value of an unexpected type is still handled.
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+
+
+def convert_value(value):
+    """JSON-ready form of one attribute value."""
+    if isinstance(value, date):
+        return value.isoformat()
+    elif isinstance(value, Enum):
+        return value.value
+    elif isinstance(value, timedelta):
+        return value.days
+    elif isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _fields(obj):
+    """Public attribute names of obj, from its __dict__ or from the __slots__ of its classes."""
+    if hasattr(obj, '__dict__'):
+        names = list(vars(obj))
+    else:
+        names = [name for cls in reversed(type(obj).__mro__) for name in getattr(cls, '__slots__', ())]
+    return [name for name in names
+            if not name.startswith('_') and hasattr(obj, name) and not callable(getattr(obj, name))]
+
+
+def _has_fields(obj):
+    return hasattr(obj, '__dict__') or hasattr(obj, '__slots__')
+
+
+def model_to_dict(obj):
+    """Reflective conversion of any object; used for classes without a serializer."""
+    if _has_fields(obj):
+        return {key: convert_value(getattr(obj, key)) for key in _fields(obj)}
+    return obj
+
+
+def _isoformat(value):
+    return value.isoformat() if value.__class__ is date or value.__class__ is datetime else convert_value(value)
+
+
+def _days(value):
+    return value.days if value.__class__ is timedelta else convert_value(value)
+
+
+def _decimal(value):
+    return float(value) if value.__class__ is Decimal else convert_value(value)
+
+
+def _enum(value):
+    return value.value if isinstance(value, Enum) else convert_value(value)
+
+
+# Values of these classes are already JSON-ready
+_PLAIN = (str, int, float, bool)
+
+_CONVERTERS = {date: "_isoformat", datetime: "_isoformat", timedelta: "_days", Decimal: "_decimal"}
+
+
+def _converter(value):
+    if value.__class__ in _PLAIN:
+        return None
+    if isinstance(value, Enum):
+        return "_enum"
+    # None and anything else unknown go through the full isinstance chain
+    return _CONVERTERS.get(value.__class__, "convert_value")
+
+
+def compile_serializer(cls, sample):
+    """Build the serializer of cls from one of its objects."""
+    items = []
+    for field in _fields(sample):
+        converter = _converter(getattr(sample, field))
+        access = f"obj.{field}"
+        items.append(f"{field!r}: {converter}({access})" if converter else f"{field!r}: {access}")
+    source = f"def serialize_{cls.__name__}(obj):\n    return {{{', '.join(items)}}}\n"
+    namespace = {
+        "_isoformat": _isoformat, "_days": _days, "_decimal": _decimal, "_enum": _enum,
+        "convert_value": convert_value,
+    }
+    exec(source, namespace)
+    return namespace[f"serialize_{cls.__name__}"]
+
+
+_serializers = {}
+
+
+def serializer_for(obj):
+    """The serializer of obj's class, compiled from obj on first use."""
+    cls = obj.__class__
+    serializer = _serializers.get(cls)
+    if serializer is None:
+        serializer = _serializers[cls] = compile_serializer(cls, obj) if _has_fields(obj) else model_to_dict
+    return serializer
+
+
+def to_dict(obj):
+    return serializer_for(obj)(obj)
+
+
+def to_dicts(objs):
+    """to_dict for each object; the serializer is looked up once per run of the same class."""
+    result = []
+    cls = serializer = None
+    for obj in objs:
+        if obj.__class__ is not cls:
+            cls = obj.__class__
+            serializer = serializer_for(obj)
+        result.append(serializer(obj))
+    return result
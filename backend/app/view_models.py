@@ -1,9 +1,14 @@
-from .database import execute_query
-from .models import Model, Client, Medicine, Ingredient, Order, Medication, Prescription
+from .database import execute_query_async
+from .models import Model, Client, Medicine, Ingredient, Order, Medication, Prescription, get_related
 
 # Models for views
 class ClientsWithUnclaimedOrders(Model):
     __tablename__ = "clients_with_unclaimed_orders"
+    __relations__ = {"client": ("Client", "client_id")}
+    __slots__ = (
+        "client_id", "surname", "name", "patronymic", "phone_number", "order_number",
+        "expected_date_of_issue",
+    )
 
     def __init__(self, client_id=None, surname=None, name=None, patronymic=None, 
                  phone_number=None, order_number=None, expected_date_of_issue=None):
@@ -16,23 +21,28 @@ class ClientsWithUnclaimedOrders(Model):
         self.expected_date_of_issue = expected_date_of_issue
 
     @classmethod
-    def get_all(cls):
+    async def get_all(cls):
         query = f"SELECT * FROM {cls.__tablename__}"
-        results = execute_query(query)
+        results = await execute_query_async(query)
         return [cls(*row) for row in results]
 
-    def get_client(self):
-        return Client.get_by_id(self.client_id)
+    async def get_client(self):
+        return await get_related(self, "client")
 
     @staticmethod
-    def count():
+    async def count():
         query = "SELECT count_unclaimed_orders_clients()"
-        result = execute_query(query)
+        result = await execute_query_async(query)
         return result[0][0] if result else 0
 
 
 class ClientsWaitingForDelivery(Model):
     __tablename__ = "clients_waiting_for_delivery"
+    __relations__ = {"client": ("Client", "client_id")}
+    __slots__ = (
+        "client_id", "surname", "name", "patronymic", "phone_number", "order_number",
+        "expected_date_of_issue", "medication_name", "medication_type",
+    )
 
     def __init__(self, client_id=None, surname=None, name=None, patronymic=None, 
                  phone_number=None, order_number=None, expected_date_of_issue=None, 
@@ -48,29 +58,40 @@ class ClientsWaitingForDelivery(Model):
         self.medication_type = medication_type
 
     @classmethod
-    def get_all(cls):
+    async def get_all(cls):
         query = f"SELECT * FROM {cls.__tablename__}"
-        results = execute_query(query)
+        results = await execute_query_async(query)
         return [cls(*row) for row in results]
 
-    def get_client(self):
-        return Client.get_by_id(self.client_id)
+    async def get_client(self):
+        return await get_related(self, "client")
 
     @staticmethod
-    def count():
+    async def count():
         query = "SELECT count_clients_waiting_for_delivery()"
-        result = execute_query(query)
+        result = await execute_query_async(query)
         return result[0][0] if result else 0
 
     @staticmethod
-    def count_by_medication_type(med_type):
+    async def count_by_medication_type(med_type):
         query = "SELECT count_clients_waiting_for_delivery_by_medication_type(%s)"
-        result = execute_query(query, (med_type,))
+        result = await execute_query_async(query, (med_type,))
         return result[0][0] if result else 0
 
 
 class MedicineDetailsView(Model):
     __tablename__ = "medicine_details_view"
+    __relations__ = {"medicine": ("Medicine", "medicine_id")}
+    __json_casts__ = {
+        "component_amount": "{}::float8",
+        "component_price": "{}::float8",
+        "current_stock_amount": "{}::float8",
+    }
+    __slots__ = (
+        "medicine_id", "medicine_name", "medicine_type", "preparation_description",
+        "component_name", "component_amount", "component_unit_of_measure", "component_price",
+        "current_stock_amount",
+    )
 
     def __init__(self, medicine_id=None, medicine_name=None, medicine_type=None, 
                  preparation_description=None, 
@@ -88,58 +109,76 @@ class MedicineDetailsView(Model):
         self.current_stock_amount = current_stock_amount
 
     @classmethod
-    def get_all(cls):
+    async def get_all(cls):
         query = f"SELECT * FROM {cls.__tablename__}"
-        results = execute_query(query)
+        results = await execute_query_async(query)
         return [cls(*row) for row in results]
 
     @classmethod
-    def get_by_medicine_name(cls, medicine_name):
+    async def get_by_medicine_name(cls, medicine_name):
         query = "SELECT * FROM get_single_medicine_details(%s)"
-        results = execute_query(query, (medicine_name,))
+        results = await execute_query_async(query, (medicine_name,))
         return [cls(*row) for row in results]
 
-    def get_medicine(self):
-        return Medicine.get_by_id(self.medicine_id)
+    async def get_medicine(self):
+        return await get_related(self, "medicine")
 
 
 # Models for function results
+async def get_refreshed_at(views):
+    """When the oldest of the given materialized views was last refreshed."""
+    query = "SELECT MIN(refreshed_at) FROM analytics_refresh_state WHERE view_name = ANY(%s)"
+    results = await execute_query_async(query, (list(views),))
+    return results[0][0] if results else None
+
+
 class TopMedication:
+    __relations__ = {"medication": ("Medication", "medication_id")}
+    __slots__ = ("medication_id", "medication_name", "order_count", "_prefetched")
+
     def __init__(self, medication_id=None, medication_name=None, order_count=None):
         self.medication_id = medication_id
         self.medication_name = medication_name
         self.order_count = order_count
 
-    def get_medication(self):
-        return Medication.get_by_id(self.medication_id)
+    async def get_medication(self):
+        return await get_related(self, "medication")
 
     @staticmethod
-    def get_top_10():
+    async def get_top_10():
         query = "SELECT * FROM get_top_10_medications()"
-        results = execute_query(query)
+        results = await execute_query_async(query)
         return [TopMedication(*row) for row in results]
 
     @staticmethod
-    def get_top_10_by_type(med_type):
+    async def get_top_10_by_type(med_type):
         query = "SELECT * FROM get_top_10_medications_by_type(%s)"
-        results = execute_query(query, (med_type,))
+        results = await execute_query_async(query, (med_type,))
         return [TopMedication(*row) for row in results]
 
 
 class IngredientUsage:
+    __slots__ = ("ingredient_name", "unit_of_measure", "total_amount_used")
+
     def __init__(self, ingredient_name=None, unit_of_measure=None, total_amount_used=None):
         self.ingredient_name = ingredient_name
         self.unit_of_measure = unit_of_measure
         self.total_amount_used = total_amount_used
 
     @staticmethod
-    def get_usage_volume(ingredient_name, start_date, end_date):
+    async def get_usage_volume(ingredient_name, start_date, end_date):
         query = "SELECT * FROM get_ingredient_usage_volume(%s, %s, %s)"
-        results = execute_query(query, (ingredient_name, start_date, end_date))
+        results = await execute_query_async(query, (ingredient_name, start_date, end_date))
         return [IngredientUsage(*row) for row in results]
 
 
 class ClientByMedication:
+    __relations__ = {"client": ("Client", "client_id")}
+    __slots__ = (
+        "client_id", "surname", "name", "patronymic", "phone_number", "order_number",
+        "expected_date", "medication_name", "medication_type", "_prefetched",
+    )
+
     def __init__(self, client_id=None, surname=None, name=None, patronymic=None, 
                  phone_number=None, order_number=None, expected_date_of_issue=None,
                  medication_name=None, medication_type=None):
@@ -153,35 +192,41 @@ class ClientByMedication:
         self.medication_name = medication_name
         self.medication_type = medication_type if 'medication_type' in locals() else None
 
-    def get_client(self):
-        return Client.get_by_id(self.client_id)
+    async def get_client(self):
+        return await get_related(self, "client")
 
     @staticmethod
-    def get_by_medication_name_and_period(med_name, start_date, end_date):
+    async def get_by_medication_name_and_period(med_name, start_date, end_date):
         query = "SELECT * FROM get_clients_by_medication_name_and_period(%s, %s, %s)"
-        results = execute_query(query, (med_name, start_date, end_date))
+        results = await execute_query_async(query, (med_name, start_date, end_date))
         return [ClientByMedication(*row) for row in results]
 
     @staticmethod
-    def get_by_medication_type_and_period(med_type, start_date, end_date):
+    async def get_by_medication_type_and_period(med_type, start_date, end_date):
         query = "SELECT * FROM get_clients_by_medication_type_and_period(%s, %s, %s)"
-        results = execute_query(query, (med_type, start_date, end_date))
+        results = await execute_query_async(query, (med_type, start_date, end_date))
         return [ClientByMedication(*row) for row in results]
 
     @staticmethod
-    def count_by_medication_name_and_period(med_name, start_date, end_date):
+    async def count_by_medication_name_and_period(med_name, start_date, end_date):
         query = "SELECT count_clients_by_medication_name_and_period(%s, %s, %s)"
-        result = execute_query(query, (med_name, start_date, end_date))
+        result = await execute_query_async(query, (med_name, start_date, end_date))
         return result[0][0] if result else 0
 
     @staticmethod
-    def count_by_medication_type_and_period(med_type, start_date, end_date):
+    async def count_by_medication_type_and_period(med_type, start_date, end_date):
         query = "SELECT count_clients_by_medication_type_and_period(%s, %s, %s)"
-        result = execute_query(query, (med_type, start_date, end_date))
+        result = await execute_query_async(query, (med_type, start_date, end_date))
         return result[0][0] if result else 0
 
 
 class MedicationAtCriticalLevel:
+    __relations__ = {"medication": ("Medication", "medication_id")}
+    __slots__ = (
+        "medication_id", "medication_name", "medication_type", "current_amount", "critical_norm",
+        "_prefetched",
+    )
+
     def __init__(self, medication_id=None, medication_name=None, medication_type=None, 
                  current_amount=None, critical_norm=None):
         self.medication_id = medication_id
@@ -190,17 +235,23 @@ class MedicationAtCriticalLevel:
         self.current_amount = current_amount
         self.critical_norm = critical_norm
 
-    def get_medication(self):
-        return Medication.get_by_id(self.medication_id)
+    async def get_medication(self):
+        return await get_related(self, "medication")
 
     @staticmethod
-    def get_all():
+    async def get_all():
         query = "SELECT * FROM get_medications_at_critical_level()"
-        results = execute_query(query)
+        results = await execute_query_async(query)
         return [MedicationAtCriticalLevel(*row) for row in results]
 
 
 class LowStockMedication:
+    __relations__ = {"medication": ("Medication", "medication_id")}
+    __slots__ = (
+        "medication_id", "medication_name", "medication_type", "current_amount", "critical_norm",
+        "_prefetched",
+    )
+
     def __init__(self, medication_id=None, medication_name=None, medication_type=None, 
                  current_amount=None, critical_norm=None):
         self.medication_id = medication_id
@@ -209,23 +260,33 @@ class LowStockMedication:
         self.current_amount = current_amount
         self.critical_norm = critical_norm
 
-    def get_medication(self):
-        return Medication.get_by_id(self.medication_id)
+    async def get_medication(self):
+        return await get_related(self, "medication")
 
     @staticmethod
-    def get_all():
+    async def get_all():
         query = "SELECT * FROM get_low_stock_medications()"
-        results = execute_query(query)
+        results = await execute_query_async(query)
         return [LowStockMedication(*row) for row in results]
 
     @staticmethod
-    def get_by_type(med_type):
+    async def get_by_type(med_type):
         query = "SELECT * FROM get_low_stock_medications_by_type(%s)"
-        results = execute_query(query, (med_type,))
+        results = await execute_query_async(query, (med_type,))
         return [LowStockMedication(*row) for row in results]
 
 
 class ProducingOrder:
+    __relations__ = {
+        "order": ("Order", "order_id"),
+        "prescription": ("Prescription", "prescription_id"),
+        "client": ("Client", "client_id"),
+    }
+    __slots__ = (
+        "order_id", "prescription_id", "client_id", "order_number", "expected_date_of_issue",
+        "status", "date_of_issue", "production_time", "cost", "_prefetched",
+    )
+
     def __init__(self, order_id=None, prescription_id=None, client_id=None, 
                  order_number=None, expected_date_of_issue=None, status=None, 
                  date_of_issue=None, production_time=None, cost=None):
@@ -239,29 +300,35 @@ class ProducingOrder:
         self.production_time = production_time
         self.cost = cost
 
-    def get_order(self):
-        return Order.get_by_id(self.order_id)
+    async def get_order(self):
+        return await get_related(self, "order")
 
-    def get_prescription(self):
-        return Prescription.get_by_id(self.prescription_id)
+    async def get_prescription(self):
+        return await get_related(self, "prescription")
 
-    def get_client(self):
-        return Client.get_by_id(self.client_id)
+    async def get_client(self):
+        return await get_related(self, "client")
 
     @staticmethod
-    def get_all():
+    async def get_all():
         query = "SELECT * FROM get_producing_orders()"
-        results = execute_query(query)
+        results = await execute_query_async(query)
         return [ProducingOrder(*row) for row in results]
 
     @staticmethod
-    def count():
+    async def count():
         query = "SELECT count_producing_orders()"
-        result = execute_query(query)
+        result = await execute_query_async(query)
         return result[0][0] if result else 0
 
 
 class IngredientForProducingOrder:
+    __relations__ = {"ingredient": ("Ingredient", "ingredient_id")}
+    __slots__ = (
+        "ingredient_id", "ingredient_name", "total_required_amount", "unit_of_measure",
+        "_prefetched",
+    )
+
     def __init__(self, ingredient_id=None, ingredient_name=None, 
                  total_required_amount=None, unit_of_measure=None):
         self.ingredient_id = ingredient_id
@@ -269,23 +336,25 @@ class IngredientForProducingOrder:
         self.total_required_amount = total_required_amount
         self.unit_of_measure = unit_of_measure
 
-    def get_ingredient(self):
-        return Ingredient.get_by_id(self.ingredient_id)
+    async def get_ingredient(self):
+        return await get_related(self, "ingredient")
 
     @staticmethod
-    def get_all():
+    async def get_all():
         query = "SELECT * FROM get_ingredients_for_producing_orders()"
-        results = execute_query(query)
+        results = await execute_query_async(query)
         return [IngredientForProducingOrder(*row) for row in results]
 
     @staticmethod
-    def count():
+    async def count():
         query = "SELECT count_ingredients_for_producing_orders()"
-        result = execute_query(query)
+        result = await execute_query_async(query)
         return result[0][0] if result else 0
 
 
 class TechnologyOfPreparation:
+    __slots__ = ("tech_id", "tech_description", "medicine_name", "medicine_type")
+
     def __init__(self, tech_id=None, tech_description=None, 
                  medicine_name=None, medicine_type=None):
         self.tech_id = tech_id
@@ -294,13 +363,18 @@ class TechnologyOfPreparation:
         self.medicine_type = medicine_type
 
     @staticmethod
-    def get_all(medicine_type=None, medicine_names=None, from_producing_orders=False):
+    async def get_all(medicine_type=None, medicine_names=None, from_producing_orders=False):
         query = "SELECT * FROM get_technology_of_preparation(%s, %s, %s)"
-        results = execute_query(query, (medicine_type, medicine_names, from_producing_orders))
+        results = await execute_query_async(query, (medicine_type, medicine_names, from_producing_orders))
         return [TechnologyOfPreparation(*row) for row in results]
 
 
 class MedicinePriceAndComponents:
+    __slots__ = (
+        "medicine_name", "medicine_price", "component_name", "required_component_amount",
+        "component_unit_of_measure", "component_price",
+    )
+
     def __init__(self, medicine_name=None, medicine_price=None, component_name=None, 
                  required_component_amount=None, component_unit_of_measure=None, 
                  component_price=None):
@@ -312,13 +386,19 @@ class MedicinePriceAndComponents:
         self.component_price = component_price
 
     @staticmethod
-    def get_by_medicine_name(medicine_name):
+    async def get_by_medicine_name(medicine_name):
         query = "SELECT * FROM get_medicine_price_and_components_info(%s)"
-        results = execute_query(query, (medicine_name,))
+        results = await execute_query_async(query, (medicine_name,))
         return [MedicinePriceAndComponents(*row) for row in results]
 
 
 class MostFrequentClient:
+    __relations__ = {"client": ("Client", "client_id")}
+    __slots__ = (
+        "client_id", "client_surname", "client_name", "client_patronymic", "total_orders",
+        "_prefetched",
+    )
+
     def __init__(self, client_id=None, client_surname=None, client_name=None, 
                  client_patronymic=None, total_orders=None):
         self.client_id = client_id
@@ -327,11 +407,11 @@ class MostFrequentClient:
         self.client_patronymic = client_patronymic
         self.total_orders = total_orders
 
-    def get_client(self):
-        return Client.get_by_id(self.client_id)
+    async def get_client(self):
+        return await get_related(self, "client")
 
     @staticmethod
-    def get_most_frequent(medicine_type=None, medicine_names=None, limit=10):
+    async def get_most_frequent(medicine_type=None, medicine_names=None, limit=10):
         query = "SELECT * FROM get_most_frequent_clients(%s, %s, %s)"
-        results = execute_query(query, (medicine_type, medicine_names, limit))
+        results = await execute_query_async(query, (medicine_type, medicine_names, limit))
         return [MostFrequentClient(*row) for row in results]
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""
+Rows per second through the bulk endpoints compared with one POST per row.
+
+Run it against a started API with test data loaded; the rows reference the
+medication given by --medication-id:
+
+    python benchmarks/bulk_ingest.py --url http://localhost:8000 --rows 10000
+"""
+import argparse
+import json
+import time
+import urllib.request
+from datetime import date
+
+
+def post(url, payload):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def delivery_rows(count, medication_id):
+    today = date.today().isoformat()
+    return [
+        {"medication_id": medication_id, "application_date": today, "delivery_date": today, "amount": 1}
+        for _ in range(count)
+    ]
+
+
+def inventory_rows(count, medication_id):
+    today = date.today().isoformat()
+    return [{"medication_id": medication_id, "inventory_date": today, "amount": 1} for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--single-rows", type=int, default=500,
+                        help="rows sent one by one for the baseline")
+    parser.add_argument("--medication-id", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<14} {'rows':>7} {'single rows/s':>14} {'bulk rows/s':>12} {'rejected':>9}")
+    for path, make_rows in (("/deliveries", delivery_rows), ("/inventories", inventory_rows)):
+        single = make_rows(args.single_rows, args.medication_id)
+        start = time.perf_counter()
+        for row in single:
+            post(f"{args.url}{path}/", row)
+        single_rate = len(single) / (time.perf_counter() - start)
+
+        rows = make_rows(args.rows, args.medication_id)
+        start = time.perf_counter()
+        result = post(f"{args.url}{path}/bulk", rows)
+        bulk_rate = len(rows) / (time.perf_counter() - start)
+
+        print(f"{path:<14} {len(rows):>7} {single_rate:>14.0f} {bulk_rate:>12.0f} {len(result['errors']):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Throughput of the API under concurrent requests.
+
+Run it against a started API (python run_api.py), once on the old build and once
+on the new one, and compare the numbers:
+
+    python benchmarks/concurrent_requests.py --url http://localhost:8000/orders/ --concurrency 1 10 50
+"""
+import argparse
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def fetch(url):
+    start = time.perf_counter()
+    with urllib.request.urlopen(url) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def run(url, concurrency, requests_total):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        latencies = list(executor.map(fetch, [url] * requests_total))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": requests_total / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000/orders/")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    fetch(args.url)  # warm up
+    print(f"{'concurrency':>11} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for concurrency in args.concurrency:
+        result = run(args.url, concurrency, args.requests)
+        print(f"{concurrency:>11} {result['rps']:>9.1f} {result['p50']:>9.1f} {result['p95']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
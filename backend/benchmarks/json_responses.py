@@ -0,0 +1,93 @@
+"""
+Time to turn a list response into bytes: FastAPI validating the rows against the
+route's response_model and encoding them with JSONResponse, compared with
+FastJSONResponse (app/responses.py).
+
+Needs no database: the rows of /orders/ and /queries/medicines/details are
+built in memory and serialized the way the routes do. Run from backend/:
+
+    python benchmarks/json_responses.py --rows 50000
+
+For latency and throughput of the whole request, run benchmarks/concurrent_requests.py
+against an API started with FAST_JSON=0 and one started with FAST_JSON=1, and
+one started with PG_JSON=1, where Postgres builds the JSON of these routes.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.models import Order  # noqa: E402
+from app.responses import FastJSONResponse, orjson  # noqa: E402
+from app.routers.order import ORDER_FIELD_TRANSLATION  # noqa: E402
+from app.serializers import to_dicts  # noqa: E402
+from app.view_models import MedicineDetailsView  # noqa: E402
+
+
+def orders_content(count):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = [Order(i, i, i % 1000, i, "ready", None, start, start + timedelta(days=2), Decimal("123.45"))
+            for i in range(1, count + 1)]
+    return {"data": to_dicts(rows), "headers": ORDER_FIELD_TRANSLATION, "next_cursor": None}
+
+
+def medicine_details_content(count):
+    rows = [MedicineDetailsView(i % 500, "Микстура от кашля", "manufactured", "Смешать", "Вода", Decimal("10.00"),
+                                "ml", Decimal("1.50"), Decimal("100.00"))
+            for i in range(1, count + 1)]
+    return to_dicts(rows)
+
+
+def route_field(path):
+    route = next(route for route in app.routes if getattr(route, "path", None) == path)
+    return route.secure_cloned_response_field
+
+
+async def validated(field, content):
+    body = await serialize_response(field=field, response_content=content, is_coroutine=True)
+    return JSONResponse(body).body
+
+
+async def fast(field, content):
+    return FastJSONResponse(content).body
+
+
+def best_of(loop, repeat, func, field, content):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = loop.run_until_complete(func(field, content))
+        times.append(time.perf_counter() - start)
+    return min(times), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    print(f"encoder: {'orjson' if orjson is not None else 'json (orjson not installed)'}")
+    print(f"{'route':<28} {'rows':>7} {'validated ms':>13} {'fast ms':>9} {'speedup':>8} {'bytes':>10}")
+    for path, make_content in (("/orders/", orders_content),
+                               ("/queries/medicines/details", medicine_details_content)):
+        content = make_content(args.rows)
+        field = route_field(path)
+        slow, _ = best_of(loop, args.repeat, validated, field, content)
+        quick, size = best_of(loop, args.repeat, fast, field, content)
+        print(f"{path:<28} {args.rows:>7} {slow * 1000:>13.1f} {quick * 1000:>9.1f} {slow / quick:>7.1f}x {size:>10}")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
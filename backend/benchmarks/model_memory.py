@@ -0,0 +1,64 @@
+"""
+Memory held by the objects get_all builds, with the slotted models compared
+with the same classes backed by a per-instance __dict__.
+
+Needs no database: the rows get_all would fetch are built in memory first, and
+only the objects made from them are measured with tracemalloc. Run from backend/:
+
+    python benchmarks/model_memory.py --rows 100000
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.models import Order  # noqa: E402
+from app.view_models import ClientsWaitingForDelivery  # noqa: E402
+
+
+def order_rows(count):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [(i, i, i % 1000, i, "ready", None, start, start + timedelta(days=2), Decimal("123.45"))
+            for i in range(1, count + 1)]
+
+
+def waiting_client_rows(count):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [(i, "Иванов", "Иван", "Иванович", "79034063954", i, start, "Парацетамол", "finished")
+            for i in range(1, count + 1)]
+
+
+def with_dict(cls):
+    """A class with cls's constructor that stores the fields in __dict__, like the models used to."""
+    return type(f"{cls.__name__}WithDict", (), {"__init__": cls.__init__})
+
+
+def traced_bytes(cls, rows):
+    tracemalloc.start()
+    objects = [cls(*row) for row in rows]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    print(f"{'get_all of':<28} {'rows':>7} {'__dict__ MB':>12} {'__slots__ MB':>13} {'bytes/row saved':>16}")
+    for cls, make_rows in ((Order, order_rows), (ClientsWaitingForDelivery, waiting_client_rows)):
+        rows = make_rows(args.rows)
+        before = traced_bytes(with_dict(cls), rows)
+        after = traced_bytes(cls, rows)
+        print(f"{cls.__name__:<28} {len(rows):>7} {before / 2 ** 20:>12.1f} {after / 2 ** 20:>13.1f} "
+              f"{(before - after) / len(rows):>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Time spent on the hot statements with and without server-side prepared statements.
+
+Connects with the same DB_* environment variables as the API:
+
+    DB_HOST=localhost python benchmarks/prepared_statements.py --iterations 2000
+"""
+import argparse
+import os
+import time
+
+import psycopg2
+
+HOT_QUERIES = [
+    ("Model.get_by_id", "SELECT id, prescription_id, client_id, order_number, status, date_of_issue, "
+                        "start_data, expected_date_of_issue, cost FROM medicine_order WHERE id = %s", (1,)),
+    ("Client.search", "SELECT id FROM client WHERE surname = %s AND name = %s AND patronymic = %s "
+                      "AND phone_number = %s", ("Иванов", "Иван", "Иванович", "79034063954")),
+    ("get_top_10_medications", "SELECT * FROM get_top_10_medications()", ()),
+    ("get_producing_orders", "SELECT * FROM get_producing_orders()", ()),
+]
+
+
+def to_server_placeholders(query, params):
+    for number in range(1, len(params) + 1):
+        query = query.replace("%s", f"${number}", 1)
+    return query
+
+
+def planning_time(cur, query, params):
+    cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + query, params)
+    return cur.fetchone()[0][0]["Planning Time"]
+
+
+def timed(cur, query, params, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        cur.execute(query, params)
+        cur.fetchall()
+    return (time.perf_counter() - start) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=1000)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        host=os.environ.get("DB_HOST", "db"),
+        dbname=os.environ.get("DB_NAME", "postgres"),
+        user=os.environ.get("DB_USER", "myuser"),
+        password=os.environ.get("DB_PASS", "mypassword"),
+    )
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    print(f"{'statement':<24} {'plan ms':>8} {'plain ms':>9} {'prepared ms':>12}")
+    for number, (label, query, params) in enumerate(HOT_QUERIES):
+        name = f"bench_{number}"
+        cur.execute(f"PREPARE {name} AS {to_server_placeholders(query, params)}")
+        arguments = f" ({', '.join(['%s'] * len(params))})" if params else ""
+
+        plain = timed(cur, query, params, args.iterations)
+        prepared = timed(cur, f"EXECUTE {name}{arguments}", params, args.iterations)
+        plan = planning_time(cur, query, params)
+        print(f"{label:<24} {plan:>8.3f} {plain:>9.3f} {prepared:>12.3f}")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Rows per second through the compiled serializers compared with model_to_dict.
+
+Needs no database; the rows are built in memory. Run from backend/:
+
+    python benchmarks/serializers.py --rows 50000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.models import Order, Technology  # noqa: E402
+from app.serializers import model_to_dict, to_dicts  # noqa: E402
+from app.view_models import ClientsWaitingForDelivery  # noqa: E402
+
+
+def orders(count):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        Order(i, i, i % 1000, i, "ready", date(2024, 1, 2) if i % 2 else None,
+              start, start + timedelta(days=2), Decimal("123.45"))
+        for i in range(1, count + 1)
+    ]
+
+
+def technologies(count):
+    return [Technology(i, "Смешать и растереть", timedelta(days=1)) for i in range(1, count + 1)]
+
+
+def waiting_clients(count):
+    return [
+        ClientsWaitingForDelivery(i, "Иванов", "Иван", "Иванович", "79034063954", i,
+                                  datetime(2024, 1, 1, tzinfo=timezone.utc), "Парацетамол", "finished")
+        for i in range(1, count + 1)
+    ]
+
+
+def best_of(repeat, func, rows):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(rows)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':<28} {'model_to_dict rows/s':>21} {'compiled rows/s':>16} {'speedup':>8}")
+    for name, make_rows in (("Order", orders), ("Technology", technologies),
+                            ("ClientsWaitingForDelivery", waiting_clients)):
+        rows = make_rows(args.rows)
+        assert to_dicts(rows) == [model_to_dict(row) for row in rows]
+        reflective = best_of(args.repeat, lambda items: [model_to_dict(item) for item in items], rows)
+        compiled = best_of(args.repeat, to_dicts, rows)
+        print(f"{name:<28} {len(rows) / reflective:>21.0f} {len(rows) / compiled:>16.0f} "
+              f"{reflective / compiled:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Worker startup cost: import time of app.main and time until the first request is served.
+
+Run from backend/. The import part needs no database; the first-request part
+starts uvicorn on --port with the DB_* environment variables of the API and
+also times the first request that needs a database connection:
+
+    DB_HOST=localhost python benchmarks/startup.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+def import_time(top):
+    """Total import time of app.main in ms and the `top` slowest modules (cumulative)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented below the one that triggered them
+        modules.append((int(cumulative) / 1000, name[1:].rstrip()))
+    total = sum(ms for ms, name in modules if not name.startswith(" "))
+    return total, sorted(modules, reverse=True)[:top]
+
+
+def wait_for(url, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url) as response:
+                response.read()
+                return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.01)
+    raise TimeoutError(url)
+
+
+def first_request(port, db_path):
+    """Seconds from starting uvicorn until / answers, and until db_path answers."""
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=dict(os.environ, CACHE_LISTEN="0", ANALYTICS_REFRESH="0", COUNTERS_CHECK="0"),
+    )
+    try:
+        wait_for(f"http://127.0.0.1:{port}/", start + 60)
+        ready = time.perf_counter() - start
+        wait_for(f"http://127.0.0.1:{port}{db_path}", start + 60)
+        return ready, time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest modules to list")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db-path", default="/clients/?limit=1")
+    parser.add_argument("--no-server", action="store_true", help="only measure the import")
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(args.runs):
+        total, slowest = import_time(args.top)
+        totals.append(total)
+    print(f"import app.main: median {statistics.median(totals):.0f} ms over {args.runs} runs")
+    for ms, name in slowest:
+        print(f"  {ms:8.1f} ms  {name.strip()}")
+
+    if args.no_server:
+        return
+    runs = [first_request(args.port, args.db_path) for _ in range(args.runs)]
+    print(f"first request to /:          median {statistics.median(r for r, _ in runs) * 1000:.0f} ms")
+    print(f"first request to {args.db_path}: median {statistics.median(d for _, d in runs) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
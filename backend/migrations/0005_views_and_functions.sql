@@ -18,6 +18,7 @@ AND
     mo.expected_date_of_issue <= NOW();
 
 -- Функция для подсчета общего числа клиентов, которые не забрали вовремя свой заказ
+-- (зависит от NOW(), поэтому считается запросом, а не счетчиком)
 CREATE OR REPLACE FUNCTION count_unclaimed_orders_clients()
 RETURNS BIGINT AS $$
 BEGIN
@@ -54,7 +55,8 @@ WHERE
 CREATE OR REPLACE FUNCTION count_clients_waiting_for_delivery()
     RETURNS BIGINT AS $$
 BEGIN
-    RETURN (SELECT COUNT(DISTINCT client_id) FROM clients_waiting_for_delivery);
+    -- Счетчик поддерживается триггерами (см. 0008_query_counters.sql)
+    RETURN (SELECT value FROM query_counters WHERE name = 'clients_waiting_for_delivery');
 END;
 $$ LANGUAGE plpgsql;
 
@@ -68,6 +70,95 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Материализованные представления для аналитики. Обновляются с помощью
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY из API (app/refresher.py) по расписанию
+-- или после заданного числа изменений заказов; уникальные индексы нужны для CONCURRENTLY.
+-- Время последнего обновления хранится в analytics_refresh_state.
+CREATE TABLE IF NOT EXISTS analytics_refresh_state (
+                                                       view_name VARCHAR(64) PRIMARY KEY,
+                                                       refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                                                       order_version BIGINT NOT NULL DEFAULT 0
+);
+
+-- Число заказов по каждому лекарству
+DROP MATERIALIZED VIEW IF EXISTS medication_order_counts;
+CREATE MATERIALIZED VIEW medication_order_counts AS
+SELECT
+    m.id AS medication_id,
+    m.name AS medication_name,
+    med.type AS medicine_type,
+    COUNT(mo.id) AS order_count
+FROM
+    medication m
+        JOIN
+    medicine med ON m.id = med.id -- Joining through medicine table
+        JOIN
+    prescription p ON med.id = p.medicine_id
+        JOIN
+    medicine_order mo ON p.id = mo.prescription_id
+GROUP BY
+    m.id, m.name, med.type;
+
+CREATE UNIQUE INDEX medication_order_counts_key
+    ON medication_order_counts (medication_id, medication_name);
+
+-- Объем ингредиентов по выданным заказам за каждый день
+DROP MATERIALIZED VIEW IF EXISTS ingredient_usage_daily;
+CREATE MATERIALIZED VIEW ingredient_usage_daily AS
+SELECT
+    i.name AS ingredient_name,
+    i.unit_of_measure,
+    mo.date_of_issue,
+    SUM(c.amount * p.amount) AS amount_used
+FROM
+    ingredient i
+        JOIN
+    composition c ON i.id = c.ingredient_id
+        JOIN
+    medicine m ON c.medicine_id = m.id
+        JOIN
+    prescription p ON m.id = p.medicine_id
+        JOIN
+    medicine_order mo ON p.id = mo.prescription_id
+WHERE
+    mo.status = 'issued' -- Consider only issued orders
+  AND mo.date_of_issue IS NOT NULL
+GROUP BY
+    i.name, i.unit_of_measure, mo.date_of_issue;
+
+CREATE UNIQUE INDEX ingredient_usage_daily_key
+    ON ingredient_usage_daily (ingredient_name, unit_of_measure, date_of_issue);
+
+-- Число заказов каждого клиента по каждому лекарству
+DROP MATERIALIZED VIEW IF EXISTS client_medicine_order_counts;
+CREATE MATERIALIZED VIEW client_medicine_order_counts AS
+SELECT
+    c.id AS client_id,
+    c.surname AS client_surname,
+    c.name AS client_name,
+    c.patronymic AS client_patronymic,
+    m.id AS medicine_id,
+    m.name AS medicine_name,
+    m.type AS medicine_type,
+    COUNT(mo.id) AS order_count
+FROM
+    client c
+        JOIN
+    medicine_order mo ON c.id = mo.client_id
+        JOIN
+    prescription p ON mo.prescription_id = p.id
+        JOIN
+    medicine m ON p.medicine_id = m.id
+GROUP BY
+    c.id, c.surname, c.name, c.patronymic, m.id, m.name, m.type;
+
+CREATE UNIQUE INDEX client_medicine_order_counts_key
+    ON client_medicine_order_counts (client_id, medicine_id);
+
+INSERT INTO analytics_refresh_state (view_name)
+VALUES ('medication_order_counts'), ('ingredient_usage_daily'), ('client_medicine_order_counts')
+ON CONFLICT (view_name) DO UPDATE SET refreshed_at = NOW();
+
 -- Функция для получения 10 наиболее часто используемых медикаментов
 CREATE OR REPLACE FUNCTION get_top_10_medications()
     RETURNS TABLE (
@@ -78,21 +169,13 @@ CREATE OR REPLACE FUNCTION get_top_10_medications()
 BEGIN
     RETURN QUERY
         SELECT
-            m.id AS medication_id,
-            m.name AS medication_name,
-            COUNT(mo.id) AS order_count
+            moc.medication_id,
+            moc.medication_name,
+            moc.order_count
         FROM
-            medication m
-                JOIN
-            medicine med ON m.id = med.id -- Joining through medicine table
-                JOIN
-            prescription p ON med.id = p.medicine_id
-                JOIN
-            medicine_order mo ON p.id = mo.prescription_id
-        GROUP BY
-            m.id, m.name
+            medication_order_counts moc
         ORDER BY
-            order_count DESC
+            moc.order_count DESC
         LIMIT 10;
 END;
 $$ LANGUAGE plpgsql;
@@ -109,23 +192,15 @@ CREATE OR REPLACE FUNCTION get_top_10_medications_by_type(
 BEGIN
     RETURN QUERY
         SELECT
-            m.id AS medication_id,
-            m.name AS medication_name,
-            COUNT(mo.id) AS order_count
+            moc.medication_id,
+            moc.medication_name,
+            moc.order_count
         FROM
-            medication m
-                JOIN
-            medicine med ON m.id = med.id -- Joining through medicine table
-                JOIN
-            prescription p ON med.id = p.medicine_id
-                JOIN
-            medicine_order mo ON p.id = mo.prescription_id
+            medication_order_counts moc
         WHERE
-            med.type = med_type
-        GROUP BY
-            m.id, m.name
+            moc.medicine_type = med_type
         ORDER BY
-            order_count DESC
+            moc.order_count DESC
         LIMIT 10;
 END;
 $$ LANGUAGE plpgsql;
@@ -144,25 +219,16 @@ CREATE OR REPLACE FUNCTION get_ingredient_usage_volume(
 BEGIN
     RETURN QUERY
         SELECT
-            i.name AS returning_ingredient_name,
-            i.unit_of_measure,
-            SUM(c.amount * p.amount) AS total_amount_used -- Assuming c.amount is amount of ingredient per medicine unit and p.amount is amount of medicine per prescription
+            iud.ingredient_name AS returning_ingredient_name,
+            iud.unit_of_measure,
+            SUM(iud.amount_used) AS total_amount_used
         FROM
-            ingredient i
-                JOIN
-            composition c ON i.id = c.ingredient_id
-                JOIN
-            medicine m ON c.medicine_id = m.id
-                JOIN
-            prescription p ON m.id = p.medicine_id
-                JOIN
-            medicine_order mo ON p.id = mo.prescription_id
+            ingredient_usage_daily iud
         WHERE
-            i.name = ingredient_name
-          AND mo.status = 'issued' -- Consider only issued orders
-          AND mo.date_of_issue BETWEEN start_date AND end_date
+            iud.ingredient_name = get_ingredient_usage_volume.ingredient_name
+          AND iud.date_of_issue BETWEEN start_date AND end_date
         GROUP BY
-            i.name, i.unit_of_measure;
+            iud.ingredient_name, iud.unit_of_measure;
 END;
 $$ LANGUAGE plpgsql;
 
@@ -409,7 +475,8 @@ $$ LANGUAGE plpgsql;
 CREATE OR REPLACE FUNCTION count_producing_orders()
     RETURNS BIGINT AS $$
 BEGIN
-    RETURN (SELECT COUNT(*) FROM medicine_order WHERE status = 'producing'::order_status);
+    -- Счетчик поддерживается триггерами (см. 0008_query_counters.sql)
+    RETURN (SELECT value FROM query_counters WHERE name = 'producing_orders');
 END;
 $$ LANGUAGE plpgsql;
 
@@ -449,13 +516,8 @@ $$ LANGUAGE plpgsql;
 CREATE OR REPLACE FUNCTION count_ingredients_for_producing_orders()
     RETURNS BIGINT AS $$
 BEGIN
-    RETURN (
-        SELECT COUNT(DISTINCT c.ingredient_id)
-        FROM medicine_order mo
-                 JOIN prescription p ON mo.prescription_id = p.id
-                 JOIN composition c ON p.medicine_id = c.medicine_id
-        WHERE mo.status = 'producing'::order_status
-    );
+    -- Счетчик поддерживается триггерами (см. 0008_query_counters.sql)
+    RETURN (SELECT value FROM query_counters WHERE name = 'producing_ingredients');
 END;
 $$ LANGUAGE plpgsql;
 
@@ -545,24 +607,18 @@ CREATE OR REPLACE FUNCTION get_most_frequent_clients(
 BEGIN
     RETURN QUERY
         SELECT
-            c.id AS client_id,
-            c.surname AS client_surname,
-            c.name AS client_name,
-            c.patronymic AS client_patronymic,
-            COUNT(mo.id) AS total_orders
+            cmo.client_id,
+            cmo.client_surname,
+            cmo.client_name,
+            cmo.client_patronymic,
+            SUM(cmo.order_count)::BIGINT AS total_orders
         FROM
-            client c
-                JOIN
-            medicine_order mo ON c.id = mo.client_id
-                JOIN
-            prescription p ON mo.prescription_id = p.id
-                JOIN
-            medicine m ON p.medicine_id = m.id
+            client_medicine_order_counts cmo
         WHERE
-            (p_medicine_type IS NULL OR m.type = p_medicine_type)
-          AND (p_medicine_names IS NULL OR m.name = ANY(p_medicine_names))
+            (p_medicine_type IS NULL OR cmo.medicine_type = p_medicine_type)
+          AND (p_medicine_names IS NULL OR cmo.medicine_name = ANY(p_medicine_names))
         GROUP BY
-            c.id, c.surname, c.name, c.patronymic
+            cmo.client_id, cmo.client_surname, cmo.client_name, cmo.client_patronymic
         ORDER BY
             total_orders DESC
         LIMIT p_limit;
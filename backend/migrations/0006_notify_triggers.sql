@@ -0,0 +1,74 @@
+-- Уведомления об изменениях таблиц для сброса кэша в процессах API (см. app/listener.py)
+-- Канал table_change, полезная нагрузка: {"table": ..., "op": ..., "id": ...}
+CREATE OR REPLACE FUNCTION notify_table_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    row_data JSONB;
+BEGIN
+    IF TG_LEVEL = 'ROW' THEN
+        IF TG_OP = 'DELETE' THEN
+            row_data := to_jsonb(OLD);
+        ELSE
+            row_data := to_jsonb(NEW);
+        END IF;
+    END IF;
+
+    PERFORM pg_notify('table_change', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP,
+        'id', row_data -> 'id'
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Справочные таблицы меняются редко: уведомление на каждую строку
+DROP TRIGGER IF EXISTS notify_technology_change ON technology_of_preparation;
+CREATE TRIGGER notify_technology_change
+AFTER INSERT OR UPDATE OR DELETE ON technology_of_preparation
+FOR EACH ROW
+EXECUTE FUNCTION notify_table_change();
+
+DROP TRIGGER IF EXISTS notify_medication_change ON medication;
+CREATE TRIGGER notify_medication_change
+AFTER INSERT OR UPDATE OR DELETE ON medication
+FOR EACH ROW
+EXECUTE FUNCTION notify_table_change();
+
+DROP TRIGGER IF EXISTS notify_medicine_change ON medicine;
+CREATE TRIGGER notify_medicine_change
+AFTER INSERT OR UPDATE OR DELETE ON medicine
+FOR EACH ROW
+EXECUTE FUNCTION notify_table_change();
+
+DROP TRIGGER IF EXISTS notify_ingredient_change ON ingredient;
+CREATE TRIGGER notify_ingredient_change
+AFTER INSERT OR UPDATE OR DELETE ON ingredient
+FOR EACH ROW
+EXECUTE FUNCTION notify_table_change();
+
+-- У composition нет id, сбрасывается вся таблица
+DROP TRIGGER IF EXISTS notify_composition_change ON composition;
+CREATE TRIGGER notify_composition_change
+AFTER INSERT OR UPDATE OR DELETE ON composition
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_table_change();
+
+-- Таблицы заказов пишутся пачками (в т.ч. через /bulk): одно уведомление на оператор
+DROP TRIGGER IF EXISTS notify_prescription_change ON prescription;
+CREATE TRIGGER notify_prescription_change
+AFTER INSERT OR UPDATE OR DELETE ON prescription
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_table_change();
+
+DROP TRIGGER IF EXISTS notify_order_change ON medicine_order;
+CREATE TRIGGER notify_order_change
+AFTER INSERT OR UPDATE OR DELETE ON medicine_order
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_table_change();
+
+DROP TRIGGER IF EXISTS notify_delivery_change ON medication_delivery;
+CREATE TRIGGER notify_delivery_change
+AFTER INSERT OR UPDATE OR DELETE ON medication_delivery
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_table_change();
@@ -0,0 +1,86 @@
+-- Версии таблиц для условных GET-запросов (ETag / Last-Modified)
+-- Каждый оператор, изменяющий таблицу, увеличивает её версию
+CREATE TABLE IF NOT EXISTS table_versions (
+                                              table_name VARCHAR(64) PRIMARY KEY,
+                                              version BIGINT NOT NULL DEFAULT 0,
+                                              modified_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO table_versions (table_name)
+VALUES ('client'), ('technology_of_preparation'), ('medication'), ('medicine'), ('ingredient'),
+       ('composition'), ('prescription'), ('medicine_order'), ('inventory'), ('medication_delivery')
+ON CONFLICT (table_name) DO NOTHING;
+
+-- Аргументы триггера: таблицы, версии которых нужно увеличить
+-- (UPDATE medication меняет и строки наследников medicine и ingredient,
+-- а триггеры уровня оператора срабатывают только для самой medication)
+CREATE OR REPLACE FUNCTION bump_table_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE table_versions
+    SET version = version + 1,
+        modified_at = NOW()
+    WHERE table_name = ANY(TG_ARGV);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bump_client_version ON client;
+CREATE TRIGGER bump_client_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON client
+FOR EACH STATEMENT
+EXECUTE FUNCTION bump_table_version('client');
+
+DROP TRIGGER IF EXISTS bump_technology_version ON technology_of_preparation;
+CREATE TRIGGER bump_technology_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON technology_of_preparation
+FOR EACH STATEMENT
+EXECUTE FUNCTION bump_table_version('technology_of_preparation');
+
+DROP TRIGGER IF EXISTS bump_medication_version ON medication;
+CREATE TRIGGER bump_medication_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON medication
+FOR EACH STATEMENT
+EXECUTE FUNCTION bump_table_version('medication', 'medicine', 'ingredient');
+
+DROP TRIGGER IF EXISTS bump_medicine_version ON medicine;
+CREATE TRIGGER bump_medicine_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON medicine
+FOR EACH STATEMENT
+EXECUTE FUNCTION bump_table_version('medicine');
+
+DROP TRIGGER IF EXISTS bump_ingredient_version ON ingredient;
+CREATE TRIGGER bump_ingredient_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ingredient
+FOR EACH STATEMENT
+EXECUTE FUNCTION bump_table_version('ingredient');
+
+DROP TRIGGER IF EXISTS bump_composition_version ON composition;
+CREATE TRIGGER bump_composition_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON composition
+FOR EACH STATEMENT
+EXECUTE FUNCTION bump_table_version('composition');
+
+DROP TRIGGER IF EXISTS bump_prescription_version ON prescription;
+CREATE TRIGGER bump_prescription_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON prescription
+FOR EACH STATEMENT
+EXECUTE FUNCTION bump_table_version('prescription');
+
+DROP TRIGGER IF EXISTS bump_order_version ON medicine_order;
+CREATE TRIGGER bump_order_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON medicine_order
+FOR EACH STATEMENT
+EXECUTE FUNCTION bump_table_version('medicine_order');
+
+DROP TRIGGER IF EXISTS bump_inventory_version ON inventory;
+CREATE TRIGGER bump_inventory_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON inventory
+FOR EACH STATEMENT
+EXECUTE FUNCTION bump_table_version('inventory');
+
+DROP TRIGGER IF EXISTS bump_delivery_version ON medication_delivery;
+CREATE TRIGGER bump_delivery_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON medication_delivery
+FOR EACH STATEMENT
+EXECUTE FUNCTION bump_table_version('medication_delivery');
@@ -0,0 +1,255 @@
+-- Счетчики для /count-запросов, поддерживаемые триггерами вместо COUNT(DISTINCT ...) при каждом вызове.
+-- Сверка с фактическими данными: check_query_counters(), пересчет: rebuild_query_counters()
+-- (периодически запускаются из API, см. app/counters.py).
+-- Число клиентов с невыданными вовремя заказами зависит от NOW(), поэтому для него счетчика нет.
+CREATE TABLE IF NOT EXISTS query_counters (
+                                              name VARCHAR(64) PRIMARY KEY,
+                                              value BIGINT NOT NULL DEFAULT 0
+);
+
+-- Число заказов каждого клиента в каждом статусе (строки с нулем удаляются)
+CREATE TABLE IF NOT EXISTS order_client_counts (
+                                                   status order_status NOT NULL,
+                                                   client_id INTEGER NOT NULL,
+                                                   order_count INTEGER NOT NULL,
+                                                   PRIMARY KEY (status, client_id)
+);
+
+-- Число заказов в производстве по каждому лекарству
+CREATE TABLE IF NOT EXISTS producing_medicine_counts (
+                                                         medicine_id INTEGER PRIMARY KEY,
+                                                         order_count INTEGER NOT NULL
+);
+
+-- Число лекарств в производстве, в состав которых входит ингредиент
+CREATE TABLE IF NOT EXISTS producing_ingredient_counts (
+                                                           ingredient_id INTEGER PRIMARY KEY,
+                                                           medicine_count INTEGER NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION bump_query_counter(p_name VARCHAR, p_delta BIGINT)
+RETURNS VOID AS $$
+BEGIN
+    UPDATE query_counters SET value = value + p_delta WHERE name = p_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Ингредиент начал или перестал требоваться для производства
+CREATE OR REPLACE FUNCTION apply_producing_ingredient(p_ingredient_id INTEGER, p_delta INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    new_count INTEGER;
+BEGIN
+    INSERT INTO producing_ingredient_counts AS pic (ingredient_id, medicine_count)
+    VALUES (p_ingredient_id, p_delta)
+    ON CONFLICT (ingredient_id) DO UPDATE SET medicine_count = pic.medicine_count + p_delta
+    RETURNING medicine_count INTO new_count;
+
+    IF new_count = 0 OR new_count = p_delta THEN
+        PERFORM bump_query_counter('producing_ingredients', sign(p_delta)::BIGINT);
+    END IF;
+    IF new_count = 0 THEN
+        DELETE FROM producing_ingredient_counts WHERE ingredient_id = p_ingredient_id;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Изменение числа заказов в производстве для лекарства
+CREATE OR REPLACE FUNCTION apply_producing_medicine(p_medicine_id INTEGER, p_delta INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    new_count INTEGER;
+    comp RECORD;
+BEGIN
+    IF p_delta = 0 THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO producing_medicine_counts AS pmc (medicine_id, order_count)
+    VALUES (p_medicine_id, p_delta)
+    ON CONFLICT (medicine_id) DO UPDATE SET order_count = pmc.order_count + p_delta
+    RETURNING order_count INTO new_count;
+
+    -- Ингредиенты учитываются, только когда лекарство появляется в производстве или уходит из него
+    IF new_count = 0 OR new_count = p_delta THEN
+        FOR comp IN SELECT ingredient_id FROM composition WHERE medicine_id = p_medicine_id LOOP
+            PERFORM apply_producing_ingredient(comp.ingredient_id, sign(p_delta)::INTEGER);
+        END LOOP;
+    END IF;
+    IF new_count = 0 THEN
+        DELETE FROM producing_medicine_counts WHERE medicine_id = p_medicine_id;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Заказ появился (p_delta = 1) или пропал (p_delta = -1) в статусе
+CREATE OR REPLACE FUNCTION apply_order_to_counters(
+    p_status order_status,
+    p_client_id INTEGER,
+    p_prescription_id INTEGER,
+    p_delta INTEGER
+)
+RETURNS VOID AS $$
+DECLARE
+    new_count INTEGER;
+BEGIN
+    INSERT INTO order_client_counts AS occ (status, client_id, order_count)
+    VALUES (p_status, p_client_id, p_delta)
+    ON CONFLICT (status, client_id) DO UPDATE SET order_count = occ.order_count + p_delta
+    RETURNING order_count INTO new_count;
+
+    IF p_status = 'waiting for a delivery' AND (new_count = 0 OR new_count = p_delta) THEN
+        PERFORM bump_query_counter('clients_waiting_for_delivery', p_delta);
+    END IF;
+    IF new_count = 0 THEN
+        DELETE FROM order_client_counts WHERE status = p_status AND client_id = p_client_id;
+    END IF;
+
+    IF p_status = 'producing' THEN
+        PERFORM bump_query_counter('producing_orders', p_delta);
+        PERFORM apply_producing_medicine(
+            (SELECT medicine_id FROM prescription WHERE id = p_prescription_id),
+            p_delta
+        );
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_order_counters()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND OLD.status = NEW.status
+        AND OLD.client_id = NEW.client_id
+        AND OLD.prescription_id = NEW.prescription_id THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_order_to_counters(OLD.status, OLD.client_id, OLD.prescription_id, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_order_to_counters(NEW.status, NEW.client_id, NEW.prescription_id, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_update_order_counters ON medicine_order;
+CREATE TRIGGER trigger_update_order_counters
+AFTER INSERT OR DELETE OR UPDATE OF status, client_id, prescription_id ON medicine_order
+FOR EACH ROW
+EXECUTE FUNCTION update_order_counters();
+
+-- Смена лекарства в рецепте переносит его заказы в производстве на другое лекарство
+CREATE OR REPLACE FUNCTION update_prescription_counters()
+RETURNS TRIGGER AS $$
+DECLARE
+    producing INTEGER;
+BEGIN
+    IF OLD.medicine_id = NEW.medicine_id THEN
+        RETURN NULL;
+    END IF;
+    SELECT COUNT(*) INTO producing
+    FROM medicine_order
+    WHERE prescription_id = NEW.id AND status = 'producing'::order_status;
+
+    PERFORM apply_producing_medicine(OLD.medicine_id, -producing);
+    PERFORM apply_producing_medicine(NEW.medicine_id, producing);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_update_prescription_counters ON prescription;
+CREATE TRIGGER trigger_update_prescription_counters
+AFTER UPDATE OF medicine_id ON prescription
+FOR EACH ROW
+EXECUTE FUNCTION update_prescription_counters();
+
+-- Изменение состава лекарства, которое сейчас в производстве
+CREATE OR REPLACE FUNCTION update_composition_counters()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE')
+        AND EXISTS (SELECT 1 FROM producing_medicine_counts WHERE medicine_id = OLD.medicine_id) THEN
+        PERFORM apply_producing_ingredient(OLD.ingredient_id, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE')
+        AND EXISTS (SELECT 1 FROM producing_medicine_counts WHERE medicine_id = NEW.medicine_id) THEN
+        PERFORM apply_producing_ingredient(NEW.ingredient_id, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_update_composition_counters ON composition;
+CREATE TRIGGER trigger_update_composition_counters
+AFTER INSERT OR DELETE OR UPDATE OF medicine_id, ingredient_id ON composition
+FOR EACH ROW
+EXECUTE FUNCTION update_composition_counters();
+
+-- Сверка счетчиков с данными (одним запросом, т.е. по одному снимку)
+CREATE OR REPLACE FUNCTION check_query_counters()
+    RETURNS TABLE (
+                      counter_name VARCHAR(64),
+                      stored_value BIGINT,
+                      actual_value BIGINT
+                  ) AS $$
+BEGIN
+    RETURN QUERY
+        SELECT actual.name, COALESCE(qc.value, 0), actual.value
+        FROM (
+                 SELECT 'clients_waiting_for_delivery'::VARCHAR(64) AS name,
+                        (SELECT COUNT(DISTINCT mo.client_id)
+                         FROM medicine_order mo
+                         WHERE mo.status = 'waiting for a delivery'::order_status) AS value
+                 UNION ALL
+                 SELECT 'producing_orders',
+                        (SELECT COUNT(*)
+                         FROM medicine_order mo
+                         WHERE mo.status = 'producing'::order_status)
+                 UNION ALL
+                 SELECT 'producing_ingredients',
+                        (SELECT COUNT(DISTINCT c.ingredient_id)
+                         FROM medicine_order mo
+                                  JOIN prescription p ON mo.prescription_id = p.id
+                                  JOIN composition c ON p.medicine_id = c.medicine_id
+                         WHERE mo.status = 'producing'::order_status)
+             ) actual
+                 LEFT JOIN query_counters qc ON qc.name = actual.name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Полный пересчет счетчиков; записи в заказы на это время блокируются
+CREATE OR REPLACE FUNCTION rebuild_query_counters()
+RETURNS VOID AS $$
+BEGIN
+    LOCK TABLE medicine_order, prescription, composition IN SHARE MODE;
+
+    DELETE FROM order_client_counts;
+    INSERT INTO order_client_counts (status, client_id, order_count)
+    SELECT status, client_id, COUNT(*)
+    FROM medicine_order
+    GROUP BY status, client_id;
+
+    DELETE FROM producing_medicine_counts;
+    INSERT INTO producing_medicine_counts (medicine_id, order_count)
+    SELECT p.medicine_id, COUNT(*)
+    FROM medicine_order mo
+             JOIN prescription p ON mo.prescription_id = p.id
+    WHERE mo.status = 'producing'::order_status
+    GROUP BY p.medicine_id;
+
+    DELETE FROM producing_ingredient_counts;
+    INSERT INTO producing_ingredient_counts (ingredient_id, medicine_count)
+    SELECT c.ingredient_id, COUNT(*)
+    FROM producing_medicine_counts pmc
+             JOIN composition c ON c.medicine_id = pmc.medicine_id
+    GROUP BY c.ingredient_id;
+
+    INSERT INTO query_counters (name, value)
+    SELECT counter_name, actual_value FROM check_query_counters()
+    ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_query_counters();
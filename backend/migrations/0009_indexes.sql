@@ -0,0 +1,39 @@
+-- Индексы для часто используемых условий отбора и соединений.
+-- В схеме были только первичные ключи, поэтому представления, функции /queries
+-- и триггер process_delivery_update читали medicine_order и prescription целиком.
+-- Проверка планов: tests/test_indexes.py
+
+-- Заказы по статусу (представления, get_producing_orders, счетчики); client_id
+-- во втором столбце позволяет считать DISTINCT client_id по одному индексу
+CREATE INDEX IF NOT EXISTS medicine_order_status_client_idx ON medicine_order (status, client_id);
+-- Заказы клиента и внешние ключи
+CREATE INDEX IF NOT EXISTS medicine_order_client_idx ON medicine_order (client_id);
+CREATE INDEX IF NOT EXISTS medicine_order_prescription_idx ON medicine_order (prescription_id);
+-- Заказы, ожидающие поставку: их ищет process_delivery_update при каждой поставке
+CREATE INDEX IF NOT EXISTS medicine_order_waiting_prescription_idx ON medicine_order (prescription_id)
+    WHERE status = 'waiting for a delivery';
+-- Невостребованные заказы (clients_with_unclaimed_orders)
+CREATE INDEX IF NOT EXISTS medicine_order_ready_expected_idx ON medicine_order (expected_date_of_issue)
+    WHERE status = 'ready';
+-- Отбор заказов за период
+CREATE INDEX IF NOT EXISTS medicine_order_start_data_idx ON medicine_order (start_data);
+
+CREATE INDEX IF NOT EXISTS prescription_medicine_idx ON prescription (medicine_id);
+CREATE INDEX IF NOT EXISTS prescription_client_idx ON prescription (client_id);
+
+-- Первичный ключ (medicine_id, ingredient_id) не помогает искать по ингредиенту
+CREATE INDEX IF NOT EXISTS composition_ingredient_idx ON composition (ingredient_id);
+
+CREATE INDEX IF NOT EXISTS medication_delivery_medication_idx ON medication_delivery (medication_id);
+CREATE INDEX IF NOT EXISTS inventory_medication_idx ON inventory (medication_id);
+
+-- Индексы не наследуются, поэтому поиск по названию нужен в каждой таблице иерархии medication
+CREATE INDEX IF NOT EXISTS medication_name_idx ON medication (name);
+CREATE INDEX IF NOT EXISTS medicine_name_idx ON medicine (name);
+CREATE INDEX IF NOT EXISTS ingredient_name_idx ON ingredient (name);
+CREATE INDEX IF NOT EXISTS medicine_type_idx ON medicine (type);
+CREATE INDEX IF NOT EXISTS medicine_tech_prep_idx ON medicine (tech_prep_id);
+
+ANALYZE medicine_order;
+ANALYZE prescription;
+ANALYZE composition;
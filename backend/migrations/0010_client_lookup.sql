@@ -0,0 +1,17 @@
+-- Нечеткий поиск клиентов (/clients/lookup) по ФИО и номеру телефона.
+-- Нормализованные столбцы вычисляются самой базой, индексы GIN по триграммам
+-- обслуживают и похожесть (<%), и поиск подстроки (LIKE '%...%').
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- ФИО в нижнем регистре одной строкой
+ALTER TABLE client ADD COLUMN IF NOT EXISTS full_name TEXT
+    GENERATED ALWAYS AS (lower(surname || ' ' || name || coalesce(' ' || patronymic, ''))) STORED;
+
+-- Только цифры телефона, с 7 вместо ведущей 8 у российских номеров
+ALTER TABLE client ADD COLUMN IF NOT EXISTS phone_normalized TEXT
+    GENERATED ALWAYS AS (regexp_replace(regexp_replace(phone_number, '\D', '', 'g'), '^8(\d{10})$', '7\1')) STORED;
+
+CREATE INDEX IF NOT EXISTS client_full_name_trgm_idx ON client USING gin (full_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS client_phone_normalized_trgm_idx ON client USING gin (phone_normalized gin_trgm_ops);
+
+ANALYZE client;
@@ -0,0 +1,12 @@
+-- Вывод значений в JSON, который строит сама база (PG_JSON=1), в том же виде,
+-- что и у serializers.convert_value в приложении.
+
+-- Время как у datetime.isoformat(): микросекунды только если они не нулевые
+-- (to_json отбрасывает нули в конце дробной части), смещение в виде +03:00
+CREATE OR REPLACE FUNCTION json_isoformat(value TIMESTAMPTZ)
+RETURNS TEXT AS $$
+    SELECT to_char(value, 'YYYY-MM-DD"T"HH24:MI:SS')
+        || CASE WHEN date_part('microseconds', value)::bigint % 1000000 <> 0
+                THEN to_char(value, '.US') ELSE '' END
+        || to_char(value, 'TZH:TZM');
+$$ LANGUAGE sql STABLE STRICT;
@@ -0,0 +1,32 @@
+"""
+Tests are run from backend/:
+
+    pip install -r requirements-dev.txt
+    python -m pytest
+
+Tests using the `db` fixture need a migrated Postgres reachable with the
+same DB_* environment variables as the API and are skipped when DB_HOST is not
+set; the others fake the database.
+"""
+import os
+
+import psycopg2
+import pytest
+
+
+@pytest.fixture(scope="session")
+def db():
+    """A connection to the test database; everything done on it is rolled back."""
+    if "DB_HOST" not in os.environ:
+        pytest.skip("no database configured (set DB_HOST and the other DB_* variables)")
+    conn = psycopg2.connect(
+        host=os.environ["DB_HOST"],
+        dbname=os.environ.get("DB_NAME", "postgres"),
+        user=os.environ.get("DB_USER", "myuser"),
+        password=os.environ.get("DB_PASS", "mypassword"),
+    )
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
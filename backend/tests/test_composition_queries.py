@@ -0,0 +1,52 @@
+"""
+The composition listings read the table with one statement, whatever the
+number of medicines. The database is faked by replacing execute_query.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database
+from app.cache import cache
+from app.main import create_app
+
+
+def composition_rows(medicines):
+    return [(medicine_id, ingredient_id, 1.5) for medicine_id in range(1, medicines + 1) for ingredient_id in (1, 2)]
+
+
+class Statements(list):
+    """The statements run, with `rows` as the result of every composition read."""
+    rows = ()
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    executed = Statements()
+
+    def fake_execute_query(query, params=None, fetch=True, commit=None):
+        executed.append(" ".join(query.split()))
+        # No table versions: conditional_get serves the request unconditionally
+        return list(executed.rows) if "FROM composition" in query else []
+
+    monkeypatch.setattr(database, "execute_query", fake_execute_query)
+    cache.clear()
+    yield executed
+    cache.clear()
+
+
+def composition_reads(statements):
+    # The table_versions lookup of conditional_get runs for every route and is not counted
+    return [statement for statement in statements if "table_versions" not in statement]
+
+
+@pytest.mark.parametrize("medicines", [1, 50])
+@pytest.mark.parametrize("path", ["/compositions/", "/compositions/by-medicine"])
+def test_one_statement_per_listing(statements, path, medicines):
+    statements.rows = composition_rows(medicines)
+    response = TestClient(create_app()).get(path)
+
+    assert response.status_code == 200
+    assert len(composition_reads(statements)) == 1
+    body = response.json()
+    listed = body["data"] if path == "/compositions/" else [row for rows in body.values() for row in rows]
+    assert len(listed) == 2 * medicines
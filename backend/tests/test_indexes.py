@@ -0,0 +1,270 @@
+"""
+The /queries views and functions and the delivery trigger read the big tables
+through the indexes of migrations/0009_indexes.sql and 0010_client_lookup.sql.
+
+The large_dataset fixture adds medicines, clients, prescriptions and orders in
+the test transaction and ANALYZEs; everything is rolled back at the end.
+Triggers are disabled while loading with session_replication_role, which needs
+a superuser.
+
+EXPLAIN only shows a Function Scan for a PL/pgSQL function, so the statements
+of each function are read from its body in pg_proc.prosrc, with the arguments
+(or the NEW fields of a trigger) turned into parameters of a prepared
+statement, and that statement is explained with the test arguments. A function
+whose body changes is tested as it is in the database, not as a copy.
+
+    DB_HOST=localhost python -m pytest tests/test_indexes.py
+"""
+import datetime
+import json
+import re
+
+import pytest
+
+ORDERS = 200000
+CLIENTS = 20000
+MEDICINES = 20000
+
+LOAD = [
+    """
+    INSERT INTO medicine (name, manufacturer, critical_norm, shelf_life, unit_of_measure, price,
+                          storage_conditions, current_amount, type, kind, application)
+    SELECT 'Лекарство ' || g, 'Производитель', 10, INTERVAL '1 year', 'pc', 100, 'Сухое место', 50,
+           (CASE g %% 2 WHEN 0 THEN 'finished' ELSE 'manufactured' END)::medicine_type, 'pills', 'internal'
+    FROM generate_series(1, %(medicines)s) g
+    """,
+    """
+    INSERT INTO client (surname, name, patronymic, phone_number)
+    SELECT 'Клиент' || g, 'Имя', NULL, '7' || lpad(g::text, 10, '0')
+    FROM generate_series(1, %(clients)s) g
+    """,
+    """
+    INSERT INTO prescription (client_id, medicine_id, prescription_number, doctor_surname, doctor_name,
+                              signature, stamp, age, diagnosis, amount, application)
+    SELECT c.ids[1 + g %% array_length(c.ids, 1)], m.ids[1 + g %% array_length(m.ids, 1)], g,
+           'Врач', 'Имя', TRUE, TRUE, 30, 'Диагноз', 1, 'internal'
+    FROM generate_series(1, %(orders)s) g,
+         (SELECT array_agg(id) AS ids FROM client) c,
+         (SELECT array_agg(id) AS ids FROM medicine) m
+    """,
+    # Like in a pharmacy that has been working for a while, almost all orders are issued
+    """
+    INSERT INTO medicine_order (prescription_id, client_id, order_number, status,
+                                start_data, expected_date_of_issue, cost)
+    SELECT p.id, p.client_id, p.prescription_number,
+           (CASE p.id %% 100 WHEN 0 THEN 'waiting for a delivery' WHEN 1 THEN 'producing'
+                             WHEN 2 THEN 'ready' WHEN 3 THEN 'cancelled' ELSE 'issued' END)::order_status,
+           NOW() - (p.id %% 1000) * INTERVAL '1 day',
+           NOW() - (p.id %% 1000) * INTERVAL '1 day' + INTERVAL '2 days',
+           100
+    FROM prescription p
+    WHERE NOT EXISTS (SELECT 1 FROM medicine_order mo WHERE mo.prescription_id = p.id)
+    """,
+]
+
+# Tables no plan may read with a Seq Scan
+ORDER_TABLES = ("medicine_order",)
+# ... and those of lookups by medicine name
+BY_NAME = ("medicine_order", "prescription", "medicine")
+
+# Views the /queries routes select from: (view, tables)
+VIEWS = [
+    ("clients_with_unclaimed_orders", ORDER_TABLES),
+    ("clients_waiting_for_delivery", ORDER_TABLES),
+    ("medicine_details_view", ORDER_TABLES),
+]
+
+# Every function the /queries routes call: (function, arguments, tables). Arguments
+# name values of the large_dataset fixture.
+FUNCTIONS = [
+    ("count_unclaimed_orders_clients", (), ORDER_TABLES),
+    ("count_clients_waiting_for_delivery", (), ORDER_TABLES),
+    ("count_clients_waiting_for_delivery_by_medication_type", ("medicine_type",), ORDER_TABLES),
+    ("get_single_medicine_details", ("medicine_name",), ("medicine",)),
+    ("get_top_10_medications", (), ORDER_TABLES),
+    ("get_top_10_medications_by_type", ("medicine_type",), ORDER_TABLES),
+    ("get_ingredient_usage_volume", ("ingredient_name", "start_date", "end_date"), ORDER_TABLES),
+    ("get_clients_by_medication_name_and_period", ("medicine_name", "start_date", "end_date"), BY_NAME),
+    ("get_clients_by_medication_type_and_period", ("medicine_type", "start_date", "end_date"), ORDER_TABLES),
+    ("count_clients_by_medication_name_and_period", ("medicine_name", "start_date", "end_date"), BY_NAME),
+    ("count_clients_by_medication_type_and_period", ("medicine_type", "start_date", "end_date"), ORDER_TABLES),
+    ("get_medications_at_critical_level", (), ORDER_TABLES),
+    ("get_low_stock_medications", (), ORDER_TABLES),
+    ("get_low_stock_medications_by_type", ("medicine_type",), ORDER_TABLES),
+    ("get_producing_orders", (), ORDER_TABLES),
+    ("count_producing_orders", (), ORDER_TABLES),
+    ("get_ingredients_for_producing_orders", (), ORDER_TABLES),
+    ("count_ingredients_for_producing_orders", (), ORDER_TABLES),
+    ("get_technology_of_preparation", ("medicine_type", "medicine_names", "true"), ORDER_TABLES),
+    ("get_medicine_price_and_components_info", ("medicine_name",), ("medicine",)),
+    ("get_most_frequent_clients", ("medicine_type", "medicine_names", "limit"), ORDER_TABLES),
+]
+
+# Client.lookup statements (app/models.py): (name, statement, arguments, tables)
+LOOKUPS = [
+    ("client_lookup_by_name", "SELECT id FROM client WHERE %s <%% full_name", ("client_name",), ("client",)),
+    ("client_lookup_by_phone", "SELECT id FROM client WHERE phone_normalized LIKE %s", ("phone",), ("client",)),
+]
+
+_STATEMENT_START = re.compile(r"^(RETURN\s+QUERY\s+|RETURN\s*\()?\s*(SELECT|WITH|UPDATE|INSERT|DELETE)\b",
+                              re.IGNORECASE)
+
+
+@pytest.fixture(scope="module")
+def large_dataset(db):
+    """Argument values for the statements, once the synthetic rows are loaded."""
+    with db.cursor() as cur:
+        cur.execute("SET LOCAL session_replication_role = replica")
+        for statement in LOAD:
+            cur.execute(statement, {"orders": ORDERS, "clients": CLIENTS, "medicines": MEDICINES})
+        cur.execute("SET LOCAL session_replication_role = DEFAULT")
+        for table in ("medication", "medicine", "client", "prescription", "medicine_order"):
+            cur.execute(f"ANALYZE {table}")
+        cur.execute("SELECT MIN(id) FROM medicine")
+        medicine_id = cur.fetchone()[0]
+        cur.execute("SELECT name FROM ingredient ORDER BY id LIMIT 1")
+        ingredient_name = cur.fetchone()[0]
+    today = datetime.date.today()
+    yield {
+        "medicine_id": medicine_id,
+        "medicine_name": "Лекарство 1234",
+        "medicine_names": ["Лекарство 1234", "Лекарство 4321"],
+        "medicine_type": "finished",
+        "ingredient_name": ingredient_name,
+        "start_date": today - datetime.timedelta(days=3),
+        "end_date": today,
+        "true": True,
+        "limit": 10,
+        "client_name": "клиент 1234",
+        "phone": "%0001234%",
+    }
+    db.rollback()
+
+
+def body_statements(source):
+    """The SQL statements of a PL/pgSQL body: RETURN QUERY, RETURN (SELECT ...) and plain DML."""
+    source = re.sub(r"--[^\n]*", "", source)
+    body = source[source.index("BEGIN") + len("BEGIN"):source.rindex("END")]
+    statements = []
+    for statement in body.split(";"):
+        statement = statement.strip()
+        match = _STATEMENT_START.match(statement)
+        if not match:
+            continue
+        prefix = match.group(1) or ""
+        statement = statement[len(prefix):]
+        if prefix.upper().startswith("RETURN") and "(" in prefix:
+            # RETURN (SELECT ...): drop the closing parenthesis
+            statement = statement.rstrip()[:-1]
+        statements.append(statement)
+    return statements
+
+
+def function_statements(db, name):
+    """(statement, parameter types, parameter names) of each statement in the body of function name."""
+    with db.cursor() as cur:
+        cur.execute(
+            """
+            SELECT p.prosrc, coalesce(p.proargnames, '{}'), coalesce(p.proargmodes::text[], '{}'),
+                   array(SELECT format_type(t, NULL) FROM unnest(p.proargtypes::oid[]) WITH ORDINALITY u(t, i)
+                         ORDER BY i)
+            FROM pg_proc p WHERE p.proname = %s
+            """,
+            (name,)
+        )
+        rows = cur.fetchall()
+    assert len(rows) == 1, f"expected one function {name}, found {len(rows)}"
+    source, names, modes, types = rows[0]
+    # Input arguments come first in proargnames; OUT and TABLE columns are not parameters
+    inputs = [arg for i, arg in enumerate(names) if not modes or modes[i] in ("i", "b", "v")]
+    statements = []
+    for statement in body_statements(source):
+        for number, arg in enumerate(inputs, 1):
+            statement = re.sub(rf"\b{name}\.{arg}\b", f"${number}", statement)
+            statement = re.sub(rf"(?<![.\w$]){arg}\b", f"${number}", statement)
+        statements.append(statement)
+    assert statements, f"no statements found in the body of {name}"
+    return statements, types
+
+
+def trigger_statements(db, function, table):
+    """The statements of a trigger function, with its NEW.<column> fields as parameters."""
+    with db.cursor() as cur:
+        cur.execute("SELECT prosrc FROM pg_proc WHERE proname = %s", (function,))
+        source = cur.fetchone()[0]
+        columns = sorted(set(re.findall(r"\bNEW\.(\w+)", source)))
+        cur.execute(
+            "SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = %s::regclass AND attname = ANY(%s)",
+            (table, columns)
+        )
+        types = dict(cur.fetchall())
+    statements = []
+    for statement in body_statements(source):
+        for number, column in enumerate(columns, 1):
+            statement = re.sub(rf"\bNEW\.{column}\b", f"${number}", statement)
+        statements.append(statement)
+    return statements, columns, [types[column] for column in columns]
+
+
+def node_types(plan):
+    yield plan["Node Type"], plan.get("Relation Name")
+    for child in plan.get("Plans", ()):
+        yield from node_types(child)
+
+
+def explain(db, statement, types=(), args=()):
+    """The plan of statement, prepared with parameters of the given types when it has any."""
+    with db.cursor() as cur:
+        # A failing statement must not abort the transaction holding the dataset
+        cur.execute("SAVEPOINT explain")
+        try:
+            if types:
+                cur.execute(f"PREPARE explained ({', '.join(types)}) AS {statement}")
+                cur.execute(f"EXPLAIN (FORMAT JSON) EXECUTE explained ({', '.join(['%s'] * len(args))})", args)
+                plan = cur.fetchone()[0][0]["Plan"]
+                cur.execute("DEALLOCATE explained")
+            else:
+                cur.execute("EXPLAIN (FORMAT JSON) " + statement, args)
+                plan = cur.fetchone()[0][0]["Plan"]
+        except Exception:
+            # Prepared statements outlive the rollback
+            cur.execute("ROLLBACK TO SAVEPOINT explain")
+            cur.execute("DEALLOCATE ALL")
+            raise
+        cur.execute("RELEASE SAVEPOINT explain")
+    return plan
+
+
+def assert_no_seq_scan(plan, tables):
+    nodes = list(node_types(plan))
+    scanned = {table for node, table in nodes if node == "Seq Scan"}
+    assert not scanned & set(tables), json.dumps(nodes, ensure_ascii=False)
+
+
+@pytest.mark.parametrize("view, tables", VIEWS, ids=[view for view, _ in VIEWS])
+def test_view_uses_indexes(db, large_dataset, view, tables):
+    assert_no_seq_scan(explain(db, f"SELECT * FROM {view}"), tables)
+
+
+@pytest.mark.parametrize("function, args, tables", FUNCTIONS, ids=[function for function, _, _ in FUNCTIONS])
+def test_function_uses_indexes(db, large_dataset, function, args, tables):
+    statements, types = function_statements(db, function)
+    values = [large_dataset[arg] for arg in args]
+    for statement in statements:
+        assert_no_seq_scan(explain(db, statement, types, values), tables)
+
+
+@pytest.mark.parametrize("statement, args, tables", [lookup[1:] for lookup in LOOKUPS],
+                         ids=[lookup[0] for lookup in LOOKUPS])
+def test_client_lookup_uses_indexes(db, large_dataset, statement, args, tables):
+    assert_no_seq_scan(explain(db, statement, args=[large_dataset[arg] for arg in args]), tables)
+
+
+def test_process_delivery_update_uses_indexes(db, large_dataset):
+    statements, columns, types = trigger_statements(db, "process_delivery_update", "medication_delivery")
+    new = {"medication_id": large_dataset["medicine_id"], "amount": 10}
+    order_updates = [statement for statement in statements if re.match(r"UPDATE\s+medicine_order\b", statement)]
+    assert order_updates, "process_delivery_update no longer updates medicine_order"
+    for statement in statements:
+        assert_no_seq_scan(explain(db, statement, types, [new[column] for column in columns]), ORDER_TABLES)
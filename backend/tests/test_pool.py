@@ -0,0 +1,55 @@
+"""
+Closing the connection pool while connections are in use, as the API does at
+shutdown with queries still running on the worker threads.
+"""
+import pytest
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from app import database, pool as pool_module
+from app.pool import ConnectionPool
+
+
+class FakeConnection:
+    class info:
+        transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def __init__(self):
+        self.closed = 0
+
+    def close(self):
+        self.closed = 1
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fake_connect(monkeypatch):
+    monkeypatch.setattr(pool_module.psycopg2, "connect", lambda **kwargs: FakeConnection())
+
+
+def test_closeall_keeps_connections_in_use_until_returned():
+    pool = ConnectionPool(2, 5)
+    in_use = pool.getconn()
+    idle = pool._idle[0].conn
+
+    pool.closeall()
+
+    assert idle.closed and not in_use.closed
+    pool.putconn(in_use)
+    assert in_use.closed
+    assert pool.stats()["in_use"] == 0
+    with pytest.raises(PoolError):
+        pool.getconn()
+
+
+def test_release_after_close_pool_does_not_open_a_new_pool(monkeypatch):
+    monkeypatch.setattr(database, "_connection_pool", None)
+    conn = database.get_connection()
+
+    database.close_pool()
+    database.release_connection(conn)
+
+    assert conn.closed
+    assert database._connection_pool is None
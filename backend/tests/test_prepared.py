@@ -0,0 +1,115 @@
+"""
+Server-side prepared statements after a failed EXECUTE. The connection is
+faked and fails the statements listed in its `failures`.
+"""
+from collections import OrderedDict
+
+import psycopg2
+import pytest
+from psycopg2 import errors, extensions
+
+from app import prepared
+
+QUERY = "SELECT * FROM client WHERE id = %s"
+
+
+class FakeConnection:
+    def __init__(self):
+        self.prepared = OrderedDict()
+        self.stale = []
+        self.statements = []
+        self.failures = {}
+        self.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+        self._counter = 0
+
+    @property
+    def info(self):
+        return self
+
+    def next_statement_name(self):
+        self._counter += 1
+        return f"stmt_{self._counter}"
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=None):
+        conn = self.connection
+        if conn.transaction_status == extensions.TRANSACTION_STATUS_INERROR:
+            raise errors.InFailedSqlTransaction("current transaction is aborted")
+        conn.statements.append(query.split(" (")[0])
+        error = conn.failures.pop(query.split(" (")[0], None)
+        if error is not None:
+            conn.transaction_status = extensions.TRANSACTION_STATUS_INERROR
+            raise error
+        conn.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    monkeypatch.setattr(prepared, "PreparingConnection", FakeConnection)
+    monkeypatch.setattr(prepared, "PREPARE_THRESHOLD", 1)
+    monkeypatch.setattr(prepared, "_usage", OrderedDict())
+    connection = FakeConnection()
+    prepared.execute(connection.cursor(), QUERY, (1,))
+    connection.rollback()
+    assert connection.prepared == {QUERY: "stmt_1"}
+    return connection
+
+
+def test_stale_plan_is_deallocated_after_the_rollback(conn):
+    conn.failures["EXECUTE stmt_1"] = errors.FeatureNotSupported("cached plan must not change result type")
+    with pytest.raises(errors.FeatureNotSupported):
+        prepared.execute(conn.cursor(), QUERY, (1,))
+    assert QUERY not in conn.prepared
+    conn.rollback()
+
+    prepared.execute(conn.cursor(), QUERY, (1,))
+
+    assert conn.statements[-3:] == ["DEALLOCATE stmt_1", "PREPARE stmt_2 AS SELECT * FROM client WHERE id = $1",
+                                    "EXECUTE stmt_2"]
+
+
+def test_missing_statement_is_prepared_again(conn):
+    conn.failures["EXECUTE stmt_1"] = errors.InvalidSqlStatementName('prepared statement "stmt_1" does not exist')
+    with pytest.raises(errors.InvalidSqlStatementName):
+        prepared.execute(conn.cursor(), QUERY, (1,))
+    conn.rollback()
+
+    prepared.execute(conn.cursor(), QUERY, (1,))
+
+    assert "DEALLOCATE stmt_1" not in conn.statements
+    assert conn.prepared == {QUERY: "stmt_2"}
+
+
+def test_query_errors_keep_the_statement(conn):
+    conn.failures["EXECUTE stmt_1"] = errors.UniqueViolation("duplicate key value")
+    with pytest.raises(psycopg2.Error):
+        prepared.execute(conn.cursor(), QUERY, (1,))
+    conn.rollback()
+
+    prepared.execute(conn.cursor(), QUERY, (1,))
+
+    assert conn.prepared == {QUERY: "stmt_1"}
+    assert conn.statements[-1] == "EXECUTE stmt_1"
+
+
+def test_counted_queries_are_bounded(conn, monkeypatch):
+    monkeypatch.setattr(prepared, "PREPARE_THRESHOLD", 2)
+    monkeypatch.setattr(prepared, "TRACKED_MAX", 3)
+    for medicine_id in range(10):
+        prepared.execute(conn.cursor(), f"SELECT * FROM medicine WHERE id = {medicine_id}")
+        conn.rollback()
+
+    assert list(prepared._usage) == [f"SELECT * FROM medicine WHERE id = {medicine_id}" for medicine_id in (7, 8, 9)]
@@ -9,6 +9,9 @@ const TableView = () => {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [tableInfo, setTableInfo] = useState(null);
+  // Курсор следующей страницы (next_cursor из ответа), null на последней
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   
   // Новые состояния для управления модальными окнами и формами
   const [showModal, setShowModal] = useState(false);
@@ -74,13 +77,15 @@ const TableView = () => {
     }
   }, [tableInfo]);
 
-  // Функция для загрузки данных, выделена отдельно для повторного использования
+  // Функция для загрузки данных, выделена отдельно для повторного использования.
+  // Загружает первую страницу таблицы, остальные подгружаются по кнопке
   const loadData = async () => {
     try {
       setLoading(true);
-      const result = await fetchTableData(tableInfo.endpoint);
+      const result = await fetchTableData(tableInfo.endpoint, { columnar: true });
       setData(result.data || result || []);
       setFieldTranslations(result.headers || {})
+      setNextCursor(result.next_cursor ?? null);
       setLoading(false);
     } catch (err) {
       setError(err.message);
@@ -88,6 +93,20 @@ const TableView = () => {
     }
   };
 
+  // Загрузка следующей страницы после последней загруженной записи
+  const loadMore = async () => {
+    try {
+      setLoadingMore(true);
+      const result = await fetchTableData(`${tableInfo.endpoint}?after_id=${nextCursor}`, { columnar: true });
+      setData((rows) => [...rows, ...(result.data || [])]);
+      setNextCursor(result.next_cursor ?? null);
+    } catch (err) {
+      setError(err.message);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const getRoleTitle = () => {
     switch (role) {
       case 'pharmacist': return 'Фармацевт';
@@ -561,6 +580,11 @@ const TableView = () => {
               {renderTableRows()}
             </tbody>
           </table>
+          {nextCursor !== null && (
+            <button className="load-more-btn" onClick={loadMore} disabled={loadingMore}>
+              {loadingMore ? 'Загрузка...' : 'Показать ещё'}
+            </button>
+          )}
         </div>
       )}
 
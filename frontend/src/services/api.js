@@ -2,11 +2,46 @@ import axios from 'axios';
 
 const API_URL = 'http://localhost:8000'; // URL для API бэкенда
 
-// Функция для получения данных таблицы
-export const fetchTableData = async (endpoint) => {
+// Ответы GET по URL вместе с их ETag: неизменившиеся данные сервер
+// подтверждает ответом 304 без тела, и они берутся отсюда
+const responseCache = new Map();
+
+// Ответ format=columnar: имена столбцов один раз и значения параллельными
+// массивами; собираем из них обычный список строк-объектов
+const columnarToRows = ({ columns, data, ...rest }) => {
+  const rowCount = columns.length ? data[0].length : 0;
+  const rows = new Array(rowCount);
+  for (let i = 0; i < rowCount; i++) {
+    const row = {};
+    columns.forEach((column, j) => {
+      row[column] = data[j][i];
+    });
+    rows[i] = row;
+  }
+  return { ...rest, data: rows };
+};
+
+// Функция для получения данных таблицы; columnar запрашивает компактный
+// столбцовый формат у табличных эндпоинтов
+export const fetchTableData = async (endpoint, { columnar = false } = {}) => {
   try {
-    const response = await axios.get(`${API_URL}${endpoint}`);
-    return response.data;
+    let url = `${API_URL}${endpoint}`;
+    if (columnar) {
+      url += `${url.includes('?') ? '&' : '?'}format=columnar`;
+    }
+    const cached = responseCache.get(url);
+    const response = await axios.get(url, {
+      headers: cached ? { 'If-None-Match': cached.etag } : {},
+      validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+    });
+    if (response.status === 304 && cached) {
+      return cached.data;
+    }
+    const data = columnar ? columnarToRows(response.data) : response.data;
+    if (response.headers.etag) {
+      responseCache.set(url, { etag: response.headers.etag, data });
+    }
+    return data;
   } catch (error) {
     throw new Error(`Ошибка при получении данных: ${error.message}`);
   }